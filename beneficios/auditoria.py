@@ -0,0 +1,139 @@
+"""
+Gravação da auditoria em lote.
+
+Fora de auditoria_em_lote() tudo funciona como sempre: o auditlog faz um
+INSERT de LogEntry a cada save e registrar_log_acao grava o LogAcao na hora.
+
+Dentro do bloco (cada requisição, pelo AuditoriaEmLoteMiddleware, e cada
+tarefa da fila) o auditlog fica desligado e os receivers daqui montam os
+LogEntry sem gravar. Cada entrada só entra no buffer quando a transação do
+save confirma (on_commit), então alterações desfeitas não deixam rastro. No
+fim do bloco, depois do commit, LogEntry, LogAcao e as linhas de
+RegistroAuditoria vão para o banco em um bulk_create cada.
+
+Com AUDITORIA_SINCRONA = True nas settings o bloco não faz nada, e cada
+registro volta a ser gravado na mesma transação da alteração. No modo em
+lote, um processo que morra entre o commit e _gravar perde os registros do
+bloco (ver o comentário em config/settings.py).
+
+Os receivers repetem log_create/log_update/log_delete do auditlog usando
+internos dele; por isso a versão fica fixa no requirements.txt.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from auditlog.cid import get_cid
+from auditlog.context import auditlog_disabled, auditlog_value
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.encoding import smart_str
+
+from .models import LogAcao, RegistroAuditoria
+
+_buffer = ContextVar('auditoria_buffer', default=None)
+
+
+class _Buffer:
+    def __init__(self):
+        self.entradas = []
+        self.acoes = []
+
+
+@contextmanager
+def auditoria_em_lote():
+    """Junta os registros de auditoria do bloco e grava tudo de uma vez após o commit"""
+    if settings.AUDITORIA_SINCRONA or _buffer.get() is not None:
+        yield
+        return
+
+    buffer = _Buffer()
+    token = _buffer.set(buffer)
+    token_auditlog = auditlog_disabled.set(True)
+    try:
+        yield
+    finally:
+        auditlog_disabled.reset(token_auditlog)
+        _buffer.reset(token)
+        # Enfileirado depois dos on_commit de cada registro: roda quando eles já entraram no buffer
+        transaction.on_commit(partial(_gravar, buffer))
+
+
+def _gravar(buffer):
+    if not buffer.entradas and not buffer.acoes:
+        return
+    with transaction.atomic():
+        entradas = LogEntry.objects.bulk_create(buffer.entradas)
+        acoes = LogAcao.objects.bulk_create(buffer.acoes)
+        RegistroAuditoria.objects.bulk_create(
+            [RegistroAuditoria.de_log_entry(entrada) for entrada in entradas]
+            + [RegistroAuditoria.de_log_acao(acao) for acao in acoes]
+        )
+
+
+def gravar_log_acao(acao):
+    """Grava o LogAcao, ou o guarda no buffer se houver um bloco em lote ativo"""
+    buffer = _buffer.get()
+    if buffer is None:
+        acao.save()
+    else:
+        transaction.on_commit(partial(buffer.acoes.append, acao))
+
+
+def _dados_da_requisicao(entrada):
+    """Usuário, IP e porta que o AuditlogMiddleware deixou no contexto"""
+    try:
+        dados = auditlog_value.get()
+    except LookupError:
+        return
+    ator = dados.get('actor')
+    if isinstance(ator, get_user_model()):
+        entrada.actor = ator
+        entrada.actor_email = getattr(ator, 'email', None)
+    entrada.remote_addr = dados.get('remote_addr')
+    entrada.remote_port = dados.get('remote_port')
+
+
+def _registrar(instance, acao, antigo, novo, campos=None):
+    buffer = _buffer.get()
+    if buffer is None:
+        return
+    changes = model_instance_diff(
+        antigo, novo, fields_to_check=campos, use_json_for_changes=settings.AUDITLOG_STORE_JSON_CHANGES,
+    )
+    if not changes:
+        return
+    entrada = LogEntry(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_pk=str(instance.pk),
+        object_id=instance.pk if isinstance(instance.pk, int) else None,
+        object_repr=smart_str(instance),
+        action=acao,
+        changes=changes,
+        cid=get_cid(),
+    )
+    _dados_da_requisicao(entrada)
+    transaction.on_commit(partial(buffer.entradas.append, entrada))
+
+
+# Equivalentes aos receivers do auditlog (log_create/log_update/log_delete), só que para o buffer
+
+def registrar_criacao(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _registrar(instance, LogEntry.Action.CREATE, None, instance)
+
+
+def registrar_alteracao(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or instance.pk is None or _buffer.get() is None:
+        return
+    antigo = sender._default_manager.filter(pk=instance.pk).first()
+    _registrar(instance, LogEntry.Action.UPDATE, antigo, instance, update_fields)
+
+
+def registrar_exclusao(sender, instance, **kwargs):
+    if instance.pk is not None:
+        _registrar(instance, LogEntry.Action.DELETE, instance, None)
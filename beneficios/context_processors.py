@@ -1,9 +1,9 @@
-from .models import Beneficio
+from .services import beneficios_cadastrados
 
 def beneficios_ativos(request):
-    """Disponibiliza benefícios ativos em todos os templates"""
+    """Disponibiliza benefícios ativos em todos os templates (registro em memória, sem SQL)"""
     if request.user.is_authenticated:
         return {
-            'beneficios_menu': Beneficio.objects.filter(ativo=True).only('id', 'nome', 'icone').order_by('nome')
+            'beneficios_menu': beneficios_cadastrados(apenas_ativos=True)
         }
     return {}
\ No newline at end of file
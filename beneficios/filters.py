@@ -0,0 +1,258 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Pessoa, RegistroAuditoria, gerar_cpf_hash
+
+
+class PessoaFilterSet:
+    """
+    Filtros da listagem de pessoas de um benefício (nome, cpf, status, valor e posição).
+    Usado pela listagem e por todas as gerações em massa, para que o PDF/CSV
+    gerado tenha exatamente as mesmas linhas que aparecem na tela.
+    """
+
+    STATUS_VALIDOS = ('ativo', 'em_espera', 'desligado')
+
+    def __init__(self, beneficio, params, status_padrao=''):
+        self.beneficio = beneficio
+        self.nome = params.get('nome', '').strip()
+        self.cpf = params.get('cpf', '').strip()
+        self.status = params.get('status', status_padrao).strip().lower()
+        self.valor = params.get('valor', '').replace(',', '.').strip()
+        self.id_de = params.get('id_de', '').strip()
+        self.id_ate = params.get('id_ate', '').strip()
+        self.erro_posicao = None
+
+    @property
+    def filtros(self):
+        """Valores crus para repopular o formulário de filtros no template"""
+        return {
+            'nome': self.nome,
+            'cpf': self.cpf,
+            'status': self.status,
+            'valor': self.valor,
+            'id_de': self.id_de,
+            'id_ate': self.id_ate,
+        }
+
+    @property
+    def valor_decimal(self):
+        try:
+            valor = Decimal(self.valor)
+        except (InvalidOperation, ValueError):
+            return None
+        return valor if valor.is_finite() and valor > 0 else None
+
+    def posicoes_numericas(self):
+        """True se id_de/id_ate estão vazios ou contêm apenas dígitos"""
+        return all(not p or p.isdigit() for p in (self.id_de, self.id_ate))
+
+    def intervalo(self):
+        """
+        Retorna (inicio, fim) já em índices do queryset (fim=None = até o final),
+        ou None se não houver filtro de posição válido. Em caso de posição
+        inválida, a mensagem fica em self.erro_posicao.
+        """
+        try:
+            pos_de = int(self.id_de) if self.id_de else None
+            pos_ate = int(self.id_ate) if self.id_ate else None
+        except ValueError:
+            self.erro_posicao = 'Posições devem ser números válidos!'
+            return None
+
+        if pos_de is not None and pos_ate is not None:
+            if pos_de < 1:
+                self.erro_posicao = 'A posição inicial deve ser maior que 0!'
+                return None
+            if pos_ate < pos_de:
+                self.erro_posicao = 'A posição final não pode ser menor que a inicial!'
+                return None
+            return pos_de - 1, pos_ate
+        if pos_de is not None:
+            return (pos_de - 1, None) if pos_de >= 1 else None
+        if pos_ate is not None:
+            return (0, pos_ate) if pos_ate >= 0 else None
+        return None
+
+    def queryset(self, *campos, select_related=()):
+        """
+        Queryset filtrado e ordenado, ainda sem o recorte de posição.
+        campos limita as colunas carregadas (only); select_related segue a mesma regra do Django.
+        """
+        qs = Pessoa.objects.filter(beneficio=self.beneficio)
+
+        if self.nome:
+            qs = qs.filter(nome_completo__icontains=self.nome)
+
+        if self.status in self.STATUS_VALIDOS:
+            qs = qs.filter(status=self.status)
+
+        valor = self.valor_decimal
+        if valor is not None:
+            qs = qs.filter(valor_beneficio=valor)
+
+        if self.cpf:
+            qs = self._filtrar_cpf(qs)
+
+        if select_related:
+            qs = qs.select_related(*select_related)
+        if campos:
+            qs = qs.only(*campos)
+        return qs.order_by('nome_completo', 'pk')
+
+    def _filtrar_cpf(self, qs):
+        """
+        CPF completo usa o índice cego (cpf_hash); busca parcial usa os 4 últimos
+        dígitos e só então descriptografa os candidatos.
+        """
+        cpf_limpo = ''.join(filter(str.isdigit, self.cpf))
+        if not cpf_limpo:
+            return qs
+
+        if len(cpf_limpo) == 11:
+            return qs.filter(cpf_hash=gerar_cpf_hash(cpf_limpo))
+
+        if len(cpf_limpo) >= 4:
+            candidatos = qs.filter(cpf_ultimos_4=cpf_limpo[-4:])
+        else:
+            candidatos = qs
+        ids_validos = [
+            pk for pk, cpf in candidatos.values_list('pk', 'cpf')
+            if cpf_limpo in ''.join(filter(str.isdigit, cpf))
+        ]
+        return qs.filter(pk__in=ids_validos)
+
+    def pessoas(self, *campos, select_related=()):
+        """Queryset final, com o recorte de posição aplicado"""
+        qs = self.queryset(*campos, select_related=select_related)
+        intervalo = self.intervalo()
+        if intervalo:
+            inicio, fim = intervalo
+            qs = qs[inicio:fim]
+        return qs
+
+    @property
+    def posicao_inicial(self):
+        """Número de ordem (1-based) da primeira linha retornada por pessoas()"""
+        intervalo = self.intervalo()
+        return intervalo[0] + 1 if intervalo else 1
+
+    def count(self):
+        return self.pessoas().count()
+
+    def iterator(self, *campos, select_related=(), chunk_size=500):
+        """Percorre as pessoas filtradas sem carregar tudo em memória"""
+        return self.pessoas(*campos, select_related=select_related).iterator(chunk_size=chunk_size)
+
+
+class AuditoriaFilterSet:
+    """
+    Filtros e paginação por chave da tela de auditoria.
+
+    As páginas são recortadas por (data, id) a partir de um cursor na URL
+    (antes=/depois=), sempre com ORDER BY data, id + LIMIT sobre os índices de
+    RegistroAuditoria: a página 1 e a página 10.000 custam o mesmo.
+    """
+
+    POR_PAGINA = 30
+    TIPOS_VALIDOS = ('criacao', 'edicao', 'exclusao', 'geracao')
+    EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+    def __init__(self, params):
+        self.data_de = params.get('data_de', '').strip()
+        self.data_ate = params.get('data_ate', '').strip()
+        self.usuario = params.get('usuario', '').strip()
+        self.tipo = params.get('tipo', '').strip()
+        self.entidade = params.get('entidade', '').strip()
+        self.antes = self.ler_cursor(params.get('antes', ''))
+        self.depois = self.ler_cursor(params.get('depois', ''))
+
+    @property
+    def filtros(self):
+        """Valores crus para repopular o formulário de filtros no template"""
+        return {
+            'data_de': self.data_de,
+            'data_ate': self.data_ate,
+            'usuario': self.usuario,
+            'tipo': self.tipo,
+            'entidade': self.entidade,
+        }
+
+    @classmethod
+    def cursor(cls, registro):
+        """Posição do registro na linha do tempo: '<microssegundos desde 1970>-<id>'"""
+        return f'{(registro.data - cls.EPOCA) // timedelta(microseconds=1)}-{registro.pk}'
+
+    @classmethod
+    def ler_cursor(cls, valor):
+        """(data, id) do cursor, ou None se ausente/inválido"""
+        micros, _, pk = valor.partition('-')
+        if not (micros.isdigit() and pk.isdigit()):
+            return None
+        return cls.EPOCA + timedelta(microseconds=int(micros)), int(pk)
+
+    def _inicio_do_dia(self, valor):
+        try:
+            dia = datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+        return timezone.make_aware(datetime.combine(dia, time.min))
+
+    def queryset(self):
+        """
+        Registros filtrados, sem ordenação. As datas viram intervalos
+        (data >= início do dia), que usam o índice, em vez de data::date.
+        """
+        qs = RegistroAuditoria.objects.all()
+
+        inicio = self._inicio_do_dia(self.data_de) if self.data_de else None
+        if inicio:
+            qs = qs.filter(data__gte=inicio)
+        fim = self._inicio_do_dia(self.data_ate) if self.data_ate else None
+        if fim:
+            qs = qs.filter(data__lt=fim + timedelta(days=1))
+
+        if self.usuario.isdigit():
+            qs = qs.filter(usuario_id=int(self.usuario))
+
+        if self.tipo in self.TIPOS_VALIDOS:
+            qs = qs.filter(tipo=self.tipo)
+
+        if self.entidade == 'acoes':
+            qs = qs.filter(tipo='geracao')
+        elif self.entidade == 'models':
+            qs = qs.exclude(tipo='geracao')
+        elif self.entidade:
+            qs = qs.filter(entidade=self.entidade)
+        return qs
+
+    def pagina(self):
+        """
+        (registros, cursor_mais_recentes, cursor_mais_antigos) da página pedida.
+        Busca uma linha a mais para saber se existe página seguinte sem COUNT.
+        """
+        qs = self.queryset()
+        if self.depois:
+            data, pk = self.depois
+            qs = qs.filter(Q(data__gt=data) | Q(data=data, id__gt=pk)).order_by('data', 'id')
+            registros = list(qs[:self.POR_PAGINA + 1])
+            tem_mais_recentes = len(registros) > self.POR_PAGINA
+            registros = registros[:self.POR_PAGINA][::-1]
+            tem_mais_antigos = True
+        else:
+            if self.antes:
+                data, pk = self.antes
+                qs = qs.filter(Q(data__lt=data) | Q(data=data, id__lt=pk))
+            registros = list(qs.order_by('-data', '-id')[:self.POR_PAGINA + 1])
+            tem_mais_antigos = len(registros) > self.POR_PAGINA
+            registros = registros[:self.POR_PAGINA]
+            tem_mais_recentes = self.antes is not None
+
+        if not registros:
+            return [], None, None
+        mais_recentes = self.cursor(registros[0]) if tem_mais_recentes else None
+        mais_antigos = self.cursor(registros[-1]) if tem_mais_antigos else None
+        return registros, mais_recentes, mais_antigos
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Pessoa, Documento, Beneficio, User
+from .models import Pessoa, Documento, Beneficio, User, gerar_cpf_hash
 #from django.contrib.auth.password_validation import validate_password (caso decida verificar força de senha na criação do user)
 
 def validar_pdf_real(arquivo):
@@ -114,18 +114,16 @@ class PessoaForm(forms.ModelForm):
         
         cpf_formatado = f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
         
-        from .models import Pessoa
-        qs = Pessoa.objects.all()
+        # Busca pelo índice cego: uma única consulta, sem descriptografar o cadastro
+        qs = Pessoa.objects.filter(cpf_hash=gerar_cpf_hash(cpf)).exclude(status='desligado')
         if self.instance.pk:
             qs = qs.exclude(pk=self.instance.pk)
         
-        for pessoa in qs:
-            if pessoa.cpf == cpf_formatado:
-                if pessoa.status != 'desligado':
-                    raise forms.ValidationError(
-                        'CPF já cadastrado em um benefício ativo ou em espera! '
-                        'Só é permitido cadastrar o mesmo CPF se todos os registros anteriores estiverem desligados.'
-                    )
+        if qs.exists():
+            raise forms.ValidationError(
+                'CPF já cadastrado em um benefício ativo ou em espera! '
+                'Só é permitido cadastrar o mesmo CPF se todos os registros anteriores estiverem desligados.'
+            )
         
         return cpf_formatado
         
@@ -0,0 +1,265 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from beneficios.filters import PessoaFilterSet
+from beneficios.models import Beneficio, Memorando, Pessoa, TarefaGeracao
+from beneficios.services import registrar_memorando
+from beneficios.tarefas import carregar_pessoas
+from beneficios.utils import gerar_documentos_massa_pdf, gerar_memorando_segunda_via_pdf, gerar_recibos_massa_pdf
+
+from .seed_benchmark import USUARIO_BENCHMARK
+
+BASELINE_PADRAO = settings.BASE_DIR / 'bench_baseline.json'
+
+# Abaixo disso a diferença é ruído de medição, não regressão
+FOLGA_SEGUNDOS = 0.02
+FOLGA_MB = 0.5
+
+FILTROS_LISTAGEM = [
+    '',
+    '?status=em_espera',
+    '?status=desligado',
+    '?status=todos',
+    '?nome=silva',
+    '?cpf={cpf}',
+    '?cpf={cpf_final}',
+    '?valor=150',
+    '?id_de=1&id_ate=100',
+]
+
+
+def comparar(resultados, baseline, tolerancia, tolerancia_consultas=0.0):
+    """Regressões de resultados em relação à baseline ({tamanho: {cenário: métricas}}), em texto"""
+    regressoes = []
+    for tamanho, cenarios in resultados.items():
+        for nome, atual in cenarios.items():
+            base = baseline.get(tamanho, {}).get(nome)
+            if not base:
+                continue
+            limites = {
+                'segundos': base['segundos'] * (1 + tolerancia) + FOLGA_SEGUNDOS,
+                'pico_memoria_mb': base['pico_memoria_mb'] * (1 + tolerancia) + FOLGA_MB,
+                'consultas': base['consultas'] * (1 + tolerancia_consultas),
+            }
+            for metrica, limite in limites.items():
+                if atual[metrica] > limite:
+                    regressoes.append(
+                        f'{tamanho} pessoas, {nome}: {metrica} {atual[metrica]} (linha de base {base[metrica]})'
+                    )
+    return regressoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark das telas e gerações pesadas (tempo, pico de memória e consultas) em bancos '
+        'sintéticos de vários tamanhos, comparado a uma linha de base em JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=[1000, 10000], help='Pessoas em cada banco sintético')
+        parser.add_argument('--banco-atual', action='store_true',
+                            help='Mede no banco configurado (já populado pelo seed_benchmark) em vez de criar bancos de teste')
+        parser.add_argument('--cenarios', nargs='+', help='Só os cenários que começam com estes nomes')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções cronometradas por cenário (vale a mais rápida)')
+        parser.add_argument('--documentos', type=int, default=200, help='Pessoas com PDF fictício em cada banco')
+        parser.add_argument('--processos', type=int, default=None, help='Processos do seed_benchmark')
+        parser.add_argument('--baseline', default=str(BASELINE_PADRAO), help='Arquivo JSON da linha de base')
+        parser.add_argument('--gravar', action='store_true', help='Grava os resultados como nova linha de base')
+        parser.add_argument('--tolerancia', type=float, default=0.25, help='Piora aceita em tempo e memória (0.25 = 25%%)')
+        parser.add_argument('--tolerancia-consultas', type=float, default=0.0, help='Piora aceita no número de consultas')
+
+    def handle(self, *args, **options):
+        self.pasta = tempfile.mkdtemp(prefix='gesocial_bench_')
+        # Cache só do benchmark (cada execução começa fria) e nada de snapshots de métricas
+        isolamento = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}},
+            METRICAS_DIR=None,
+            ALLOWED_HOSTS=['testserver'],
+        )
+        resultados = {}
+        try:
+            with isolamento:
+                if options['banco_atual']:
+                    tamanho = Pessoa.objects.count()
+                    resultados[str(tamanho)] = self._medir_cenarios(tamanho, options)
+                else:
+                    for tamanho in options['tamanhos']:
+                        # PDFs fictícios do seed_benchmark vão para a pasta temporária
+                        with override_settings(MEDIA_ROOT=os.path.join(self.pasta, f'media_{tamanho}')):
+                            resultados[str(tamanho)] = self._medir_banco_novo(tamanho, options)
+        finally:
+            shutil.rmtree(self.pasta, ignore_errors=True)
+
+        baseline = self._ler_baseline(options['baseline'])
+        if options['gravar']:
+            for tamanho, cenarios in resultados.items():
+                baseline.setdefault(tamanho, {}).update(cenarios)
+            with open(options['baseline'], 'w') as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Linha de base gravada em {options["baseline"]}.'))
+            return
+
+        if not baseline:
+            self.stdout.write(self.style.WARNING('Sem linha de base para comparar; rode com --gravar para criar uma.'))
+            return
+        regressoes = comparar(resultados, baseline, options['tolerancia'], options['tolerancia_consultas'])
+        if regressoes:
+            for regressao in regressoes:
+                self.stderr.write(regressao)
+            raise CommandError(f'{len(regressoes)} métrica(s) piorou(aram) além da tolerância.')
+        self.stdout.write(self.style.SUCCESS('Nenhuma regressão em relação à linha de base.'))
+
+    def _ler_baseline(self, caminho):
+        if not os.path.exists(caminho):
+            return {}
+        with open(caminho) as f:
+            return json.load(f)
+
+    def _medir_banco_novo(self, tamanho, options):
+        """Cria um banco de teste, popula com o seed_benchmark, mede e descarta"""
+        nome_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            if connection.vendor == 'sqlite':
+                # O SQLite de teste em memória não é descartado ao fechar: limpa o do tamanho anterior
+                call_command('flush', interactive=False, verbosity=0)
+            inicio = time.perf_counter()
+            call_command(
+                'seed_benchmark',
+                pessoas=tamanho,
+                documentos=min(options['documentos'], tamanho),
+                kb_pagina=20,
+                # SQLite de teste fica em memória: os processos filhos não o enxergariam
+                processos=1 if connection.vendor == 'sqlite' else options['processos'],
+                stdout=StringIO(),
+            )
+            self.stdout.write(f'Banco com {tamanho} pessoas populado em {time.perf_counter() - inicio:.1f}s')
+            return self._medir_cenarios(tamanho, options)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+
+    def _medir_cenarios(self, tamanho, options):
+        resultados = {}
+        for nome, funcao in self._cenarios():
+            if options['cenarios'] and not any(nome.startswith(c) for c in options['cenarios']):
+                continue
+            metricas = self._medir(funcao, options['repeticoes'])
+            resultados[nome] = metricas
+            self.stdout.write(
+                f'  {tamanho:>7} | {nome:<45} {metricas["segundos"]:>9.3f}s '
+                f'{metricas["pico_memoria_mb"]:>9.1f} MB {metricas["consultas"]:>6} consulta(s)'
+            )
+        return resultados
+
+    def _medir(self, funcao, repeticoes):
+        """Menor tempo entre as repetições, consultas da última e pico de memória numa execução à parte"""
+        tempos = []
+        for _ in range(max(repeticoes, 1)):
+            cache.clear()
+            consultas = 0
+
+            def contar(execute, sql, params, many, context):
+                nonlocal consultas
+                consultas += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(contar):
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append(time.perf_counter() - inicio)
+
+        # tracemalloc deixa o código bem mais lento: fica fora da execução cronometrada
+        cache.clear()
+        tracemalloc.start()
+        try:
+            funcao()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {'segundos': round(min(tempos), 4), 'pico_memoria_mb': round(pico / 2 ** 20, 2), 'consultas': consultas}
+
+    def _cenarios(self):
+        """(nome, função) de cada medição, montados sobre o benefício com mais ativos"""
+        usuario = get_user_model().objects.get(username=USUARIO_BENCHMARK)
+        client = Client()
+        client.force_login(usuario)
+
+        maior = (
+            Pessoa.objects.filter(status='ativo').values('beneficio')
+            .annotate(total=Count('id')).order_by('-total').first()
+        )
+        if maior is None:
+            raise CommandError('Nenhuma pessoa ativa no banco; popule-o com o seed_benchmark.')
+        beneficio = Beneficio.objects.get(pk=maior['beneficio'])
+        ativos_ids = list(PessoaFilterSet(beneficio, {}, status_padrao='ativo').pessoas().values_list('pk', flat=True))
+        documentos_ids = list(Pessoa.objects.filter(documento__isnull=False).order_by('nome_completo', 'pk')
+                              .values_list('pk', flat=True))
+        memorando = Memorando.objects.filter(beneficio=beneficio).order_by('-created_at', '-pk').first()
+        pessoa = Pessoa.objects.get(pk=ativos_ids[0])
+        cpf_numeros = ''.join(filter(str.isdigit, pessoa.cpf))
+
+        def pagina(nome, parametros='', **kwargs):
+            url = reverse(nome, kwargs=kwargs) + parametros
+            resposta = client.get(url, secure=True)
+            if resposta.status_code != 200:
+                raise CommandError(f'{url} respondeu {resposta.status_code}')
+            if resposta.streaming:
+                b''.join(resposta.streaming_content)
+            resposta.close()
+
+        def pessoas_da_tarefa(tipo, ids):
+            return carregar_pessoas(TarefaGeracao(tipo=tipo, pessoas_ids=ids))
+
+        def recibos():
+            gerar_recibos_massa_pdf(pessoas_da_tarefa('recibos_massa', ativos_ids), processos=None)
+
+        def documentos():
+            if not documentos_ids:
+                return
+            with open(os.path.join(self.pasta, 'documentos_massa.pdf'), 'wb') as destino:
+                gerar_documentos_massa_pdf(pessoas_da_tarefa('documentos_massa', documentos_ids), destino=destino)
+
+        def segunda_via():
+            if memorando is not None:
+                gerar_memorando_segunda_via_pdf(Memorando.objects.get(pk=memorando.pk))
+
+        def memorando_novo():
+            pessoas_dados = [
+                {'pessoa': p, 'nome_completo': p.nome_completo, 'valor_beneficio': p.valor_beneficio, 'ordem': i}
+                for i, p in enumerate(pessoas_da_tarefa('memorando_massa', ativos_ids), 1)
+            ]
+            with transaction.atomic():
+                registrar_memorando(beneficio, pessoas_dados, usuario)
+                transaction.set_rollback(True)  # mede sem deixar memorandos a mais no banco
+
+        cenarios = [('dashboard', lambda: pagina('dashboard'))]
+        for modelo in FILTROS_LISTAGEM:
+            filtro = modelo.format(cpf=pessoa.cpf, cpf_final=cpf_numeros[-4:])
+            cenarios.append((
+                f'pessoas_por_beneficio{modelo}',
+                lambda filtro=filtro: pagina('pessoas_por_beneficio', filtro, beneficio_id=beneficio.pk),
+            ))
+        cenarios += [
+            ('gerar_recibos_massa_pdf', recibos),
+            ('gerar_memorando_segunda_via_pdf', segunda_via),
+            ('gerar_documentos_massa_pdf', documentos),
+            ('gerar_excel_beneficiarios', lambda: pagina('gerar_relatorio_beneficiarios', '?formato=xlsx')),
+            ('gerar_relatorio_financeiro', lambda: pagina('gerar_relatorio_financeiro', '?formato=pdf')),
+            ('registrar_memorando', memorando_novo),
+        ]
+        return cenarios
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+
+from beneficios.utils import gerar_documentos_massa_pdf
+
+
+def gerar_documentos_original(pessoas, destino):
+    """Referência: a versão anterior, com todos os arquivos abertos e add_page duas vezes por via"""
+    writer = PdfWriter()
+    arquivos = []
+    try:
+        for pessoa in pessoas:
+            f = open(pessoa.documento.arquivo.path, 'rb')
+            arquivos.append(f)
+            reader = PdfReader(f)
+            total_paginas = min(len(reader.pages), 4)
+            for _ in range(2):
+                for i in range(total_paginas):
+                    writer.add_page(reader.pages[i])
+        with open(destino, 'wb') as saida:
+            writer.write(saida)
+    finally:
+        for f in arquivos:
+            f.close()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark do PDF consolidado de documentos (2 vias) com pessoas e documentos sintéticos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pessoas', type=int, default=500)
+        parser.add_argument('--paginas', type=int, default=2, help='Páginas por documento')
+        parser.add_argument('--kb-pagina', type=int, default=60, help='Tamanho aproximado de cada página (KB, não comprimível)')
+
+    def handle(self, *args, **options):
+        pasta = tempfile.mkdtemp(prefix='bench_documentos_')
+        try:
+            pessoas = self._criar_documentos(pasta, options)
+            entrada = sum(os.path.getsize(p.documento.arquivo.path) for p in pessoas)
+            self.stdout.write(f'{len(pessoas)} documentos sintéticos, {entrada / 1e6:.1f} MB de entrada')
+
+            resultados = []
+            for nome, gerar in (
+                ('Versão anterior', lambda destino: gerar_documentos_original(pessoas, destino)),
+                ('Versão atual', lambda destino: gerar_documentos_massa_pdf(pessoas, destino=destino)),
+            ):
+                destino = os.path.join(pasta, 'saida.pdf')
+                inicio = time.perf_counter()
+                gerar(destino)
+                tempo = time.perf_counter() - inicio
+                tamanho = os.path.getsize(destino)
+                paginas = len(PdfReader(destino).pages)
+                os.remove(destino)
+                resultados.append((tempo, tamanho))
+                self.stdout.write(f'{nome}: {tempo:.2f}s, {tamanho / 1e6:.1f} MB, {paginas} páginas')
+
+            (tempo_antes, tamanho_antes), (tempo_depois, tamanho_depois) = resultados
+            if tempo_depois and tamanho_depois:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Tamanho: {tamanho_depois / tamanho_antes:.0%} do anterior; '
+                    f'tempo: {tempo_depois / tempo_antes:.0%} do anterior'
+                ))
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    def _criar_documentos(self, pasta, options):
+        """Um PDF por pessoa; cada página leva bytes aleatórios para simular um scan"""
+        pessoas = []
+        for i in range(options['pessoas']):
+            caminho = os.path.join(pasta, f'doc_{i}.pdf')
+            c = canvas.Canvas(caminho, pageCompression=0)
+            for _ in range(options['paginas']):
+                c.drawString(72, 750, f'Documento {i}')
+                c.drawString(72, 700, os.urandom(options['kb_pagina'] * 512).hex())
+                c.showPage()
+            c.save()
+            pessoas.append(SimpleNamespace(
+                nome_completo=f'Pessoa {i}',
+                documento=SimpleNamespace(arquivo=SimpleNamespace(path=caminho), paginas=None),
+            ))
+        return pessoas
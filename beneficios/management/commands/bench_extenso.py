@@ -0,0 +1,62 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from num2words import num2words
+
+from beneficios.utils import valor_por_extenso, _extenso_centavos
+
+# Valores típicos de benefício: poucos valores redondos e alguns quebrados
+VALORES_COMUNS = [Decimal(v) for v in ('100', '150', '200', '250', '300', '150.29', '99.90', '412.50')]
+
+
+def valor_por_extenso_anterior(valor):
+    """Implementação anterior (sem cache, centavos calculados em float) - apenas para comparação"""
+    try:
+        reais = int(valor)
+        centavos = int((valor - reais) * 100)
+        extenso_reais = num2words(reais, lang='pt_BR')
+        if centavos > 0:
+            extenso_centavos = num2words(centavos, lang='pt_BR')
+            if reais == 1:
+                return f"{extenso_reais} real e {extenso_centavos} centavos"
+            return f"{extenso_reais} reais e {extenso_centavos} centavos"
+        if reais == 1:
+            return f"{extenso_reais} real"
+        return f"{extenso_reais} reais"
+    except:
+        return f"{valor:.2f} reais"
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark de valor_por_extenso (com cache) contra a implementação anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pessoas', type=int, default=2000, help='Quantidade de pessoas simuladas (2 chamadas por pessoa)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        valores = [rnd.choice(VALORES_COMUNS) for _ in range(options['pessoas'])]
+        chamadas = len(valores) * 2  # uma por via do recibo
+
+        tempo_anterior = self._medir(valor_por_extenso_anterior, valores)
+
+        _extenso_centavos.cache_clear()
+        tempo_atual = self._medir(valor_por_extenso, valores)
+        info = _extenso_centavos.cache_info()
+
+        self.stdout.write(f'Chamadas: {chamadas} ({len(set(valores))} valores distintos)')
+        self.stdout.write(f'Anterior: {tempo_anterior * 1000:.1f} ms ({tempo_anterior / chamadas * 1e6:.1f} µs/chamada)')
+        self.stdout.write(f'Com cache: {tempo_atual * 1000:.1f} ms ({tempo_atual / chamadas * 1e6:.1f} µs/chamada)')
+        self.stdout.write(f'Cache: {info.hits} acertos, {info.misses} faltas')
+        if tempo_atual:
+            self.stdout.write(self.style.SUCCESS(f'Ganho: {tempo_anterior / tempo_atual:.1f}x'))
+
+    def _medir(self, funcao, valores):
+        inicio = time.perf_counter()
+        for valor in valores:
+            funcao(valor)
+            funcao(valor)
+        return time.perf_counter() - inicio
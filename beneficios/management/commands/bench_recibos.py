@@ -0,0 +1,47 @@
+import os
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from PyPDF2 import PdfReader
+
+from beneficios.utils import gerar_recibos_massa_pdf
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dos recibos em massa com 1, 2, 4... processos, com pessoas sintéticas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pessoas', type=int, default=1000)
+        parser.add_argument('--processos', type=int, nargs='+', default=[1, 2, 4])
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções por quantidade de processos (vale a mais rápida)')
+
+    def handle(self, *args, **options):
+        pessoas = [
+            SimpleNamespace(
+                nome_completo=f'Pessoa Sintetica {i}',
+                cpf=f'{i:011d}',
+                valor_beneficio=Decimal('150.00') + i % 7,
+                endereco=f'Rua {i}, {i % 300}',
+                bairro='Centro',
+                cidade='Pocinhos/PB',
+                beneficio=SimpleNamespace(nome='Auxílio Transporte'),
+            )
+            for i in range(options['pessoas'])
+        ]
+        self.stdout.write(f'{len(pessoas)} pessoas, {os.cpu_count()} CPU(s) na máquina')
+
+        base = None
+        for processos in options['processos']:
+            tempos = []
+            for _ in range(max(options['repeticoes'], 1)):
+                inicio = time.perf_counter()
+                buffer = gerar_recibos_massa_pdf(pessoas, processos=processos)
+                tempos.append(time.perf_counter() - inicio)
+            paginas = len(PdfReader(buffer).pages)
+            tempo = min(tempos)
+            base = base or tempo
+            self.stdout.write(
+                f'{processos} processo(s): {tempo:.2f}s, {paginas} páginas, {base / tempo:.2f}x em relação ao primeiro'
+            )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from beneficios.models import Documento
+
+
+class Command(BaseCommand):
+    help = 'Normaliza os PDFs já enviados (máx. 4 páginas, recomprimidos) e preenche páginas, tamanho e hash'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true',
+                            help='Relê também os documentos cujos metadados batem com o tamanho do arquivo')
+        parser.add_argument('--apenas-metadados', action='store_true', help='Não reescreve os arquivos, só preenche os metadados')
+
+    def handle(self, *args, **options):
+        documentos = Documento.objects.only('id', 'arquivo', 'paginas', 'tamanho', 'hash_conteudo').order_by('id')
+
+        processados = reescritos = ilegiveis = 0
+        bytes_antes = bytes_depois = 0
+        for documento in documentos.iterator(chunk_size=200):
+            try:
+                tamanho_original = documento.arquivo.size
+                # Metadados só valem enquanto o arquivo tiver o tamanho registrado (pode ter
+                # sido trocado direto no disco ou restaurado de um backup)
+                if not options['todos'] and documento.tamanho == tamanho_original:
+                    continue
+                reescrito = documento.normalizar_arquivo(reescrever=not options['apenas_metadados'])
+            except FileNotFoundError:
+                self.stderr.write(f'Documento {documento.pk}: arquivo não encontrado ({documento.arquivo.name})')
+                continue
+
+            # update() em vez de save(): metadado técnico, sem gerar uma entrada de auditoria por documento
+            Documento.objects.filter(pk=documento.pk).update(
+                paginas=documento.paginas,
+                tamanho=documento.tamanho,
+                hash_conteudo=documento.hash_conteudo,
+            )
+            processados += 1
+            reescritos += reescrito
+            ilegiveis += documento.paginas is None
+            bytes_antes += tamanho_original
+            bytes_depois += documento.tamanho
+
+        self.stdout.write(f'{reescritos} arquivo(s) reescrito(s), {ilegiveis} PDF(s) ilegível(is) mantido(s) como estavam.')
+        self.stdout.write(self.style.SUCCESS(
+            f'{processados} documento(s) processado(s): {bytes_antes / 1e6:.1f} MB -> {bytes_depois / 1e6:.1f} MB.'
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from beneficios import metricas
+from beneficios.tarefas import pegar_proxima_tarefa, executar_tarefa, limpar_tarefas_antigas
+from beneficios.utils import aquecer_valor_por_extenso
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de gerações em massa (memorando, recibos e documentos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true', help='Processa as tarefas pendentes e sai')
+        parser.add_argument('--intervalo', type=float, default=2, help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--processos', type=int, default=None, help='Processos para renderizar recibos (padrão: número de CPUs)')
+
+    def handle(self, *args, **options):
+        aquecer_valor_por_extenso()
+
+        while True:
+            close_old_connections()
+            tarefa = pegar_proxima_tarefa()
+
+            if tarefa is None:
+                travadas, removidos = limpar_tarefas_antigas()
+                if travadas or removidos:
+                    self.stdout.write(f'Limpeza: {travadas} tarefa(s) travada(s), {removidos} arquivo(s) expirado(s).')
+                if options['uma_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+
+            inicio = time.monotonic()
+            executar_tarefa(tarefa, processos=options['processos'])
+            duracao = time.monotonic() - inicio
+            metricas.gravar(forcar=True)
+
+            if tarefa.status == 'sucesso':
+                self.stdout.write(self.style.SUCCESS(f'{tarefa} - {tarefa.total} pessoa(s) em {duracao:.1f}s'))
+            else:
+                self.stderr.write(f'{tarefa}: {tarefa.mensagem}')
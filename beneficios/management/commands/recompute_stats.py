@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from beneficios.models import Beneficio, BeneficioStats
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói e confere os contadores por benefício (BeneficioStats)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--beneficio', type=int, action='append', help='ID do benefício (pode repetir; padrão: todos)')
+        parser.add_argument('--verificar', action='store_true', help='Apenas confere, sem gravar; sai com erro se houver divergência')
+    
+    def handle(self, *args, **options):
+        ids = options['beneficio']
+        if ids:
+            existentes = set(Beneficio.objects.filter(id__in=ids).values_list('id', flat=True))
+            faltando = sorted(set(ids) - existentes)
+            if faltando:
+                raise CommandError(f'Benefício não encontrado: {", ".join(map(str, faltando))}')
+        
+        if options['verificar']:
+            divergencias = self._comparar(ids)
+        else:
+            divergencias = BeneficioStats.recalcular(ids)
+        
+        for beneficio_id, campos in sorted(divergencias.items()):
+            for campo, (gravado, real) in sorted(campos.items()):
+                self.stdout.write(f'Benefício {beneficio_id}: {campo} = {gravado} (real: {real})')
+        
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('Contadores conferidos: nenhuma divergência.'))
+        elif options['verificar']:
+            raise CommandError(f'{len(divergencias)} benefício(s) com contadores divergentes.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} benefício(s) corrigido(s).'))
+    
+    def _comparar(self, ids):
+        gravados = {s.pk: s for s in BeneficioStats.objects.all()}
+        divergencias = {}
+        for beneficio_id, contadores in BeneficioStats.calcular(ids).items():
+            stats = gravados.get(beneficio_id) or BeneficioStats(beneficio_id=beneficio_id)
+            diferentes = stats.comparar(contadores)
+            if diferentes:
+                divergencias[beneficio_id] = diferentes
+        return divergencias
@@ -0,0 +1,355 @@
+import hashlib
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from reportlab.pdfgen import canvas
+
+from beneficios.models import (
+    Beneficio, BeneficioStats, Documento, HistoricoStatus, LogAcao, Memorando, Pessoa,
+    RegistroAuditoria, gerar_cpf_hash,
+)
+from beneficios.services import registrar_memorando
+
+USUARIO_BENCHMARK = 'benchmark'
+
+BENEFICIOS = [
+    ('Auxílio Aluguel', 'bi-house-door'),
+    ('Auxílio Alimentação', 'bi-basket'),
+    ('Auxílio Transporte', 'bi-bus-front'),
+    ('Bolsa Estudante', 'bi-mortarboard'),
+    ('Benefício Eventual', 'bi-heart'),
+    ('Auxílio Natalidade', 'bi-gift'),
+]
+
+PRENOMES_F = [
+    'Maria', 'Ana', 'Francisca', 'Antônia', 'Adriana', 'Juliana', 'Márcia', 'Fernanda', 'Patrícia', 'Aline',
+    'Sandra', 'Camila', 'Amanda', 'Bruna', 'Jéssica', 'Letícia', 'Júlia', 'Luciana', 'Vanessa', 'Mariana',
+    'Josefa', 'Severina', 'Rita', 'Cícera', 'Luzia',
+]
+PRENOMES_M = [
+    'José', 'João', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas', 'Luiz', 'Marcos',
+    'Luís', 'Gabriel', 'Rafael', 'Daniel', 'Marcelo', 'Bruno', 'Eduardo', 'Felipe', 'Raimundo', 'Rodrigo',
+    'Severino', 'Manoel', 'Sebastião', 'Joaquim', 'Damião',
+]
+SOBRENOMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa', 'Rodrigues', 'Almeida',
+    'Nascimento', 'Alves', 'Carvalho', 'Araújo', 'Ribeiro', 'Barbosa', 'Cavalcante', 'Medeiros', 'Dantas', 'Farias',
+    'Gomes', 'Batista', 'Freitas', 'Macedo', 'Andrade', 'Melo', 'Bezerra', 'Tavares', 'Queiroz', 'Diniz',
+]
+PARTICULAS = ['', '', '', 'da ', 'de ', 'dos ']
+
+# (opção, peso) para os sorteios
+BAIRROS = [
+    ('Centro', 30), ('Cruzeiro', 14), ('Alto da Boa Vista', 12), ('São José', 10), ('Conjunto Novo Horizonte', 8),
+    ('Bela Vista', 7), ('Santa Rita', 6), ('Zona Rural', 6), ('Vila Nova', 4), ('Sítio Lagoa de Pedra', 3),
+]
+# A maior parte até 300, com alguns valores altos
+VALORES = [
+    (Decimal('50.00'), 5), (Decimal('100.00'), 28), (Decimal('150.00'), 24), (Decimal('200.00'), 15),
+    (Decimal('250.00'), 10), (Decimal('300.00'), 8), (Decimal('412.50'), 5), (Decimal('600.00'), 3),
+    (Decimal('1412.00'), 2),
+]
+STATUS = [('ativo', 80), ('em_espera', 12), ('desligado', 8)]
+
+ANOS_HISTORICO = 3
+FRACAO_RECIBOS = 0.2  # pessoas com um recibo individual no log de ações
+MULTIPLICADOR_CPF = 387420489  # 3^18, primo com 10^9: embaralha a sequência sem repetir
+
+
+def _sortear(rng, pesos):
+    return rng.choices([v for v, _ in pesos], weights=[p for _, p in pesos])[0]
+
+
+def gerar_cpf(indice):
+    """CPF válido e formatado, único para cada índice (até 10^9)"""
+    base = f'{(indice * MULTIPLICADOR_CPF + 123456789) % 10 ** 9:09d}'
+    if base == base[0] * 9:
+        base = base[:-1] + str((int(base[-1]) + 1) % 10)
+    digitos = [int(d) for d in base]
+    for pesos in (range(10, 1, -1), range(11, 1, -1)):
+        resto = sum(d * p for d, p in zip(digitos, pesos)) % 11
+        digitos.append(0 if resto < 2 else 11 - resto)
+    cpf = ''.join(map(str, digitos))
+    return f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
+
+
+def _nome(rng, sexo):
+    prenome = rng.choice(PRENOMES_F if sexo == 'F' else PRENOMES_M)
+    sobrenomes = rng.sample(SOBRENOMES, rng.choice((2, 2, 3)))
+    return ' '.join([prenome] + [rng.choice(PARTICULAS) + s for s in sobrenomes])
+
+
+_pdf_processo = {}
+
+
+def pdf_ficticio(paginas, kb_pagina):
+    """PDF com páginas de bytes aleatórios (simula um scan); gerado uma vez por processo"""
+    chave = (paginas, kb_pagina)
+    if chave not in _pdf_processo:
+        buffer = BytesIO()
+        c = canvas.Canvas(buffer, pageCompression=0)
+        for _ in range(paginas):
+            c.drawString(72, 750, 'Documento de benchmark')
+            c.drawString(72, 700, os.urandom(kb_pagina * 512).hex())
+            c.showPage()
+        c.save()
+        _pdf_processo[chave] = buffer.getvalue()
+    return _pdf_processo[chave]
+
+
+def gerar_lote(inicio, quantidade, parametros):
+    """
+    Cria as pessoas [inicio, inicio + quantidade) com histórico, auditoria e
+    documentos, em uma transação. Roda no processo filho: o bulk_create
+    criptografa os CPFs aqui, em paralelo com os outros lotes.
+    """
+    rng = random.Random(parametros['semente'] * 1_000_003 + inicio)
+    agora = timezone.now()
+    usuario = get_user_model().objects.get(pk=parametros['usuario_id'])
+    tipo_pessoa = ContentType.objects.get_for_model(Pessoa)
+    janela = ANOS_HISTORICO * 365 * 86400
+
+    pessoas = []
+    for indice in range(inicio, inicio + quantidade):
+        sexo = rng.choice('FFFM')  # cadastros majoritariamente femininos
+        cpf = gerar_cpf(parametros['deslocamento'] + indice)
+        criada_em = agora - timedelta(seconds=rng.uniform(0, janela))
+        pessoa = Pessoa(
+            nome_completo=_nome(rng, sexo),
+            cpf=cpf,
+            cpf_ultimos_4=cpf.replace('-', '')[-4:],
+            cpf_hash=gerar_cpf_hash(cpf),
+            sexo=sexo,
+            data_nascimento=(agora - timedelta(days=rng.randint(18 * 365, 85 * 365))).date(),
+            celular=f'(83) 9{rng.randint(8000, 9999)}-{rng.randint(0, 9999):04d}',
+            endereco=f'Rua {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}, {rng.randint(1, 999)}',
+            bairro=_sortear(rng, BAIRROS),
+            cidade='Pocinhos/PB',
+            valor_beneficio=_sortear(rng, VALORES),
+            beneficio_id=rng.choice(parametros['beneficios_ids']),
+            status=_sortear(rng, STATUS),
+        )
+        pessoa._criada_em = criada_em
+        pessoas.append(pessoa)
+
+    with transaction.atomic():
+        Pessoa.objects.bulk_create(pessoas, batch_size=parametros['lote'])
+        for pessoa in pessoas:
+            # auto_now_add sobrescreve no INSERT; as datas espalhadas entram no bulk_update
+            pessoa.created_at = pessoa.updated_at = pessoa._criada_em
+        Pessoa.objects.bulk_update(pessoas, ['created_at', 'updated_at'], batch_size=parametros['lote'])
+
+        historico, entradas, acoes = [], [], []
+        for pessoa in pessoas:
+            historico.append(HistoricoStatus(
+                pessoa=pessoa, status_anterior=None, status_novo='ativo', data=pessoa.created_at, usuario=usuario,
+            ))
+            entradas.append(LogEntry(
+                content_type=tipo_pessoa,
+                object_pk=str(pessoa.pk),
+                object_id=pessoa.pk,
+                object_repr=str(pessoa),
+                action=LogEntry.Action.CREATE,
+                changes=model_instance_diff(
+                    None, pessoa, use_json_for_changes=settings.AUDITLOG_STORE_JSON_CHANGES,
+                ),
+                actor=usuario,
+                remote_addr='127.0.0.1',
+                timestamp=pessoa.created_at,
+            ))
+            if pessoa.status != 'ativo':
+                data = pessoa.created_at + (agora - pessoa.created_at) * rng.random()
+                historico.append(HistoricoStatus(
+                    pessoa=pessoa, status_anterior='ativo', status_novo=pessoa.status, data=data, usuario=usuario,
+                ))
+                tipo = 'status_espera' if pessoa.status == 'em_espera' else 'status_desligar'
+                acoes.append((LogAcao(
+                    usuario=usuario, tipo=tipo, ip='127.0.0.1',
+                    descricao=f'{pessoa.nome_completo} - ativo → {pessoa.status}',
+                ), data))
+            if rng.random() < FRACAO_RECIBOS:
+                data = pessoa.created_at + (agora - pessoa.created_at) * rng.random()
+                acoes.append((LogAcao(
+                    usuario=usuario, tipo='recibo_individual', ip='127.0.0.1',
+                    descricao=f'Recibo - {pessoa.nome_completo}',
+                ), data))
+
+        HistoricoStatus.objects.bulk_create(historico, batch_size=parametros['lote'])
+        entradas = LogEntry.objects.bulk_create(entradas, batch_size=parametros['lote'])
+        LogAcao.objects.bulk_create([acao for acao, _ in acoes], batch_size=parametros['lote'])
+        for acao, data in acoes:
+            acao.created_at = data
+        LogAcao.objects.bulk_update([acao for acao, _ in acoes], ['created_at'], batch_size=parametros['lote'])
+        RegistroAuditoria.objects.bulk_create(
+            [RegistroAuditoria.de_log_entry(entrada) for entrada in entradas]
+            + [RegistroAuditoria.de_log_acao(acao) for acao, _ in acoes],
+            batch_size=parametros['lote'],
+        )
+
+        documentos = _gerar_documentos(pessoas, inicio, parametros)
+
+    return {
+        'pessoas': len(pessoas), 'historico': len(historico), 'auditoria': len(entradas) + len(acoes),
+        'documentos': documentos,
+    }
+
+
+def _gerar_lote_no_filho(inicio, quantidade, parametros):
+    try:
+        return gerar_lote(inicio, quantidade, parametros)
+    finally:
+        connections.close_all()
+
+
+def _gerar_documentos(pessoas, inicio, parametros):
+    """Um PDF fictício para cada pessoa com índice abaixo de --documentos"""
+    com_documento = pessoas[:max(0, parametros['documentos'] - inicio)]
+    if not com_documento:
+        return 0
+    conteudo = pdf_ficticio(parametros['paginas'], parametros['kb_pagina'])
+    hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+    documentos = [
+        Documento(
+            pessoa=pessoa,
+            arquivo=default_storage.save(f'documentos/benchmark/{pessoa.pk}.pdf', ContentFile(conteudo)),
+            paginas=parametros['paginas'],
+            tamanho=len(conteudo),
+            hash_conteudo=hash_conteudo,
+        )
+        for pessoa in com_documento
+    ]
+    Documento.objects.bulk_create(documentos, batch_size=parametros['lote'])
+    return len(documentos)
+
+
+class Command(BaseCommand):
+    help = 'Popula o banco com beneficiários sintéticos (histórico, memorandos, auditoria e documentos) para benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pessoas', type=int, default=10000)
+        parser.add_argument('--memorandos', type=int, default=6, help='Memorandos mensais por benefício (com snapshot dos ativos)')
+        parser.add_argument('--documentos', type=int, default=0, help='Quantas pessoas recebem um PDF fictício')
+        parser.add_argument('--paginas', type=int, default=2, help='Páginas de cada PDF fictício')
+        parser.add_argument('--kb-pagina', type=int, default=60, help='Tamanho aproximado de cada página (KB)')
+        parser.add_argument('--lote', type=int, default=1000, help='Pessoas por transação/bulk_create')
+        parser.add_argument('--processos', type=int, default=None, help='Processos em paralelo (padrão: núcleos da máquina)')
+        parser.add_argument('--semente', type=int, default=1, help='Semente dos sorteios (mesma semente, mesmos dados)')
+        parser.add_argument('--acrescentar', action='store_true', help='Permite rodar com pessoas já cadastradas')
+
+    def handle(self, *args, **options):
+        existentes = Pessoa.objects.count()
+        if existentes and not options['acrescentar']:
+            raise CommandError(f'O banco já tem {existentes} pessoa(s); use --acrescentar para somar mais.')
+        if options['pessoas'] < 1 or options['lote'] < 1:
+            raise CommandError('--pessoas e --lote devem ser maiores que zero.')
+
+        inicio_total = time.perf_counter()
+        usuario = self._usuario()
+        beneficios = self._beneficios()
+        parametros = {
+            'semente': options['semente'],
+            'deslocamento': existentes,  # CPFs novos continuam a sequência das execuções anteriores
+            'usuario_id': usuario.pk,
+            'beneficios_ids': [b.pk for b in beneficios],
+            'lote': options['lote'],
+            'documentos': options['documentos'],
+            'paginas': options['paginas'],
+            'kb_pagina': options['kb_pagina'],
+        }
+
+        lotes = [
+            (inicio, min(options['lote'], options['pessoas'] - inicio))
+            for inicio in range(0, options['pessoas'], options['lote'])
+        ]
+        totais = self._gerar_lotes(lotes, parametros, options['processos'])
+        self.stdout.write(
+            f'{totais["pessoas"]} pessoas, {totais["historico"]} registros de histórico, '
+            f'{totais["auditoria"]} registros de auditoria e {totais["documentos"]} documento(s) '
+            f'em {time.perf_counter() - inicio_total:.1f}s'
+        )
+
+        BeneficioStats.recalcular([b.pk for b in beneficios])
+        memorandos, snapshots = self._memorandos(beneficios, usuario, options['memorandos'])
+        self.stdout.write(f'{memorandos} memorando(s) com {snapshots} pessoas no snapshot')
+        self.stdout.write(self.style.SUCCESS(f'Concluído em {time.perf_counter() - inicio_total:.1f}s.'))
+
+    def _usuario(self):
+        User = get_user_model()
+        usuario, criado = User.objects.get_or_create(
+            username=USUARIO_BENCHMARK,
+            defaults={'nome_completo': 'Usuário de Benchmark', 'is_staff': True, 'must_change_password': False},
+        )
+        if criado:
+            usuario.set_unusable_password()
+            usuario.save(update_fields=['password'])
+        return usuario
+
+    def _beneficios(self):
+        beneficios = []
+        for nome, icone in BENEFICIOS:
+            beneficio, _ = Beneficio.objects.get_or_create(
+                nome=nome, defaults={'icone': icone, 'conta_pagadora': f'Conta {nome}', 'ativo': True},
+            )
+            beneficios.append(beneficio)
+        return beneficios
+
+    def _gerar_lotes(self, lotes, parametros, processos):
+        totais = {'pessoas': 0, 'historico': 0, 'auditoria': 0, 'documentos': 0}
+        processos = min(processos or os.cpu_count() or 1, len(lotes))
+
+        def somar(resultado):
+            for chave, valor in resultado.items():
+                totais[chave] += valor
+            self.stdout.write(f'  {totais["pessoas"]} pessoas...', ending='\r')
+
+        if processos == 1:
+            for inicio, quantidade in lotes:
+                somar(gerar_lote(inicio, quantidade, parametros))
+            return totais
+
+        # fork: os filhos herdam o Django já configurado; a conexão é fechada antes
+        # para que cada filho abra a sua, em vez de dividir o socket com o pai
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+            futuros = [executor.submit(_gerar_lote_no_filho, inicio, quantidade, parametros) for inicio, quantidade in lotes]
+            for futuro in futuros:
+                somar(futuro.result())
+        return totais
+
+    def _memorandos(self, beneficios, usuario, quantidade):
+        """Memorandos mensais de cada benefício pelo serviço real, com as datas recuadas mês a mês"""
+        total = snapshots = 0
+        agora = timezone.now()
+        for beneficio in beneficios:
+            ativos = Pessoa.objects.filter(beneficio=beneficio, status='ativo').order_by('nome_completo')
+            dados = [
+                {'pessoa': Pessoa(pk=pk), 'nome_completo': nome, 'valor_beneficio': valor, 'ordem': ordem}
+                for ordem, (pk, nome, valor) in enumerate(
+                    ativos.values_list('pk', 'nome_completo', 'valor_beneficio'), 1,
+                )
+            ]
+            if not dados:
+                continue
+            for mes in range(quantidade, 0, -1):
+                memorando = registrar_memorando(beneficio, dados, usuario)
+                Memorando.objects.filter(pk=memorando.pk).update(created_at=agora - timedelta(days=30 * mes))
+                total += 1
+                snapshots += len(dados)
+        return total, snapshots
@@ -0,0 +1,210 @@
+"""
+Métricas de execução no formato texto do Prometheus, somadas entre os workers.
+
+Cada processo (workers do gunicorn e o processar_tarefas) acumula contadores e
+histogramas em memória e grava um snapshot em METRICAS_DIR/<pid>-<id>.json: ao
+fim de cada tarefa e, nas requisições, no máximo a cada INTERVALO_GRAVACAO
+segundos (o worker_exit do gunicorn grava o que faltar). O /metrics soma os snapshots de todos os
+processos, inclusive os de workers que já morreram, para os contadores nunca
+andarem para trás. Quando o gunicorn sobe (on_starting), saem os snapshots
+de processos que não existem mais.
+Sem METRICAS_DIR, só o próprio processo é exposto.
+"""
+import json
+import os
+import time
+from uuid import uuid4
+
+from django.conf import settings
+
+from . import tempos
+
+INTERVALO_GRAVACAO = 5  # segundos mínimos entre snapshots de um mesmo processo
+
+BUCKETS_SEGUNDOS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BUCKETS_PESSOAS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# nome: (tipo, ajuda, buckets)
+METRICAS = {
+    'gesocial_requisicoes_total': ('counter', 'Requisições por view, método e status HTTP', None),
+    'gesocial_requisicao_segundos': ('histogram', 'Duração das requisições por view', BUCKETS_SEGUNDOS),
+    'gesocial_sql_consultas_total': ('counter', 'Consultas SQL executadas por view', None),
+    'gesocial_sql_segundos_total': ('counter', 'Tempo gasto em SQL por view', None),
+    'gesocial_resposta_bytes_total': ('counter', 'Bytes de corpo de resposta por view', None),
+    'gesocial_pdf_paginas_total': ('counter', 'Páginas de PDF geradas por tipo de documento', None),
+    'gesocial_pdf_segundos_total': ('counter', 'Tempo renderizando/juntando PDFs por tipo de documento', None),
+    'gesocial_memorando_pessoas': ('histogram', 'Pessoas por memorando registrado', BUCKETS_PESSOAS),
+}
+
+_ID_PROCESSO = uuid4().hex[:8]
+_contadores = {}    # (nome, labels) -> valor
+_histogramas = {}   # (nome, labels) -> [contagem por bucket..., soma, total]
+_ultima_gravacao = None  # time.monotonic() do último snapshot
+
+
+def _chave(nome, labels):
+    return nome, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def incrementar(nome, valor=1, **labels):
+    chave = _chave(nome, labels)
+    _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def observar(nome, valor, **labels):
+    buckets = METRICAS[nome][2]
+    chave = _chave(nome, labels)
+    serie = _histogramas.get(chave)
+    if serie is None:
+        serie = _histogramas[chave] = [0] * (len(buckets) + 2)
+    for i, limite in enumerate(buckets):
+        if valor <= limite:
+            serie[i] += 1
+    serie[-2] += valor
+    serie[-1] += 1
+
+
+def registrar_pdf(tipo, paginas, inicio):
+    """Páginas e tempo (desde inicio = time.perf_counter()) de um PDF gerado"""
+    segundos = time.perf_counter() - inicio
+    incrementar('gesocial_pdf_paginas_total', paginas, tipo=tipo)
+    incrementar('gesocial_pdf_segundos_total', segundos, tipo=tipo)
+    tempos.somar('pdf', segundos)
+
+
+def zerar():
+    global _ultima_gravacao
+    _contadores.clear()
+    _histogramas.clear()
+    _ultima_gravacao = None
+
+
+# ── Snapshots por processo ──
+
+def _diretorio():
+    return getattr(settings, 'METRICAS_DIR', None)
+
+
+def _arquivo_proprio():
+    return f'{os.getpid()}-{_ID_PROCESSO}.json'
+
+
+def _serializar():
+    return {
+        'contadores': [[nome, labels, valor] for (nome, labels), valor in _contadores.items()],
+        'histogramas': [[nome, labels, serie] for (nome, labels), serie in _histogramas.items()],
+    }
+
+
+def gravar(forcar=False):
+    """
+    Grava o snapshot deste processo (troca atômica do arquivo), no máximo uma
+    vez a cada INTERVALO_GRAVACAO segundos, a não ser com forcar=True.
+    """
+    global _ultima_gravacao
+    diretorio = _diretorio()
+    if not diretorio or not (_contadores or _histogramas):
+        return
+    agora = time.monotonic()
+    if not forcar and _ultima_gravacao is not None and agora - _ultima_gravacao < INTERVALO_GRAVACAO:
+        return
+    _ultima_gravacao = agora
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, _arquivo_proprio())
+    with open(caminho + '.tmp', 'w') as f:
+        json.dump(_serializar(), f)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, só é de outro usuário
+    return True
+
+
+def limpar_snapshots():
+    """
+    Apaga os snapshots de processos que já terminaram (gunicorn on_starting).
+    Os de processos vivos, como o processar_tarefas, continuam somando.
+    """
+    diretorio = _diretorio()
+    if not diretorio or not os.path.isdir(diretorio):
+        return
+    for nome in os.listdir(diretorio):
+        if not (nome.endswith('.json') or nome.endswith('.tmp')):
+            continue
+        pid = nome.split('-', 1)[0]
+        if pid.isdigit() and _processo_vivo(int(pid)):
+            continue
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except FileNotFoundError:
+            pass
+
+
+def _snapshots():
+    """Este processo (da memória) e os demais (dos arquivos)"""
+    yield _serializar()
+    diretorio = _diretorio()
+    if not diretorio or not os.path.isdir(diretorio):
+        return
+    proprio = _arquivo_proprio()
+    for nome in os.listdir(diretorio):
+        if not nome.endswith('.json') or nome == proprio:
+            continue
+        try:
+            with open(os.path.join(diretorio, nome)) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue  # processo gravando agora ou arquivo removido
+
+
+# ── Exposição ──
+
+def _rotulos(labels, extra=()):
+    pares = list(labels) + list(extra)
+    if not pares:
+        return ''
+    escapar = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar():
+    """Texto no formato de exposição do Prometheus (0.0.4), somando todos os processos"""
+    contadores = {}
+    histogramas = {}
+    for snapshot in _snapshots():
+        for nome, labels, valor in snapshot['contadores']:
+            chave = (nome, tuple(map(tuple, labels)))
+            contadores[chave] = contadores.get(chave, 0) + valor
+        for nome, labels, serie in snapshot['histogramas']:
+            chave = (nome, tuple(map(tuple, labels)))
+            atual = histogramas.get(chave)
+            histogramas[chave] = serie if atual is None else [a + b for a, b in zip(atual, serie)]
+
+    linhas = []
+    for nome, (tipo, ajuda, buckets) in METRICAS.items():
+        linhas.append(f'# HELP {nome} {ajuda}')
+        linhas.append(f'# TYPE {nome} {tipo}')
+        if tipo == 'counter':
+            for (n, labels), valor in sorted(contadores.items()):
+                if n == nome:
+                    linhas.append(f'{nome}{_rotulos(labels)} {_numero(valor)}')
+            continue
+        for (n, labels), serie in sorted(histogramas.items()):
+            if n != nome:
+                continue
+            for limite, contagem in zip(buckets, serie):
+                linhas.append(f'{nome}_bucket{_rotulos(labels, [("le", _numero(float(limite)))])} {contagem}')
+            linhas.append(f'{nome}_bucket{_rotulos(labels, [("le", "+Inf")])} {serie[-1]}')
+            linhas.append(f'{nome}_sum{_rotulos(labels)} {_numero(serie[-2])}')
+            linhas.append(f'{nome}_count{_rotulos(labels)} {serie[-1]}')
+    return '\n'.join(linhas) + '\n'
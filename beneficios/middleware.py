@@ -1,6 +1,16 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from . import metricas, tempos
+from .auditoria import auditoria_em_lote
+
+logger = logging.getLogger(__name__)
+
 
 class ForcarTrocaSenhaMiddleware:
     """Redireciona usuário para trocar senha se must_change_password=True"""
@@ -23,3 +33,111 @@ class ForcarTrocaSenhaMiddleware:
                     return redirect('trocar_senha')
         
         return self.get_response(request)
+
+
+class AuditoriaEmLoteMiddleware:
+    """Grava a auditoria da requisição (auditlog e LogAcao) em lote, depois do commit"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with auditoria_em_lote():
+            return self.get_response(request)
+
+
+class RenovarSessaoMiddleware:
+    """
+    Expiração deslizante da sessão sem um UPDATE por requisição.
+
+    Substitui o SESSION_SAVE_EVERY_REQUEST: a sessão só é marcada para gravar
+    (o que empurra a expiração para agora + SESSION_COOKIE_AGE) quando já se
+    passou SESSAO_FRACAO_RENOVACAO da janela desde a última gravação. A
+    sessão continua expirando no máximo 1h depois do último uso; com 0.1, o
+    usuário parado pode perder a sessão até 6 minutos antes disso.
+    """
+
+    CHAVE = '_renovada_em'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if session is None:
+            return response
+        renovada_em = session.get(self.CHAVE, 0)
+        if session.is_empty():
+            return response  # anônimo ou sessão expirada: não cria sessão nova
+
+        agora = int(time.time())
+        intervalo = settings.SESSION_COOKIE_AGE * settings.SESSAO_FRACAO_RENOVACAO
+        if session.modified or agora - renovada_em >= intervalo:
+            session[self.CHAVE] = agora
+        return response
+
+
+class MetricasMiddleware:
+    """
+    Mede cada requisição: duração, tempo da view, consultas SQL (quantidade
+    e tempo), renderização de templates, PDF e bytes de resposta, por nome
+    de URL. Alimenta o /metrics, devolve os tempos no cabeçalho
+    Server-Timing (aparecem no devtools do navegador; só para staff ou com
+    DEBUG, já que revelam SQL e PDFs de cada página) e avisa no log quando
+    a view passa do orçamento de consultas de ORCAMENTO_CONSULTAS. Fica no
+    topo do MIDDLEWARE para medir a requisição inteira.
+    """
+
+    # etapa do tempos: descrição no Server-Timing ({} = quantidade)
+    ETAPAS = {'sql': '{} consulta(s) SQL', 'template': '{} template(s)', 'pdf': '{} PDF(s)'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        with tempos.medir_requisicao() as etapas, connection.execute_wrapper(tempos.sql_medido):
+            response = self.get_response(request)
+        fim = time.perf_counter()
+        duracao = fim - inicio
+        sql_segundos, consultas = etapas.get('sql', (0.0, 0))
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'desconhecida'
+        metricas.incrementar('gesocial_requisicoes_total', view=view, metodo=request.method, status=response.status_code)
+        metricas.observar('gesocial_requisicao_segundos', duracao, view=view)
+        metricas.incrementar('gesocial_sql_consultas_total', consultas, view=view)
+        metricas.incrementar('gesocial_sql_segundos_total', sql_segundos, view=view)
+        tamanho = response.get('Content-Length')
+        if tamanho is None and not response.streaming:
+            tamanho = len(response.content)
+        if tamanho is not None:
+            metricas.incrementar('gesocial_resposta_bytes_total', int(tamanho), view=view)
+        metricas.gravar()
+
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = self._server_timing(request, etapas, fim, duracao)
+        orcamento = settings.ORCAMENTO_CONSULTAS.get(view)
+        if orcamento is not None and consultas > orcamento:
+            logger.warning(
+                '%s fez %d consultas SQL (orçamento: %d) em %.0f ms: %s',
+                view, consultas, orcamento, sql_segundos * 1000, request.get_full_path(),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._inicio_view = time.perf_counter()
+
+    def _server_timing(self, request, etapas, fim, duracao):
+        partes = []
+        for etapa, descricao in self.ETAPAS.items():
+            if etapa in etapas:
+                segundos, quantidade = etapas[etapa]
+                partes.append(f'{etapa};dur={segundos * 1000:.1f};desc="{descricao.format(quantidade)}"')
+        inicio_view = getattr(request, '_inicio_view', None)
+        if inicio_view is not None:
+            partes.append(f'view;dur={(fim - inicio_view) * 1000:.1f};desc="View"')
+        partes.append(f'total;dur={duracao * 1000:.1f};desc="Total"')
+        return ', '.join(partes)
@@ -0,0 +1,50 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def chave_cpf_hash():
+    return hmac.new(settings.FIELD_ENCRYPTION_KEY.encode(), b'cpf-blind-index', hashlib.sha256).digest()
+
+
+def cpf_hash(cpf, chave):
+    """Mesma regra de models.gerar_cpf_hash, copiada para a migração não mudar com o código do app"""
+    cpf_numeros = ''.join(filter(str.isdigit, cpf or ''))
+    if not cpf_numeros:
+        return ''
+    return hmac.new(chave, cpf_numeros.encode(), hashlib.sha256).hexdigest()
+
+
+def preencher_cpf_hash(apps, schema_editor):
+    Pessoa = apps.get_model('beneficios', 'Pessoa')
+    chave = chave_cpf_hash()
+
+    lote = []
+    for pessoa in Pessoa.objects.only('id', 'cpf').iterator(chunk_size=500):
+        pessoa.cpf_hash = cpf_hash(pessoa.cpf, chave)
+        if not pessoa.cpf_hash:
+            continue
+        lote.append(pessoa)
+        if len(lote) >= 500:
+            Pessoa.objects.bulk_update(lote, ['cpf_hash'])
+            lote = []
+    if lote:
+        Pessoa.objects.bulk_update(lote, ['cpf_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0028_memorando_beneficio_nome'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pessoa',
+            name='cpf_hash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(preencher_cpf_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:01
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verificar_cpfs_repetidos(apps, schema_editor):
+    """
+    Interrompe a migração, listando os registros, se o mesmo CPF já estiver
+    em mais de um cadastro não desligado (a constraint falharia com um erro
+    do banco). Desligue os registros a mais e rode o migrate de novo.
+    """
+    Pessoa = apps.get_model('beneficios', 'Pessoa')
+    repetidos = (
+        Pessoa.objects.exclude(status='desligado').exclude(cpf_hash='')
+        .values('cpf_hash').annotate(total=Count('id')).filter(total__gt=1)
+        .values_list('cpf_hash', flat=True)
+    )
+    linhas = []
+    for cpf_hash in repetidos:
+        pessoas = (
+            Pessoa.objects.filter(cpf_hash=cpf_hash).exclude(status='desligado')
+            .select_related('beneficio').order_by('id')
+        )
+        linhas.append('; '.join(
+            f'id {p.id} ({p.nome_completo}, {p.beneficio.nome}, {p.status})' for p in pessoas
+        ))
+    if linhas:
+        raise RuntimeError(
+            'CPF repetido em cadastros ativos ou em espera. Desligue os registros a mais '
+            'e rode o migrate de novo:\n' + '\n'.join(f'  - {linha}' for linha in linhas)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0029_pessoa_cpf_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_cpfs_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pessoa',
+            constraint=models.UniqueConstraint(condition=models.Q(models.Q(('status', 'desligado'), _negated=True), models.Q(('cpf_hash', ''), _negated=True)), fields=('cpf_hash',), name='unique_cpf_nao_desligado'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+FAIXAS = [
+    ('ate_100', None, 100),
+    ('de_101_150', 100, 150),
+    ('de_151_200', 150, 200),
+    ('de_201_250', 200, 250),
+    ('de_251_300', 250, 300),
+    ('acima_300', 300, None),
+]
+
+
+def preencher_stats(apps, schema_editor):
+    Beneficio = apps.get_model('beneficios', 'Beneficio')
+    Pessoa = apps.get_model('beneficios', 'Pessoa')
+    BeneficioStats = apps.get_model('beneficios', 'BeneficioStats')
+
+    ativo = Q(status='ativo')
+    agregados = {
+        'ativos': Count('id', filter=ativo),
+        'em_espera': Count('id', filter=Q(status='em_espera')),
+        'desligados': Count('id', filter=Q(status='desligado')),
+        'total_mensal': Sum('valor_beneficio', filter=ativo),
+    }
+    for chave, vmin, vmax in FAIXAS:
+        faixa = ativo
+        if vmin is not None:
+            faixa &= Q(valor_beneficio__gt=vmin)
+        if vmax is not None:
+            faixa &= Q(valor_beneficio__lte=vmax)
+        agregados[f'faixa_{chave}'] = Count('id', filter=faixa)
+
+    contadores = {
+        linha.pop('beneficio_id'): linha
+        for linha in Pessoa.objects.order_by().values('beneficio_id').annotate(**agregados)
+    }
+    stats = []
+    for beneficio_id in Beneficio.objects.values_list('id', flat=True):
+        linha = contadores.get(beneficio_id, {})
+        linha['total_mensal'] = linha.get('total_mensal') or 0
+        stats.append(BeneficioStats(beneficio_id=beneficio_id, **linha))
+    BeneficioStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0030_pessoa_unique_cpf_nao_desligado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BeneficioStats',
+            fields=[
+                ('beneficio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='beneficios.beneficio')),
+                ('ativos', models.IntegerField(default=0)),
+                ('em_espera', models.IntegerField(default=0)),
+                ('desligados', models.IntegerField(default=0)),
+                ('total_mensal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('faixa_ate_100', models.IntegerField(default=0)),
+                ('faixa_de_101_150', models.IntegerField(default=0)),
+                ('faixa_de_151_200', models.IntegerField(default=0)),
+                ('faixa_de_201_250', models.IntegerField(default=0)),
+                ('faixa_de_251_300', models.IntegerField(default=0)),
+                ('faixa_acima_300', models.IntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estatística do Benefício',
+                'verbose_name_plural': 'Estatísticas dos Benefícios',
+            },
+        ),
+        migrations.RunPython(preencher_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0031_beneficiostats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaGeracao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('memorando_massa', 'Memorando em Massa'), ('recibos_massa', 'Recibos em Massa'), ('documentos_massa', 'Documentos em Massa')], max_length=30)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('sucesso', 'Sucesso'), ('erro', 'Erro')], default='pendente', max_length=15)),
+                ('pessoas_ids', models.JSONField(default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processados', models.PositiveIntegerField(default=0)),
+                ('arquivo', models.CharField(blank=True, default='', max_length=255)),
+                ('nome_arquivo', models.CharField(blank=True, default='', max_length=200)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('beneficio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='beneficios.beneficio')),
+                ('memorando', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='beneficios.memorando')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Geração',
+                'verbose_name_plural': 'Tarefas de Geração',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='tarefa_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:21
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def preencher_sequencias(apps, schema_editor):
+    Memorando = apps.get_model('beneficios', 'Memorando')
+    SequenciaMemorando = apps.get_model('beneficios', 'SequenciaMemorando')
+    SequenciaMemorando.objects.bulk_create([
+        SequenciaMemorando(ano=linha['ano'], ultima_sequencia=linha['ultima'])
+        for linha in Memorando.objects.order_by().values('ano').annotate(ultima=Max('sequencia'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0032_tarefageracao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaMemorando',
+            fields=[
+                ('ano', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('ultima_sequencia', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Sequência de Memorando',
+                'verbose_name_plural': 'Sequências de Memorando',
+            },
+        ),
+        migrations.RunPython(preencher_sequencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0033_sequenciamemorando'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documento',
+            name='hash_conteudo',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='paginas',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='documento',
+            name='tamanho',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:53
+
+import json
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+TIPOS_AUDITLOG = {0: ('criacao', 'Criação'), 1: ('edicao', 'Edição'), 2: ('exclusao', 'Exclusão')}
+LOTE = 1000
+
+
+def _alteracoes(entrada):
+    changes = entrada.changes
+    if not changes and entrada.changes_text:
+        try:
+            changes = json.loads(entrada.changes_text)
+        except ValueError:
+            changes = None
+    return ' | '.join(f'{campo}: {valores[0]} → {valores[1]}' for campo, valores in (changes or {}).items())
+
+
+def preencher_auditoria(apps, schema_editor):
+    LogEntry = apps.get_model(settings.AUDITLOG_LOGENTRY_MODEL)
+    LogAcao = apps.get_model('beneficios', 'LogAcao')
+    RegistroAuditoria = apps.get_model('beneficios', 'RegistroAuditoria')
+    tipos_acao = dict(LogAcao._meta.get_field('tipo').choices)
+
+    registros = []
+    entradas = LogEntry.objects.select_related('actor', 'content_type').order_by('id')
+    for entrada in entradas.iterator(chunk_size=LOTE):
+        tipo, rotulo = TIPOS_AUDITLOG.get(entrada.action, ('outro', 'Outro'))
+        registros.append(RegistroAuditoria(
+            data=entrada.timestamp,
+            usuario_id=entrada.actor_id,
+            usuario_nome=entrada.actor.username if entrada.actor_id else '',
+            tipo=tipo,
+            rotulo=rotulo,
+            entidade=entrada.content_type.model if entrada.content_type_id else '',
+            objeto=entrada.object_repr or '',
+            detalhes=_alteracoes(entrada),
+            ip=entrada.remote_addr,
+            log_entry_id=entrada.id,
+        ))
+        if len(registros) >= LOTE:
+            RegistroAuditoria.objects.bulk_create(registros)
+            registros = []
+
+    for acao in LogAcao.objects.select_related('usuario').order_by('id').iterator(chunk_size=LOTE):
+        registros.append(RegistroAuditoria(
+            data=acao.created_at,
+            usuario_id=acao.usuario_id,
+            usuario_nome=acao.usuario.username if acao.usuario_id else '',
+            tipo='geracao',
+            rotulo=tipos_acao.get(acao.tipo, acao.tipo),
+            detalhes=acao.descricao,
+            ip=acao.ip,
+            log_acao_id=acao.id,
+        ))
+        if len(registros) >= LOTE:
+            RegistroAuditoria.objects.bulk_create(registros)
+            registros = []
+    RegistroAuditoria.objects.bulk_create(registros)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0034_documento_metadados'),
+        migrations.swappable_dependency(settings.AUDITLOG_LOGENTRY_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateTimeField()),
+                ('usuario_nome', models.CharField(blank=True, default='', max_length=150)),
+                ('tipo', models.CharField(choices=[('criacao', 'Criação'), ('edicao', 'Edição'), ('exclusao', 'Exclusão'), ('geracao', 'Geração de Documento'), ('outro', 'Outro')], max_length=10)),
+                ('rotulo', models.CharField(max_length=60)),
+                ('entidade', models.CharField(blank=True, default='', max_length=100)),
+                ('objeto', models.TextField(blank=True, default='')),
+                ('detalhes', models.TextField(blank=True, default='')),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('log_acao', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='beneficios.logacao')),
+                ('log_entry', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUDITLOG_LOGENTRY_MODEL)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Registro de Auditoria',
+                'verbose_name_plural': 'Registros de Auditoria',
+                'ordering': ['-data', '-id'],
+                'indexes': [models.Index(fields=['-data', '-id'], name='auditoria_data_idx'), models.Index(fields=['usuario', '-data', '-id'], name='auditoria_usuario_data_idx'), models.Index(fields=['tipo', '-data', '-id'], name='auditoria_tipo_data_idx'), models.Index(fields=['entidade', '-data', '-id'], name='auditoria_entidade_data_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_auditoria, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('beneficios', '0035_registroauditoria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefageracao',
+            name='ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+    ]
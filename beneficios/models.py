@@ -1,9 +1,56 @@
-from django.db import models
+import hashlib
+import hmac
+import os
+import shutil
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
 from auditlog.registry import auditlog
 from auditlog.models import AuditlogHistoryField
 from django.contrib.auth.models import AbstractUser
 from encrypted_model_fields.fields import EncryptedCharField, EncryptedTextField
 
+def gerar_cpf_hash(cpf):
+    """Índice cego do CPF: HMAC-SHA256 dos dígitos, com chave derivada da chave de criptografia"""
+    cpf_numeros = ''.join(filter(str.isdigit, cpf or ''))
+    if not cpf_numeros:
+        return ''
+    # A chave Fernet não é usada direto: o índice tem a sua, derivada dela com um rótulo próprio
+    chave = hmac.new(settings.FIELD_ENCRYPTION_KEY.encode(), b'cpf-blind-index', hashlib.sha256).digest()
+    return hmac.new(chave, cpf_numeros.encode(), hashlib.sha256).hexdigest()
+
+
+# Faixas de valor usadas no dashboard, na listagem e no relatório financeiro: (chave, maior que, até)
+FAIXAS_VALOR = [
+    ('ate_100', None, 100),
+    ('de_101_150', 100, 150),
+    ('de_151_200', 150, 200),
+    ('de_201_250', 200, 250),
+    ('de_251_300', 250, 300),
+    ('acima_300', 300, None),
+]
+
+
+def filtro_faixa(vmin, vmax, prefixo=''):
+    """Q para uma faixa de valor (vmin exclusivo, vmax inclusivo)"""
+    q = Q()
+    if vmin is not None:
+        q &= Q(**{f'{prefixo}valor_beneficio__gt': vmin})
+    if vmax is not None:
+        q &= Q(**{f'{prefixo}valor_beneficio__lte': vmax})
+    return q
+
+
+def chave_faixa(valor):
+    """Chave da faixa em que o valor cai (mesma regra de filtro_faixa)"""
+    for chave, vmin, vmax in FAIXAS_VALOR:
+        if (vmin is None or valor > vmin) and (vmax is None or valor <= vmax):
+            return chave
+
+
 class User(AbstractUser):
     """Usuário customizado para futuras expansões"""
     must_change_password = models.BooleanField(default=True, verbose_name='Deve trocar senha')
@@ -49,6 +96,131 @@ class Beneficio(models.Model):
     def __str__(self):
         return self.nome_exibicao
 
+
+class BeneficioStats(models.Model):
+    """
+    Contadores de cada benefício (status, total mensal e faixas de valor dos ativos).
+    Atualizados na mesma transação que grava/exclui a Pessoa; o comando
+    recompute_stats reconstrói e confere a tabela.
+    """
+    CAMPOS_STATUS = {'ativo': 'ativos', 'em_espera': 'em_espera', 'desligado': 'desligados'}
+    CAMPOS_CONTADORES = (
+        ['ativos', 'em_espera', 'desligados', 'total_mensal']
+        + [f'faixa_{chave}' for chave, _, _ in FAIXAS_VALOR]
+    )
+
+    beneficio = models.OneToOneField(Beneficio, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    ativos = models.IntegerField(default=0)
+    em_espera = models.IntegerField(default=0)
+    desligados = models.IntegerField(default=0)
+    total_mensal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    faixa_ate_100 = models.IntegerField(default=0)
+    faixa_de_101_150 = models.IntegerField(default=0)
+    faixa_de_151_200 = models.IntegerField(default=0)
+    faixa_de_201_250 = models.IntegerField(default=0)
+    faixa_de_251_300 = models.IntegerField(default=0)
+    faixa_acima_300 = models.IntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Estatística do Benefício'
+        verbose_name_plural = 'Estatísticas dos Benefícios'
+
+    @property
+    def total(self):
+        return self.ativos + self.em_espera + self.desligados
+
+    @property
+    def distribuicao_valor(self):
+        return {chave: getattr(self, f'faixa_{chave}') for chave, _, _ in FAIXAS_VALOR}
+
+    @classmethod
+    def contribuicao(cls, status, valor):
+        """Quanto uma pessoa com esse status/valor soma em cada contador"""
+        delta = {}
+        campo = cls.CAMPOS_STATUS.get(status)
+        if campo:
+            delta[campo] = 1
+        if status == 'ativo':
+            valor = Decimal(str(valor or 0))
+            delta['total_mensal'] = valor
+            delta[f'faixa_{chave_faixa(valor)}'] = 1
+        return delta
+
+    @classmethod
+    def aplicar(cls, beneficio_id, delta):
+        """Soma o delta na linha do benefício com UPDATE ... SET campo = campo + x"""
+        delta = {campo: valor for campo, valor in delta.items() if valor}
+        if not beneficio_id or not delta:
+            return
+        atualizados = cls.objects.filter(beneficio_id=beneficio_id).update(
+            atualizado_em=timezone.now(),
+            **{campo: F(campo) + valor for campo, valor in delta.items()}
+        )
+        if not atualizados:
+            # Linha ainda não existe: cria já com a contagem real
+            cls.recalcular([beneficio_id])
+
+    @classmethod
+    def calcular(cls, beneficio_ids=None):
+        """Contadores calculados direto da tabela Pessoa: {beneficio_id: {campo: valor}}"""
+        ativo = Q(status='ativo')
+        agregados = {
+            'ativos': Count('id', filter=ativo),
+            'em_espera': Count('id', filter=Q(status='em_espera')),
+            'desligados': Count('id', filter=Q(status='desligado')),
+            'total_mensal': Sum('valor_beneficio', filter=ativo),
+        }
+        for chave, vmin, vmax in FAIXAS_VALOR:
+            agregados[f'faixa_{chave}'] = Count('id', filter=ativo & filtro_faixa(vmin, vmax))
+
+        pessoas = Pessoa.objects.order_by()
+        ids = beneficio_ids if beneficio_ids is not None else Beneficio.objects.values_list('id', flat=True)
+        if beneficio_ids is not None:
+            pessoas = pessoas.filter(beneficio_id__in=beneficio_ids)
+
+        resultado = {bid: {campo: 0 for campo in cls.CAMPOS_CONTADORES} for bid in ids}
+        for linha in pessoas.values('beneficio_id').annotate(**agregados):
+            bid = linha.pop('beneficio_id')
+            linha['total_mensal'] = linha['total_mensal'] or 0
+            resultado[bid] = linha
+        return resultado
+
+    @classmethod
+    def recalcular(cls, beneficio_ids=None):
+        """Reconstrói as linhas a partir de Pessoa; retorna {beneficio_id: {campo: (gravado, real)}} do que divergia"""
+        divergencias = {}
+        with transaction.atomic():
+            for bid, contadores in cls.calcular(beneficio_ids).items():
+                stats, criado = cls.objects.select_for_update().get_or_create(beneficio_id=bid, defaults=contadores)
+                if criado:
+                    continue
+                diferentes = stats.comparar(contadores)
+                if diferentes:
+                    divergencias[bid] = diferentes
+                    cls.objects.filter(pk=bid).update(atualizado_em=timezone.now(), **contadores)
+        return divergencias
+
+    def comparar(self, contadores):
+        """{campo: (gravado, real)} dos contadores que diferem de self"""
+        return {
+            campo: (getattr(self, campo), valor)
+            for campo, valor in contadores.items()
+            if getattr(self, campo) != valor
+        }
+
+    @classmethod
+    def do_beneficio(cls, beneficio):
+        """Linha de contadores do benefício, criando-a se ainda não existir"""
+        try:
+            return cls.objects.get(pk=beneficio.pk)
+        except cls.DoesNotExist:
+            cls.recalcular([beneficio.pk])
+            return cls.objects.get(pk=beneficio.pk)
+
+    def __str__(self):
+        return f"Estatísticas de {self.beneficio}"
+
 class Pessoa(models.Model):
     """Cadastro de pessoas beneficiárias"""
     SEXO_CHOICES = [
@@ -70,6 +242,7 @@ class Pessoa(models.Model):
     nome_completo = models.CharField(max_length=200)
     cpf = EncryptedCharField(max_length=14, verbose_name='CPF')
     cpf_ultimos_4 = models.CharField(max_length=4, db_index=True, blank=True, default='')
+    cpf_hash = models.CharField(max_length=64, db_index=True, blank=True, default='', editable=False)
     sexo = models.CharField(max_length=1, choices=SEXO_CHOICES)
     data_nascimento = models.DateField(null=True, blank=True)
     celular = models.CharField(max_length=15, blank=True)
@@ -87,13 +260,50 @@ class Pessoa(models.Model):
         verbose_name = 'Pessoa'
         verbose_name_plural = 'Pessoas'
         ordering = ['nome_completo']
+        constraints = [
+            # Mesmo CPF só pode se repetir entre registros desligados
+            models.UniqueConstraint(
+                fields=['cpf_hash'],
+                condition=~models.Q(status='desligado') & ~models.Q(cpf_hash=''),
+                name='unique_cpf_nao_desligado',
+            )
+        ]
         
     def save(self, *args, **kwargs):
         if self.cpf:
             cpf_numeros = ''.join(filter(str.isdigit, self.cpf))
             if len(cpf_numeros) >= 4:
                 self.cpf_ultimos_4 = cpf_numeros[-4:]
-        super().save(*args, **kwargs)
+            self.cpf_hash = gerar_cpf_hash(cpf_numeros)
+
+        with transaction.atomic():
+            anterior = None
+            if self.pk:
+                # Trava a linha para que duas gravações simultâneas não descontem o mesmo estado anterior
+                anterior = (
+                    Pessoa.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values('beneficio_id', 'status', 'valor_beneficio')
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            self._atualizar_stats(anterior)
+
+    def _atualizar_stats(self, anterior):
+        """Aplica em BeneficioStats a diferença entre o estado anterior e o atual"""
+        novo = BeneficioStats.contribuicao(self.status, self.valor_beneficio)
+        if not anterior:
+            BeneficioStats.aplicar(self.beneficio_id, novo)
+            return
+
+        antigo = BeneficioStats.contribuicao(anterior['status'], anterior['valor_beneficio'])
+        if anterior['beneficio_id'] != self.beneficio_id:
+            BeneficioStats.aplicar(anterior['beneficio_id'], {c: -v for c, v in antigo.items()})
+            BeneficioStats.aplicar(self.beneficio_id, novo)
+            return
+
+        delta = {campo: novo.get(campo, 0) - antigo.get(campo, 0) for campo in set(novo) | set(antigo)}
+        BeneficioStats.aplicar(self.beneficio_id, delta)
     
     def __str__(self):
         return f"{self.nome_completo} - {self.cpf}"
@@ -103,6 +313,11 @@ class Documento(models.Model):
     pessoa = models.OneToOneField(Pessoa, on_delete=models.CASCADE, related_name='documento')
     arquivo = models.FileField(upload_to='documentos/%Y/%m/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Preenchidos na normalização do upload (ou pelo comando normalizar_documentos).
+    # paginas vazio = PDF não pôde ser lido; a geração em massa conta as páginas na hora.
+    paginas = models.PositiveSmallIntegerField(null=True, blank=True)
+    tamanho = models.PositiveIntegerField(null=True, blank=True)
+    hash_conteudo = models.CharField(max_length=64, blank=True, default='')
     history = AuditlogHistoryField()
     
     class Meta:
@@ -112,6 +327,61 @@ class Documento(models.Model):
     def __str__(self):
         return f"Documento de {self.pessoa.nome_completo}"
 
+    def save(self, *args, **kwargs):
+        # Arquivo novo (upload ainda não gravado no storage): normaliza antes de salvar
+        if self.arquivo and not self.arquivo._committed:
+            self.normalizar_arquivo()
+        super().save(*args, **kwargs)
+
+    def normalizar_arquivo(self, reescrever=True):
+        """
+        Corta o PDF nas páginas usadas pelas 2 vias, recomprime e preenche
+        paginas/tamanho/hash. Retorna True se o conteúdo do arquivo mudou.
+        reescrever=False só preenche os metadados do arquivo como está.
+        """
+        from django.core.files.base import ContentFile
+        from .utils import normalizar_documento_pdf
+
+        self.arquivo.open('rb')
+        try:
+            self.arquivo.seek(0)
+            original = self.arquivo.read()
+        finally:
+            if self.arquivo._committed:
+                self.arquivo.close()
+
+        try:
+            conteudo, self.paginas = normalizar_documento_pdf(original)
+        except Exception:
+            # PDF que o PyPDF2 não lê: guarda como veio
+            conteudo, self.paginas = original, None
+
+        if not reescrever:
+            conteudo = original
+
+        self.tamanho = len(conteudo)
+        self.hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+        if conteudo is original:
+            return False
+        if self.arquivo._committed:
+            # Arquivo já no storage (comando normalizar_documentos): grava ao lado e troca
+            # com os.replace, para o original nunca ficar pela metade
+            caminho = self.arquivo.path
+            parcial = caminho + '.parcial'
+            try:
+                with open(parcial, 'wb') as f:
+                    f.write(conteudo)
+                    f.flush()
+                    os.fsync(f.fileno())
+                shutil.copymode(caminho, parcial)
+                os.replace(parcial, caminho)
+            finally:
+                if os.path.exists(parcial):
+                    os.remove(parcial)
+        else:
+            self.arquivo = ContentFile(conteudo, name=os.path.basename(self.arquivo.name))
+        return True
+
 class PermissoesGerais(models.Model):
     class Meta:
         # Isso evita criar uma tabela desnecessária no banco
@@ -157,6 +427,19 @@ class Memorando(models.Model):
         return f"Memorando {self.numero} - {self.beneficio.nome}"
 
 
+class SequenciaMemorando(models.Model):
+    """Último número de memorando usado em cada ano; a linha é travada (FOR UPDATE) ao numerar"""
+    ano = models.PositiveIntegerField(primary_key=True)
+    ultima_sequencia = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Sequência de Memorando'
+        verbose_name_plural = 'Sequências de Memorando'
+    
+    def __str__(self):
+        return f"{self.ano}: {self.ultima_sequencia}"
+
+
 class MemorandoPessoa(models.Model):
     """Snapshot dos dados das pessoas no momento da geração do memorando"""
     memorando = models.ForeignKey(Memorando, on_delete=models.CASCADE, related_name='pessoas')
@@ -286,6 +569,153 @@ class LogAcao(models.Model):
         return f"{self.usuario} - {self.get_tipo_display()} - {self.created_at}"
 
 
+def formatar_alteracoes(changes):
+    """Texto das alterações de um LogEntry ({campo: [antes, depois]}) para a tela de auditoria"""
+    return ' | '.join(f'{campo}: {valores[0]} → {valores[1]}' for campo, valores in (changes or {}).items())
+
+
+class RegistroAuditoria(models.Model):
+    """
+    Linha do tempo única da auditoria: uma linha por LogEntry (auditlog) e por
+    LogAcao, gravada por signal junto com o registro de origem e já com os
+    textos da tela. A listagem é paginada por chave (data, id), então qualquer
+    trecho do histórico sai com a mesma consulta indexada.
+    """
+    TIPO_CHOICES = [
+        ('criacao', 'Criação'),
+        ('edicao', 'Edição'),
+        ('exclusao', 'Exclusão'),
+        ('geracao', 'Geração de Documento'),
+        ('outro', 'Outro'),
+    ]
+    TIPOS_AUDITLOG = {0: 'criacao', 1: 'edicao', 2: 'exclusao'}
+    CLASSES_BADGE = {'criacao': 'success', 'edicao': 'warning', 'exclusao': 'danger', 'geracao': 'info'}
+    ROTULOS_ENTIDADE = {
+        'pessoa': 'Pessoa',
+        'beneficio': 'Benefício',
+        'user': 'Usuário',
+        'documento': 'Documento',
+        'configuracaogeral': 'Configuração Geral',
+        'memorando': 'Memorando',
+    }
+
+    data = models.DateTimeField()
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    usuario_nome = models.CharField(max_length=150, blank=True, default='')  # Mantido se o usuário for excluído
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    rotulo = models.CharField(max_length=60)  # Texto do badge (tipo da alteração ou da ação)
+    entidade = models.CharField(max_length=100, blank=True, default='')  # Model do auditlog; vazio nas ações
+    objeto = models.TextField(blank=True, default='')
+    detalhes = models.TextField(blank=True, default='')
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    log_entry = models.OneToOneField('auditlog.LogEntry', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    log_acao = models.OneToOneField(LogAcao, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+
+    class Meta:
+        verbose_name = 'Registro de Auditoria'
+        verbose_name_plural = 'Registros de Auditoria'
+        ordering = ['-data', '-id']
+        indexes = [
+            models.Index(fields=['-data', '-id'], name='auditoria_data_idx'),
+            models.Index(fields=['usuario', '-data', '-id'], name='auditoria_usuario_data_idx'),
+            models.Index(fields=['tipo', '-data', '-id'], name='auditoria_tipo_data_idx'),
+            models.Index(fields=['entidade', '-data', '-id'], name='auditoria_entidade_data_idx'),
+        ]
+
+    @classmethod
+    def de_log_entry(cls, entrada):
+        tipo = cls.TIPOS_AUDITLOG.get(entrada.action, 'outro')
+        return cls(
+            data=entrada.timestamp,
+            usuario_id=entrada.actor_id,
+            usuario_nome=entrada.actor.username if entrada.actor_id else '',
+            tipo=tipo,
+            rotulo=dict(cls.TIPO_CHOICES)[tipo],
+            entidade=entrada.content_type.model if entrada.content_type_id else '',
+            objeto=entrada.object_repr or '',
+            detalhes=formatar_alteracoes(entrada.changes_dict),
+            ip=entrada.remote_addr,
+            log_entry=entrada,
+        )
+
+    @classmethod
+    def de_log_acao(cls, acao):
+        return cls(
+            data=acao.created_at,
+            usuario_id=acao.usuario_id,
+            usuario_nome=acao.usuario.username if acao.usuario_id else '',
+            tipo='geracao',
+            rotulo=acao.get_tipo_display(),
+            detalhes=acao.descricao,
+            ip=acao.ip,
+            log_acao=acao,
+        )
+
+    @property
+    def classe_badge(self):
+        return self.CLASSES_BADGE.get(self.tipo, 'secondary')
+
+    @property
+    def entidade_rotulo(self):
+        if not self.entidade:
+            return 'Ação'
+        return self.ROTULOS_ENTIDADE.get(self.entidade, self.entidade)
+
+    def __str__(self):
+        return f"{self.usuario_nome or 'Sistema'} - {self.rotulo} - {self.data}"
+
+
+class TarefaGeracao(models.Model):
+    """Fila de gerações em massa processadas pelo comando processar_tarefas, fora da requisição"""
+    TIPO_CHOICES = [
+        ('memorando_massa', 'Memorando em Massa'),
+        ('recibos_massa', 'Recibos em Massa'),
+        ('documentos_massa', 'Documentos em Massa'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('sucesso', 'Sucesso'),
+        ('erro', 'Erro'),
+    ]
+    
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pendente')
+    beneficio = models.ForeignKey(Beneficio, on_delete=models.CASCADE)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    pessoas_ids = models.JSONField(default=list)  # Seleção já filtrada, na ordem da listagem
+    total = models.PositiveIntegerField(default=0)
+    processados = models.PositiveIntegerField(default=0)
+    arquivo = models.CharField(max_length=255, blank=True, default='')  # Relativo a MEDIA_ROOT
+    nome_arquivo = models.CharField(max_length=200, blank=True, default='')
+    memorando = models.ForeignKey(Memorando, on_delete=models.SET_NULL, null=True, blank=True)
+    mensagem = models.TextField(blank=True, default='')
+    ip = models.GenericIPAddressField(null=True, blank=True)  # De quem pediu, para o LogAcao gravado pelo worker
+    created_at = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Tarefa de Geração'
+        verbose_name_plural = 'Tarefas de Geração'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='tarefa_status_created_idx'),
+        ]
+    
+    @property
+    def percentual(self):
+        if not self.total:
+            return 0
+        return int(self.processados * 100 / self.total)
+    
+    @property
+    def finalizada(self):
+        return self.status in ('sucesso', 'erro')
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} - {self.get_status_display()}"
+
 class BackupConfig(models.Model):
     """Configurações de backup do sistema (singleton)"""
     FREQUENCIA_CHOICES = [
@@ -0,0 +1,113 @@
+"""
+Arquivo de remessa bancária gerado em streaming.
+
+As linhas vêm de um values_list percorrido com iterator() (cursor no servidor
+no PostgreSQL) e são escritas à medida que chegam; o total de pessoas e de
+valor é acumulado no caminho, para o trailer do CNAB e para o log da ação.
+"""
+import csv
+import unicodedata
+from decimal import Decimal
+
+from django.utils import timezone
+
+LINHAS_POR_PEDACO = 500  # linhas juntadas em cada pedaço enviado ao cliente
+CEP_PADRAO = '58150000'
+OBSERVACAO_CSV = f'CEP {CEP_PADRAO}'
+
+CNAB_TAMANHO_LINHA = 240
+CNAB_NOME_ARQUIVO = 'REMESSA POUPANCA SOCIAL'
+
+
+class TotalRemessa:
+    """Contadores acumulados enquanto as linhas são geradas"""
+
+    def __init__(self):
+        self.pessoas = 0
+        self.valor = Decimal('0')
+
+
+def registros(linhas, total):
+    """(cpf, nome, valor) do banco -> (cpf só dígitos, NOME, valor), somando no total"""
+    for cpf, nome, valor in linhas:
+        total.pessoas += 1
+        total.valor += valor
+        yield ''.join(filter(str.isdigit, cpf)), nome.upper(), valor
+
+
+def _em_pedacos(linhas):
+    pedaco = []
+    for linha in linhas:
+        pedaco.append(linha)
+        if len(pedaco) >= LINHAS_POR_PEDACO:
+            yield ''.join(pedaco)
+            pedaco = []
+    if pedaco:
+        yield ''.join(pedaco)
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de guardar"""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(registros):
+    """CSV separado por ';' com BOM (para o Excel), no mesmo formato de sempre"""
+    writer = csv.writer(_Eco(), delimiter=';', quoting=csv.QUOTE_NONE, escapechar='\\')
+
+    def linhas():
+        yield '\ufeff' + writer.writerow(['CPF', 'NOME', 'VALOR', 'OBSERVACAO'])
+        for cpf, nome, valor in registros:
+            yield writer.writerow([cpf, nome, f'{valor:.2f}', OBSERVACAO_CSV])
+
+    return _em_pedacos(linhas())
+
+
+def _alfa(texto, tamanho):
+    """Campo alfanumérico CNAB: maiúsculo, sem acentos, alinhado à esquerda com brancos"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return texto.upper()[:tamanho].ljust(tamanho)
+
+
+def _num(numero, tamanho):
+    """Campo numérico CNAB: alinhado à direita com zeros"""
+    return str(numero)[-tamanho:].rjust(tamanho, '0')
+
+
+def _centavos(valor):
+    return int((valor * 100).to_integral_value())
+
+
+def _registro_cnab(*campos):
+    return ''.join(campos).ljust(CNAB_TAMANHO_LINHA) + '\r\n'
+
+
+def linhas_cnab(registros, total, beneficio_nome):
+    """
+    Layout de largura fixa (240 posições, no estilo CNAB):
+    header (tipo 0), um detalhe por pessoa (tipo 1) e trailer (tipo 9) com
+    quantidade e valor total.
+
+    Detalhe: tipo(1) sequência(6) CPF(11) nome(40) valor em centavos(15) CEP(8)
+    """
+    def linhas():
+        yield _registro_cnab(
+            '0',
+            _alfa(CNAB_NOME_ARQUIVO, 30),
+            _alfa(beneficio_nome, 30),
+            timezone.localtime().strftime('%d%m%Y'),
+        )
+        for sequencia, (cpf, nome, valor) in enumerate(registros, 1):
+            yield _registro_cnab(
+                '1',
+                _num(sequencia, 6),
+                _num(cpf, 11),
+                _alfa(nome, 40),
+                _num(_centavos(valor), 15),
+                CEP_PADRAO,
+            )
+        yield _registro_cnab('9', _num(total.pessoas, 6), _num(_centavos(total.valor), 18))
+
+    return _em_pedacos(linhas())
@@ -1,17 +1,250 @@
+import copy
 from datetime import datetime
+from decimal import Decimal
+from uuid import uuid4
+
+from django.core.cache import cache
 from django.db import transaction
-from .models import Memorando, MemorandoPessoa
+from django.db.models import Case, CharField, Count, Max, Q, Sum, Value, When
+from . import metricas
+from .models import (
+    Beneficio, BeneficioStats, Memorando, MemorandoPessoa, Pessoa, SequenciaMemorando,
+    FAIXAS_VALOR, filtro_faixa,
+)
+
+DASHBOARD_CACHE_KEY = 'beneficios:dashboard_stats'
+DASHBOARD_CACHE_TIMEOUT = 60 * 30
+
+BENEFICIOS_VERSAO_KEY = 'beneficios:registro_versao'
+
+SNAPSHOT_LOTE = 1000  # pessoas por INSERT no snapshot do memorando
+
+ROTULOS_FAIXA = {
+    'ate_100': 'Até R$ 100',
+    'de_101_150': 'R$ 101 - 150',
+    'de_151_200': 'R$ 151 - 200',
+    'de_201_250': 'R$ 201 - 250',
+    'de_251_300': 'R$ 251 - 300',
+    'acima_300': 'Acima de R$ 300',
+}
+
+CORES_CARDS = ['benefit-card-azul', 'benefit-card-verde', 'benefit-card-turquesa', 'benefit-card-roxo']
+ICONES_PADRAO = ['bi-bus-front', 'bi-cash-coin', 'bi-wallet2', 'bi-piggy-bank']
+
+
+def formatar_moeda(valor):
+    """Formata valor no padrão brasileiro: 1.234,56"""
+    return f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def calcular_estatisticas_dashboard():
+    """
+    Monta os números do dashboard a partir dos contadores de BeneficioStats
+    (uma linha por benefício, sem varrer Pessoa).
+    """
+    beneficios = Beneficio.objects.filter(ativo=True).order_by('id').select_related('stats')
+    
+    stats_list = []
+    total_mensal_geral = 0
+    totais = {'total': 0, 'ativos': 0, 'em_espera': 0, 'desligados': 0}
+    distribuicao_valor = {chave: 0 for chave, _, _ in FAIXAS_VALOR}
+    
+    for idx, beneficio in enumerate(beneficios):
+        try:
+            stats = beneficio.stats
+        except BeneficioStats.DoesNotExist:
+            stats = BeneficioStats.do_beneficio(beneficio)
+        valor_mensal = stats.total_mensal
+        icone = beneficio.icone or ICONES_PADRAO[idx % len(ICONES_PADRAO)]
+        
+        stats_list.append({
+            'id': beneficio.id,
+            'nome': beneficio.nome_exibicao,
+            'icone': icone,
+            'cor_classe': CORES_CARDS[idx % len(CORES_CARDS)],
+            'total': stats.total,
+            'ativos': stats.ativos,
+            'desativados': stats.desligados,
+            'em_espera': stats.em_espera,
+            'valor_mensal': float(valor_mensal),
+            'valor_mensal_formatado': formatar_moeda(valor_mensal),
+        })
+        
+        total_mensal_geral += valor_mensal
+        totais['total'] += stats.total
+        totais['ativos'] += stats.ativos
+        totais['em_espera'] += stats.em_espera
+        totais['desligados'] += stats.desligados
+        for chave, quantidade in stats.distribuicao_valor.items():
+            distribuicao_valor[chave] += quantidade
+    
+    return {
+        'beneficios': stats_list,
+        'total_mensal_geral': total_mensal_geral,
+        'total_mensal_geral_formatado': formatar_moeda(total_mensal_geral),
+        'total_geral': totais['total'],
+        'total_ativos_geral': totais['ativos'],
+        'total_em_espera_geral': totais['em_espera'],
+        'total_desativados_geral': totais['desligados'],
+        'distribuicao_valor': distribuicao_valor,
+    }
+
+
+def obter_estatisticas_dashboard():
+    """Estatísticas do dashboard a partir do cache; recalcula só quando invalidado"""
+    stats = cache.get(DASHBOARD_CACHE_KEY)
+    if stats is None:
+        stats = calcular_estatisticas_dashboard()
+        cache.set(DASHBOARD_CACHE_KEY, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidar_estatisticas_dashboard():
+    cache.delete(DASHBOARD_CACHE_KEY)
+
+
+# Registro de benefícios do processo: {'versao', 'lista' (por nome), 'por_id'}
+_registro_beneficios = {'versao': None, 'lista': [], 'por_id': {}}
+
+
+def _beneficios_em_memoria():
+    """
+    A tabela de benefícios (poucas linhas) fica em memória em cada worker.
+    Cada consulta confere só a versão publicada no cache compartilhado: se
+    outro worker salvou um benefício, a versão mudou e a lista é recarregada
+    antes de responder. A versão é lida antes da recarga, então uma lista
+    lida durante uma alteração ainda não commitada é trocada na próxima chamada.
+    """
+    versao = cache.get(BENEFICIOS_VERSAO_KEY)
+    if versao is None:
+        cache.add(BENEFICIOS_VERSAO_KEY, uuid4().hex, None)
+        versao = cache.get(BENEFICIOS_VERSAO_KEY)
+    if versao is None or versao != _registro_beneficios['versao']:
+        lista = list(Beneficio.objects.order_by('nome'))
+        _registro_beneficios.update(versao=versao, lista=lista, por_id={b.pk: b for b in lista})
+    return _registro_beneficios
+
+
+def beneficios_cadastrados(apenas_ativos=False):
+    """Benefícios ordenados por nome, sem SQL enquanto a versão não muda (cópias, podem ser alteradas)"""
+    return [copy.copy(b) for b in _beneficios_em_memoria()['lista'] if b.ativo or not apenas_ativos]
+
+
+def obter_beneficio(beneficio_id):
+    """Benefício pelo id, a partir do registro em memória; None se não existir"""
+    beneficio = _beneficios_em_memoria()['por_id'].get(beneficio_id)
+    return copy.copy(beneficio) if beneficio is not None else None
+
+
+def invalidar_registro_beneficios():
+    cache.set(BENEFICIOS_VERSAO_KEY, uuid4().hex, None)
+
+
+def calcular_relatorio_financeiro(beneficios, status=None):
+    """
+    Números do relatório financeiro calculados no banco: uma consulta agrupada
+    por (benefício, faixa de valor) com contagens condicionais, depois somada
+    em det_beneficios e det_faixas. Nenhuma Pessoa é carregada.
+    beneficios: benefícios do relatório, já na ordem de exibição; status: None = todos.
+    """
+    beneficios = list(beneficios)
+    
+    pessoas = Pessoa.objects.filter(beneficio_id__in=[b.id for b in beneficios]).order_by()
+    if status:
+        pessoas = pessoas.filter(status=status)
+    
+    faixa = Case(
+        *[When(filtro_faixa(vmin, vmax), then=Value(chave)) for chave, vmin, vmax in FAIXAS_VALOR],
+        output_field=CharField(),
+    )
+    linhas = pessoas.annotate(faixa=faixa).values('beneficio_id', 'faixa').annotate(
+        pessoas=Count('id'),
+        ativos=Count('id', filter=Q(status='ativo')),
+        espera=Count('id', filter=Q(status='em_espera')),
+        desligados=Count('id', filter=Q(status='desligado')),
+        valor=Sum('valor_beneficio'),
+    )
+    
+    por_beneficio = {b.id: {'ativos': 0, 'espera': 0, 'desligados': 0, 'valor': Decimal('0')} for b in beneficios}
+    por_faixa = {chave: {'pessoas': 0, 'valor': Decimal('0')} for chave, _, _ in FAIXAS_VALOR}
+    total_pessoas = 0
+    for linha in linhas:
+        total_pessoas += linha['pessoas']
+        beneficio = por_beneficio[linha['beneficio_id']]
+        for campo in ('ativos', 'espera', 'desligados', 'valor'):
+            beneficio[campo] += linha[campo]
+        por_faixa[linha['faixa']]['pessoas'] += linha['pessoas']
+        por_faixa[linha['faixa']]['valor'] += linha['valor']
+    
+    total_valor = sum((b['valor'] for b in por_beneficio.values()), Decimal('0'))
+    total_ativos = sum(b['ativos'] for b in por_beneficio.values())
+    total_espera = sum(b['espera'] for b in por_beneficio.values())
+    total_desligados = sum(b['desligados'] for b in por_beneficio.values())
+    
+    def percentual(valor):
+        return (float(valor) / float(total_valor) * 100) if total_valor > 0 else 0
+    
+    det_beneficios = [
+        {
+            'descricao': b.nome_exibicao,
+            'nome_oficial': b.nome,
+            **por_beneficio[b.id],
+            'percentual': percentual(por_beneficio[b.id]['valor']),
+        }
+        for b in beneficios
+    ]
+    det_faixas = [
+        {
+            'faixa': ROTULOS_FAIXA[chave],
+            'pessoas': por_faixa[chave]['pessoas'],
+            'valor': por_faixa[chave]['valor'],
+            'percentual': percentual(por_faixa[chave]['valor']),
+        }
+        for chave, _, _ in FAIXAS_VALOR
+    ]
+    
+    return {
+        'resumo_geral': {
+            'total_beneficios': len(beneficios),
+            'total_pessoas': total_pessoas,
+            'total_ativos': total_ativos,
+            'total_valor': total_valor,
+        },
+        'det_beneficios': det_beneficios,
+        'det_faixas': det_faixas,
+        'total_valor': total_valor,
+        'total_ativos': total_ativos,
+        'total_espera': total_espera,
+        'total_desligados': total_desligados,
+        'total_pessoas': total_pessoas,
+    }
 
 
 def gerar_numero_memorando():
-    """Gera próximo número de memorando no formato 00001/2026"""
+    """
+    Reserva o próximo número de memorando no formato 00001/2026.
+    
+    A linha do ano em SequenciaMemorando fica travada (SELECT ... FOR UPDATE) até o
+    fim da transação; chamada dentro do atomic de registrar_memorando, duas gerações
+    simultâneas são serializadas e nunca recebem o mesmo número.
+    """
     ano_atual = datetime.now().year
     
     with transaction.atomic():
-        ultimo = Memorando.objects.filter(ano=ano_atual).order_by('-sequencia').first()
-        proxima_sequencia = (ultimo.sequencia + 1) if ultimo else 1
-        numero = f"{proxima_sequencia:05d}/{ano_atual}"
-        
+        # Primeira numeração do ano: parte do maior número já gravado (dados anteriores ao contador)
+        SequenciaMemorando.objects.get_or_create(
+            ano=ano_atual,
+            defaults={
+                'ultima_sequencia': Memorando.objects.filter(ano=ano_atual).aggregate(
+                    ultima=Max('sequencia'))['ultima'] or 0
+            },
+        )
+        contador = SequenciaMemorando.objects.select_for_update().get(ano=ano_atual)
+        contador.ultima_sequencia += 1
+        contador.save(update_fields=['ultima_sequencia'])
+    
+    proxima_sequencia = contador.ultima_sequencia
+    numero = f"{proxima_sequencia:05d}/{ano_atual}"
     return numero, ano_atual, proxima_sequencia
 
 
@@ -19,9 +252,14 @@ def registrar_memorando(beneficio, pessoas_dados, usuario):
     """
     Registra memorando no histórico com snapshot dos dados.
     
+    Numeração, memorando e snapshot são gravados em uma única transação; as
+    pessoas entram com bulk_create em lotes de SNAPSHOT_LOTE. O bulk_create não
+    dispara sinais, mas MemorandoPessoa não é auditado: a auditoria fica no
+    registro de criação do Memorando (auditlog), que leva quantidade e valor total.
+    
     Args:
         beneficio: objeto Beneficio
-        pessoas_dados: lista de dicts com {pessoa, nome_completo, cpf, valor_beneficio, ordem}
+        pessoas_dados: lista de dicts com {pessoa, nome_completo, valor_beneficio, ordem}
         usuario: objeto User que gerou
     
     Returns:
@@ -29,13 +267,14 @@ def registrar_memorando(beneficio, pessoas_dados, usuario):
     """
     from .models import ConfiguracaoGeral
     
-    numero, ano, sequencia = gerar_numero_memorando()
     config = ConfiguracaoGeral.get_config()
     
     valor_total = sum(p['valor_beneficio'] for p in pessoas_dados)
     conta_pagadora = getattr(beneficio, 'conta_pagadora', '')
     
     with transaction.atomic():
+        numero, ano, sequencia = gerar_numero_memorando()
+        
         memorando = Memorando.objects.create(
             numero=numero,
             ano=ano,
@@ -56,14 +295,20 @@ def registrar_memorando(beneficio, pessoas_dados, usuario):
             cep=config.cep,
         )
         
-        # Criar snapshot de cada pessoa
-        for dados in pessoas_dados:
-            MemorandoPessoa.objects.create(
-                memorando=memorando,
-                pessoa=dados.get('pessoa'),
-                nome_completo=dados['nome_completo'],
-                valor_beneficio=dados['valor_beneficio'],
-                ordem=dados['ordem']
-            )
-    
-    return memorando
\ No newline at end of file
+        # Snapshot de cada pessoa, em lote
+        MemorandoPessoa.objects.bulk_create(
+            [
+                MemorandoPessoa(
+                    memorando=memorando,
+                    pessoa=dados.get('pessoa'),
+                    nome_completo=dados['nome_completo'],
+                    valor_beneficio=dados['valor_beneficio'],
+                    ordem=dados['ordem'],
+                )
+                for dados in pessoas_dados
+            ],
+            batch_size=SNAPSHOT_LOTE,
+        )
+    
+    metricas.observar('gesocial_memorando_pessoas', len(pessoas_dados))
+    return memorando
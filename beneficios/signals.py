@@ -0,0 +1,61 @@
+from auditlog.models import LogEntry
+from auditlog.registry import auditlog
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .auditoria import registrar_alteracao, registrar_criacao, registrar_exclusao
+from .models import Beneficio, BeneficioStats, LogAcao, Pessoa, RegistroAuditoria
+from .services import invalidar_estatisticas_dashboard, invalidar_registro_beneficios
+
+
+@receiver(post_save, sender=Pessoa)
+@receiver(post_delete, sender=Pessoa)
+@receiver(post_save, sender=Beneficio)
+@receiver(post_delete, sender=Beneficio)
+def invalidar_cache_dashboard(sender, **kwargs):
+    """Qualquer mudança em pessoa (inclusive de status) ou benefício invalida o dashboard"""
+    invalidar_estatisticas_dashboard()
+    # De novo após o commit, para não sobrar um cálculo feito com dados ainda não commitados
+    transaction.on_commit(invalidar_estatisticas_dashboard)
+
+
+@receiver(post_save, sender=Beneficio)
+@receiver(post_delete, sender=Beneficio)
+def nova_versao_registro_beneficios(sender, **kwargs):
+    """Salvar/ativar/desativar/excluir benefício faz todos os workers recarregarem o registro"""
+    invalidar_registro_beneficios()
+    # De novo após o commit: um worker pode ter recarregado antes dos dados estarem visíveis
+    transaction.on_commit(invalidar_registro_beneficios)
+
+
+@receiver(post_delete, sender=Pessoa)
+def descontar_pessoa_excluida(sender, instance, **kwargs):
+    """Exclusão (inclusive via queryset.delete) desconta a pessoa dos contadores, na mesma transação"""
+    contribuicao = BeneficioStats.contribuicao(instance.status, instance.valor_beneficio)
+    BeneficioStats.aplicar(instance.beneficio_id, {campo: -valor for campo, valor in contribuicao.items()})
+
+
+@receiver(post_save, sender=Beneficio)
+def criar_stats_beneficio(sender, instance, created, **kwargs):
+    if created:
+        BeneficioStats.objects.get_or_create(beneficio=instance)
+
+
+@receiver(post_save, sender=LogEntry)
+@receiver(post_save, sender=LogAcao)
+def registrar_na_auditoria(sender, instance, created, **kwargs):
+    """Cada LogEntry/LogAcao novo ganha sua linha na linha do tempo da auditoria"""
+    if not created:
+        return
+    if sender is LogEntry:
+        RegistroAuditoria.de_log_entry(instance).save()
+    else:
+        RegistroAuditoria.de_log_acao(instance).save()
+
+
+# Captura para o buffer de auditoria_em_lote, nos mesmos models registrados no auditlog
+for modelo in auditlog.get_models():
+    post_save.connect(registrar_criacao, sender=modelo, dispatch_uid=f'auditoria_criacao_{modelo._meta.label}')
+    pre_save.connect(registrar_alteracao, sender=modelo, dispatch_uid=f'auditoria_alteracao_{modelo._meta.label}')
+    post_delete.connect(registrar_exclusao, sender=modelo, dispatch_uid=f'auditoria_exclusao_{modelo._meta.label}')
@@ -0,0 +1,251 @@
+"""
+Fila das gerações em massa (memorando, recibos e documentos) guardada no banco.
+
+As views só validam os filtros e enfileiram a seleção; o comando
+processar_tarefas pega as pendentes, grava o PDF em MEDIA_ROOT/tarefas/ e a
+tela de status acompanha o progresso até liberar o arquivo.
+"""
+import os
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .auditoria import auditoria_em_lote, gravar_log_acao
+from .models import LogAcao, Pessoa, TarefaGeracao
+
+PASTA_TAREFAS = 'tarefas'
+INTERVALO_PROGRESSO = 1  # segundos entre gravações do progresso
+TEMPO_MAXIMO_EXECUCAO = timedelta(hours=1)
+RETENCAO_ARQUIVOS = timedelta(hours=24)
+
+# Colunas carregadas por tipo: (only, select_related)
+CAMPOS_PESSOA = {
+    'memorando_massa': (('nome_completo', 'valor_beneficio'), ()),
+    'recibos_massa': (
+        ('nome_completo', 'cpf', 'valor_beneficio', 'endereco', 'bairro', 'cidade', 'beneficio__nome'),
+        ('beneficio',),
+    ),
+    'documentos_massa': (('nome_completo', 'documento__arquivo', 'documento__paginas'), ('documento',)),
+}
+TIPOS_SO_ATIVOS = {'memorando_massa', 'recibos_massa'}
+
+
+def enfileirar_tarefa(tipo, beneficio, usuario, pessoas_ids, ip=None):
+    """Cria a tarefa pendente com os IDs (já filtrados e na ordem da listagem) das pessoas"""
+    pessoas_ids = list(pessoas_ids)
+    return TarefaGeracao.objects.create(
+        tipo=tipo,
+        beneficio=beneficio,
+        usuario=usuario,
+        pessoas_ids=pessoas_ids,
+        total=len(pessoas_ids),
+        ip=ip,
+    )
+
+
+def carregar_pessoas(tarefa):
+    """
+    Pessoas da tarefa na ordem em que foram enfileiradas. Ficam de fora as
+    excluídas nesse meio tempo e, no memorando e nos recibos (pagamento), as
+    que deixaram de estar ativas enquanto a tarefa esperava na fila.
+    """
+    campos, relacionados = CAMPOS_PESSOA[tarefa.tipo]
+    qs = Pessoa.objects.filter(pk__in=tarefa.pessoas_ids).only(*campos)
+    if tarefa.tipo in TIPOS_SO_ATIVOS:
+        qs = qs.filter(status='ativo')
+    if relacionados:
+        qs = qs.select_related(*relacionados)
+    por_id = {p.pk: p for p in qs}
+    return [por_id[pk] for pk in tarefa.pessoas_ids if pk in por_id]
+
+
+def pegar_proxima_tarefa():
+    """Marca a pendente mais antiga como executando; SKIP LOCKED permite vários workers"""
+    with transaction.atomic():
+        tarefa = (
+            TarefaGeracao.objects.select_for_update(skip_locked=True)
+            .filter(status='pendente')
+            .order_by('created_at', 'pk')
+            .first()
+        )
+        if tarefa is None:
+            return None
+        tarefa.status = 'executando'
+        tarefa.iniciado_em = timezone.now()
+        tarefa.save(update_fields=['status', 'iniciado_em'])
+    return tarefa
+
+
+class _Progresso:
+    """Callback de progresso: grava processados no máximo a cada INTERVALO_PROGRESSO segundos"""
+
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+        self.ultima_gravacao = time.monotonic()
+
+    def __call__(self, processados):
+        agora = time.monotonic()
+        if agora - self.ultima_gravacao >= INTERVALO_PROGRESSO:
+            TarefaGeracao.objects.filter(pk=self.tarefa.pk).update(processados=processados)
+            self.ultima_gravacao = agora
+
+
+def _gerar_memorando(tarefa, pessoas):
+    from .services import registrar_memorando
+    from .utils import gerar_memorando_segunda_via_pdf
+
+    pessoas_dados = [
+        {
+            'pessoa': pessoa,
+            'nome_completo': pessoa.nome_completo,
+            'valor_beneficio': pessoa.valor_beneficio,
+            'ordem': idx,
+        }
+        for idx, pessoa in enumerate(pessoas, 1)
+    ]
+    memorando = registrar_memorando(tarefa.beneficio, pessoas_dados, tarefa.usuario)
+    tarefa.memorando = memorando
+    nome = f'memorando_{memorando.numero.replace("/", "-")}.pdf'
+    return gerar_memorando_segunda_via_pdf(memorando), nome
+
+
+def _caminho_arquivo(tarefa):
+    """Caminho relativo (MEDIA_ROOT/tarefas/AAAA/MM/) e absoluto do PDF da tarefa"""
+    relativo = os.path.join(PASTA_TAREFAS, timezone.localtime().strftime('%Y/%m'), f'tarefa_{tarefa.pk}.pdf')
+    destino = os.path.join(settings.MEDIA_ROOT, relativo)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    return relativo, destino
+
+
+def _gravar_pdf(tarefa, gerar):
+    """
+    Chama gerar(arquivo) com um .parcial ao lado do destino e só renomeia no fim,
+    para o arquivo nunca ser servido pela metade. Retorna o caminho relativo.
+    """
+    relativo, destino = _caminho_arquivo(tarefa)
+    parcial = destino + '.parcial'
+    try:
+        with open(parcial, 'wb') as f:
+            gerar(f)
+        os.replace(parcial, destino)
+    finally:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+    return relativo
+
+
+class _ResultadoDescartado(Exception):
+    """A tarefa mudou de status durante a geração (limpar_tarefas_antigas)"""
+
+
+def _gerar(tarefa, processos):
+    """Gera o PDF da tarefa e preenche arquivo e nome; retorna quantas pessoas entraram"""
+    from .utils import gerar_recibos_massa_pdf, gerar_documentos_massa_pdf
+
+    pessoas = carregar_pessoas(tarefa)
+    if not pessoas:
+        raise ValueError('Nenhuma das pessoas selecionadas está mais cadastrada (ou ativa).')
+
+    progresso = _Progresso(tarefa)
+    if tarefa.tipo == 'documentos_massa':
+        # Grava direto no arquivo, documento a documento, sem juntar tudo em memória
+        tarefa.arquivo = _gravar_pdf(tarefa, lambda f: gerar_documentos_massa_pdf(pessoas, progresso, f))
+        nome = f'documentos_massa_{tarefa.beneficio_id}.pdf'
+    else:
+        if tarefa.tipo == 'memorando_massa':
+            buffer, nome = _gerar_memorando(tarefa, pessoas)
+        else:
+            buffer = gerar_recibos_massa_pdf(pessoas, ao_processar=progresso, processos=processos)
+            nome = f'recibos_massa_{tarefa.beneficio.nome}.pdf'
+        tarefa.arquivo = _gravar_pdf(tarefa, lambda f: f.write(buffer.getbuffer()))
+
+    tarefa.nome_arquivo = nome
+    tarefa.processados = tarefa.total
+    tarefa.status = 'sucesso'
+    return len(pessoas)
+
+
+def _gravar_resultado(tarefa, status_inicial):
+    """Grava o resultado só se ninguém mudou o status no meio tempo (limpar_tarefas_antigas)"""
+    tarefa.finalizado_em = timezone.now()
+    return TarefaGeracao.objects.filter(pk=tarefa.pk, status=status_inicial).update(
+        status=tarefa.status,
+        mensagem=tarefa.mensagem,
+        arquivo=tarefa.arquivo,
+        nome_arquivo=tarefa.nome_arquivo,
+        processados=tarefa.processados,
+        memorando=tarefa.memorando,
+        finalizado_em=tarefa.finalizado_em,
+    )
+
+
+def _remover_arquivo(tarefa):
+    if tarefa.arquivo:
+        caminho = os.path.join(settings.MEDIA_ROOT, tarefa.arquivo)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        tarefa.arquivo = ''
+
+
+def executar_tarefa(tarefa, processos=None):
+    """
+    Gera o PDF da tarefa e registra sucesso ou erro (nunca propaga a exceção).
+    processos: quantos processos usar nos recibos (None = número de CPUs).
+    """
+    status_inicial = tarefa.status  # 'executando', marcado por pegar_proxima_tarefa
+    # O memorando é registrado na mesma transação do PDF e do resultado: se a geração falhar
+    # ou a tarefa for marcada como erro no meio tempo, o memorando (e o número) volta atrás.
+    # Os demais tipos ficam fora de transação para o progresso aparecer na tela de status.
+    transacao = transaction.atomic if tarefa.tipo == 'memorando_massa' else nullcontext
+    with auditoria_em_lote():  # o Memorando criado pela tarefa entra na auditoria em lote
+        try:
+            with transacao():
+                quantidade = _gerar(tarefa, processos)
+                if not _gravar_resultado(tarefa, status_inicial):
+                    raise _ResultadoDescartado()
+                if tarefa.tipo == 'documentos_massa':
+                    # Só depois de o PDF sair, com quem de fato entrou nele
+                    gravar_log_acao(LogAcao(
+                        usuario=tarefa.usuario,
+                        tipo='documentos_massa',
+                        descricao=f'Documentos em massa - {tarefa.beneficio.nome} - {quantidade} pessoas',
+                        ip=tarefa.ip,
+                    ))
+        except _ResultadoDescartado:
+            _remover_arquivo(tarefa)
+            tarefa.refresh_from_db()
+        except Exception as e:
+            _remover_arquivo(tarefa)
+            tarefa.memorando = None
+            tarefa.status = 'erro'
+            tarefa.mensagem = str(e)
+            if not _gravar_resultado(tarefa, status_inicial):
+                tarefa.refresh_from_db()
+    return tarefa
+
+
+def limpar_tarefas_antigas():
+    """Marca como erro as travadas e apaga os PDFs já expirados; retorna (travadas, arquivos removidos)"""
+    agora = timezone.now()
+    travadas = TarefaGeracao.objects.filter(
+        status='executando',
+        iniciado_em__lt=agora - TEMPO_MAXIMO_EXECUCAO,
+    ).update(status='erro', finalizado_em=agora, mensagem='Marcada como erro: executando há mais de 1 hora')
+
+    expiradas = TarefaGeracao.objects.filter(
+        status='sucesso',
+        finalizado_em__lt=agora - RETENCAO_ARQUIVOS,
+    ).exclude(arquivo='')
+    removidos = 0
+    for tarefa in expiradas:
+        caminho = os.path.join(settings.MEDIA_ROOT, tarefa.arquivo)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+            removidos += 1
+        tarefa.arquivo = ''
+        tarefa.save(update_fields=['arquivo'])
+    return travadas, removidos
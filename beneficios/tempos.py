@@ -0,0 +1,71 @@
+"""
+Tempo gasto em cada etapa da requisição corrente, para o cabeçalho Server-Timing.
+
+O MetricasMiddleware abre a medição com medir_requisicao(). O SQL é somado
+pelo execute_wrapper (sql_medido), a renderização de templates pelo backend
+DjangoTemplates daqui (configurado em TEMPLATES) e a geração de PDF pelo
+metricas.registrar_pdf. Fora de uma requisição (tarefas da fila, shell)
+somar() não faz nada.
+
+O template inclui o SQL de querysets avaliados dentro dele: as etapas se
+sobrepõem, não são parcelas do total.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends import django as backend_django
+
+_etapas = ContextVar('tempos_etapas', default=None)
+
+
+@contextmanager
+def medir_requisicao():
+    """Acumula {etapa: [segundos, quantidade]} enquanto o bloco roda"""
+    etapas = {}
+    token = _etapas.set(etapas)
+    try:
+        yield etapas
+    finally:
+        _etapas.reset(token)
+
+
+def somar(etapa, segundos, quantidade=1):
+    etapas = _etapas.get()
+    if etapas is None:
+        return
+    total = etapas.setdefault(etapa, [0.0, 0])
+    total[0] += segundos
+    total[1] += quantidade
+
+
+@contextmanager
+def medindo(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        somar(etapa, time.perf_counter() - inicio)
+
+
+def sql_medido(execute, sql, params, many, context):
+    """execute_wrapper que soma cada consulta na etapa 'sql'"""
+    with medindo('sql'):
+        return execute(sql, params, many, context)
+
+
+class _TemplateMedido(backend_django.Template):
+
+    def render(self, context=None, request=None):
+        with medindo('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(backend_django.DjangoTemplates):
+    """O backend padrão do Django, somando o tempo de cada render() na etapa 'template'"""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name).template, self)
@@ -2,7 +2,9 @@
 Helpers e factories para criação de objetos de teste.
 """
 from decimal import Decimal
+from io import BytesIO
 from django.utils import timezone
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 
@@ -12,10 +14,22 @@ from beneficios.models import (
     BackupConfig, BackupHistorico, BackupLog,
 )
 from datetime import date
+from reportlab.pdfgen import canvas
 
 User = get_user_model()
 
 
+def pdf_com_paginas(*textos):
+    """PDF simples com uma página por texto"""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer)
+    for texto in textos:
+        c.drawString(100, 700, texto)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
 class GeSocialTestBase(TestCase):
     """Classe base com helpers para todos os testes do GeSocial."""
 
@@ -42,6 +56,7 @@ class GeSocialTestBase(TestCase):
 
     def setUp(self):
         self.client = Client()
+        cache.clear()
 
     # ── Factories ──
 
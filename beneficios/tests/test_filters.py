@@ -0,0 +1,151 @@
+"""
+Testes para o PessoaFilterSet (filtros compartilhados da listagem e das gerações em massa)
+e para o AuditoriaFilterSet (linha do tempo da auditoria).
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.urls import reverse
+from django.utils import timezone
+
+from beneficios.filters import AuditoriaFilterSet, PessoaFilterSet
+from beneficios.models import LogAcao, RegistroAuditoria
+from .base import GeSocialTestBase
+
+
+class PessoaFilterSetTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.beneficio = self.criar_beneficio()
+        self.ana = self.criar_pessoa(self.beneficio, nome_completo='Ana', cpf='529.982.247-25', valor_beneficio=Decimal('100'))
+        self.bruna = self.criar_pessoa(self.beneficio, nome_completo='Bruna', cpf='276.178.580-71', valor_beneficio=Decimal('200'))
+        self.carlos = self.criar_pessoa(self.beneficio, nome_completo='Carlos', cpf='845.526.170-60', valor_beneficio=Decimal('100'))
+        self.davi = self.criar_pessoa(self.beneficio, nome_completo='Davi', cpf='321.654.987-04', status='desligado')
+
+    def _nomes(self, params, **kwargs):
+        filtro = PessoaFilterSet(self.beneficio, params, **kwargs)
+        return [p.nome_completo for p in filtro.pessoas()]
+
+    def test_status_padrao(self):
+        self.assertEqual(self._nomes({}, status_padrao='ativo'), ['Ana', 'Bruna', 'Carlos'])
+
+    def test_status_todos(self):
+        self.assertEqual(self._nomes({'status': ''}), ['Ana', 'Bruna', 'Carlos', 'Davi'])
+
+    def test_filtro_valor_com_virgula(self):
+        self.assertEqual(self._nomes({'status': 'ativo', 'valor': '100,00'}), ['Ana', 'Carlos'])
+
+    def test_filtro_valor_invalido_ignorado(self):
+        self.assertEqual(self._nomes({'status': 'ativo', 'valor': 'abc'}), ['Ana', 'Bruna', 'Carlos'])
+
+    def test_filtro_cpf_completo(self):
+        self.assertEqual(self._nomes({'status': 'ativo', 'cpf': '27617858071'}), ['Bruna'])
+
+    def test_filtro_cpf_parcial(self):
+        self.assertEqual(self._nomes({'status': 'ativo', 'cpf': '170-60'}), ['Carlos'])
+
+    def test_intervalo_posicoes(self):
+        self.assertEqual(self._nomes({'status': 'ativo', 'id_de': '2', 'id_ate': '3'}), ['Bruna', 'Carlos'])
+
+    def test_intervalo_invalido_registra_erro(self):
+        filtro = PessoaFilterSet(self.beneficio, {'status': 'ativo', 'id_de': '3', 'id_ate': '1'})
+        self.assertEqual(filtro.count(), 3)
+        self.assertIsNotNone(filtro.erro_posicao)
+
+    def test_posicao_inicial(self):
+        filtro = PessoaFilterSet(self.beneficio, {'id_de': '2'})
+        self.assertEqual(filtro.posicao_inicial, 2)
+
+    def test_posicoes_numericas(self):
+        self.assertTrue(PessoaFilterSet(self.beneficio, {'id_de': '1'}).posicoes_numericas())
+        self.assertFalse(PessoaFilterSet(self.beneficio, {'id_de': '1abc'}).posicoes_numericas())
+
+    def test_remessa_igual_listagem(self):
+        """A remessa contém exatamente as linhas exibidas na listagem com os mesmos filtros."""
+        self.login_as('normal')
+        params = {'status': 'ativo', 'valor': '100', 'id_de': '1', 'id_ate': '2'}
+        resp_lista = self.client.get(reverse('pessoas_por_beneficio', args=[self.beneficio.pk]), params)
+        nomes_lista = [p.nome_completo.upper() for p in resp_lista.context['pessoas']]
+
+        resp_csv = self.client.get(reverse('gerar_remessa_banco', args=[self.beneficio.pk]), params)
+        linhas = b''.join(resp_csv.streaming_content).decode('utf-8-sig').strip().splitlines()[1:]
+        nomes_csv = [linha.split(';')[1] for linha in linhas]
+        self.assertEqual(nomes_csv, nomes_lista)
+
+
+class AuditoriaFilterSetTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        RegistroAuditoria.objects.all().delete()
+        self.base = timezone.make_aware(datetime(2026, 3, 10, 12, 0))
+
+    def _criar(self, quantidade, **kwargs):
+        # Três registros por instante, para exercitar o desempate por id
+        RegistroAuditoria.objects.bulk_create([
+            RegistroAuditoria(data=self.base - timedelta(minutes=i // 3), tipo='edicao', rotulo='Edição', **kwargs)
+            for i in range(quantidade)
+        ])
+
+    def _percorrer(self, params=None):
+        paginas = []
+        params = dict(params or {})
+        while True:
+            registros, _, mais_antigos = AuditoriaFilterSet(params).pagina()
+            paginas.append([r.pk for r in registros])
+            if not mais_antigos:
+                return paginas
+            params['antes'] = mais_antigos
+
+    def test_paginas_por_cursor_cobrem_tudo_na_ordem(self):
+        self._criar(65)
+        paginas = self._percorrer()
+        self.assertEqual([len(p) for p in paginas], [30, 30, 5])
+        esperado = list(RegistroAuditoria.objects.order_by('-data', '-id').values_list('pk', flat=True))
+        self.assertEqual(sum(paginas, []), esperado)
+
+    def test_voltar_para_pagina_mais_recente(self):
+        self._criar(65)
+        primeira, _, cursor = AuditoriaFilterSet({}).pagina()
+        segunda, mais_recentes, _ = AuditoriaFilterSet({'antes': cursor}).pagina()
+        self.assertEqual(segunda[0].pk, RegistroAuditoria.objects.order_by('-data', '-id')[30].pk)
+        de_volta, mais_recentes_de_volta, _ = AuditoriaFilterSet({'depois': mais_recentes}).pagina()
+        self.assertEqual([r.pk for r in de_volta], [r.pk for r in primeira])
+        self.assertIsNone(mais_recentes_de_volta)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        self._criar(3)
+        registros, mais_recentes, mais_antigos = AuditoriaFilterSet({'antes': 'abc-1'}).pagina()
+        self.assertEqual(len(registros), 3)
+        self.assertIsNone(mais_recentes)
+        self.assertIsNone(mais_antigos)
+
+    def test_filtros(self):
+        self._criar(2, usuario=self.admin_user, entidade='pessoa')
+        self._criar(1, entidade='beneficio')
+        RegistroAuditoria.objects.create(data=self.base - timedelta(days=2), tipo='geracao', rotulo='Arquivo Remessa')
+
+        def contar(**params):
+            return len(AuditoriaFilterSet(params).pagina()[0])
+
+        self.assertEqual(contar(usuario=str(self.admin_user.pk)), 2)
+        self.assertEqual(contar(entidade='pessoa'), 2)
+        self.assertEqual(contar(entidade='acoes'), 1)
+        self.assertEqual(contar(entidade='models'), 3)
+        self.assertEqual(contar(tipo='geracao'), 1)
+        self.assertEqual(contar(data_de='2026-03-10'), 3)
+        self.assertEqual(contar(data_ate='2026-03-08'), 1)
+
+    def test_logs_novos_entram_na_linha_do_tempo(self):
+        LogAcao.objects.create(usuario=self.admin_user, tipo='remessa_banco', descricao='Remessa - 3 pessoas', ip='10.0.0.1')
+        pessoa = self.criar_pessoa(self.criar_beneficio(), nome_completo='Joana')
+
+        acao = RegistroAuditoria.objects.get(tipo='geracao')
+        self.assertEqual(
+            (acao.usuario_nome, acao.rotulo, acao.detalhes, acao.ip, acao.entidade_rotulo),
+            ('admin_test', 'Arquivo Remessa', 'Remessa - 3 pessoas', '10.0.0.1', 'Ação'),
+        )
+        criacao = RegistroAuditoria.objects.get(entidade='pessoa')
+        self.assertEqual((criacao.tipo, criacao.objeto), ('criacao', str(pessoa)))
+        self.assertIn('nome_completo: None → Joana', criacao.detalhes)
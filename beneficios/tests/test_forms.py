@@ -110,6 +110,27 @@ class PessoaFormTest(GeSocialTestBase):
         form = PessoaForm(data=self._form_data(cpf='529.982.247-25'))
         self.assertFalse(form.is_valid())
 
+    def test_cpf_duplicado_edicao_propria_pessoa_permitida(self):
+        pessoa = self.criar_pessoa(self.beneficio, cpf='529.982.247-25', status='ativo')
+        form = PessoaForm(data=self._form_data(cpf='529.982.247-25'), instance=pessoa)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_cpf_duplicado_consultas_constantes(self):
+        """A verificação de duplicidade não cresce com o tamanho do cadastro."""
+        def contar_consultas():
+            from django.db import connection
+            from django.test.utils import CaptureQueriesContext
+            form = PessoaForm(data=self._form_data(cpf='111.444.777-35'))
+            with CaptureQueriesContext(connection) as ctx:
+                form.is_valid()
+            return len(ctx.captured_queries)
+
+        self.criar_pessoa(self.beneficio, cpf='529.982.247-25')
+        antes = contar_consultas()
+        for cpf in self.CPFS_VALIDOS[1:4]:
+            self.criar_pessoa(self.beneficio, cpf=cpf)
+        self.assertEqual(contar_consultas(), antes)
+
     def test_status_cadastro_sem_desligado(self):
         form = PessoaForm()
         choices = [c[0] for c in form.fields['status'].choices]
@@ -1,10 +1,26 @@
 """
 Testes para Middleware do GeSocial.
 """
-from django.test import TestCase, Client
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from auditlog.context import set_actor
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from beneficios import metricas
+from beneficios.auditoria import auditoria_em_lote, gravar_log_acao
+from beneficios.middleware import RenovarSessaoMiddleware
+from beneficios.models import LogAcao, Pessoa, RegistroAuditoria
 from .base import GeSocialTestBase
 
 User = get_user_model()
@@ -68,4 +84,280 @@ class ForcarTrocaSenhaMiddlewareTest(GeSocialTestBase):
             'new_password2': 'NovaSenh@99',
         })
         resp = self.client.get('/')
-        self.assertEqual(resp.status_code, 200)
\ No newline at end of file
+        self.assertEqual(resp.status_code, 200)
+
+
+class AuditoriaEmLoteTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.beneficio = self.criar_beneficio()
+
+    def _entradas(self):
+        return LogEntry.objects.filter(content_type__model='pessoa').order_by('id')
+
+    def test_grava_tudo_de_uma_vez_apos_o_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with set_actor(self.admin_user, remote_addr='10.0.0.5'), auditoria_em_lote():
+                pessoa = self.criar_pessoa(self.beneficio, nome_completo='Ana')
+                pessoa.bairro = 'Alto'
+                pessoa.save()
+                gravar_log_acao(LogAcao(usuario=self.admin_user, tipo='status_ativar', descricao='Ana'))
+                self.assertFalse(self._entradas().exists())
+                self.assertFalse(LogAcao.objects.exists())
+
+        criacao, edicao = self._entradas()
+        self.assertEqual((criacao.action, edicao.action), (LogEntry.Action.CREATE, LogEntry.Action.UPDATE))
+        self.assertEqual(edicao.changes_dict['bairro'], ['Centro', 'Alto'])
+        self.assertEqual((edicao.actor, edicao.remote_addr, edicao.object_id), (self.admin_user, '10.0.0.5', pessoa.pk))
+        self.assertEqual(LogAcao.objects.count(), 1)
+        registros = RegistroAuditoria.objects.filter(usuario=self.admin_user)
+        self.assertEqual(sorted(registros.values_list('tipo', flat=True)), ['criacao', 'edicao', 'geracao'])
+
+    def test_mesmas_alteracoes_que_o_auditlog(self):
+        pessoa = self.criar_pessoa(self.beneficio)
+        pessoa.valor_beneficio = Decimal('200.00')
+        pessoa.save()
+        with self.captureOnCommitCallbacks(execute=True), auditoria_em_lote():
+            pessoa.valor_beneficio = Decimal('250.00')
+            pessoa.save()
+            pessoa.delete()
+        sincrona, em_lote, exclusao = self._entradas()[1:]
+        self.assertEqual(sincrona.changes_dict.keys(), em_lote.changes_dict.keys())
+        self.assertEqual(em_lote.changes_dict['valor_beneficio'], ['200.00', '250.00'])
+        self.assertEqual((exclusao.action, exclusao.object_pk), (LogEntry.Action.DELETE, str(em_lote.object_id)))
+
+    def _criar_editar_excluir(self):
+        with set_actor(self.admin_user, remote_addr='10.0.0.5', remote_port=4321):
+            pessoa = self.criar_pessoa(self.beneficio, nome_completo='Ana')
+            pessoa.bairro = 'Alto'
+            pessoa.save()
+            pessoa.delete()
+
+    def test_campos_iguais_aos_do_auditlog(self):
+        # auditoria.py monta os LogEntry com internos do auditlog (pinado no requirements.txt):
+        # uma atualização que mude o formato das entradas tem que quebrar aqui
+        self._criar_editar_excluir()
+        with self.captureOnCommitCallbacks(execute=True), auditoria_em_lote():
+            self._criar_editar_excluir()
+        entradas = list(self._entradas())
+        self.assertEqual(len(entradas), 6)
+
+        campos = [
+            'action', 'content_type_id', 'object_repr', 'actor_id', 'actor_email',
+            'remote_addr', 'remote_port', 'additional_data', 'serialized_data',
+        ]
+        for sincrona, em_lote in zip(entradas[:3], entradas[3:]):
+            for campo in campos:
+                self.assertEqual(getattr(sincrona, campo), getattr(em_lote, campo), campo)
+            self.assertEqual(type(sincrona.changes), type(em_lote.changes))
+            self.assertEqual(sincrona.changes_dict.keys(), em_lote.changes_dict.keys())
+            self.assertEqual(sincrona.object_pk, str(sincrona.object_id))
+            self.assertEqual(em_lote.object_pk, str(em_lote.object_id))
+        self.assertEqual(entradas[1].changes_dict['bairro'], entradas[4].changes_dict['bairro'])
+        self.assertEqual((entradas[4].remote_addr, entradas[4].remote_port), ('10.0.0.5', 4321))
+
+    def test_alteracao_desfeita_nao_entra(self):
+        with self.captureOnCommitCallbacks(execute=True), auditoria_em_lote():
+            try:
+                with transaction.atomic():
+                    self.criar_pessoa(self.beneficio, nome_completo='Desfeita')
+                    raise ValueError
+            except ValueError:
+                pass
+            self.criar_pessoa(self.beneficio, nome_completo='Mantida', cpf='276.178.580-71')
+        self.assertEqual([e.object_repr for e in self._entradas()], [str(Pessoa.objects.get())])
+
+    @override_settings(AUDITORIA_SINCRONA=True)
+    def test_modo_sincrono_grava_na_hora(self):
+        with auditoria_em_lote():
+            self.criar_pessoa(self.beneficio)
+            gravar_log_acao(LogAcao(usuario=self.admin_user, tipo='status_ativar', descricao='x'))
+            self.assertEqual(self._entradas().count(), 1)
+            self.assertEqual(LogAcao.objects.count(), 1)
+
+    def test_requisicao_grava_com_usuario_e_ip(self):
+        pessoa = self.criar_pessoa(self.beneficio, status='desligado')
+        self.login_as('admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('pessoa_ativar', args=[pessoa.pk]), REMOTE_ADDR='10.1.1.1')
+        entrada = self._entradas().last()
+        self.assertEqual((entrada.actor, entrada.remote_addr), (self.admin_user, '10.1.1.1'))
+        self.assertEqual(entrada.changes_dict['status'], ['desligado', 'ativo'])
+        self.assertTrue(RegistroAuditoria.objects.filter(log_entry=entrada).exists())
+
+
+class RenovarSessaoMiddlewareTest(GeSocialTestBase):
+
+    def _gravacoes_de_sessao(self, agora):
+        with mock.patch('beneficios.middleware.time.time', return_value=agora), \
+                CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(reverse('dashboard'))
+        self.assertEqual(resp.status_code, 200)
+        return [
+            q['sql'] for q in consultas.captured_queries
+            if 'django_session' in q['sql'] and not q['sql'].lstrip().upper().startswith('SELECT')
+        ]
+
+    def test_renova_so_depois_da_fracao_da_janela(self):
+        self.login_as('normal')
+        inicio = 1_800_000_000
+        self.assertTrue(self._gravacoes_de_sessao(inicio))  # primeira marca
+        self.assertEqual(self._gravacoes_de_sessao(inicio + 60), [])
+        self.assertEqual(self._gravacoes_de_sessao(inicio + 359), [])
+        self.assertTrue(self._gravacoes_de_sessao(inicio + 360))  # 10% de 3600s
+        self.assertEqual(self.client.session[RenovarSessaoMiddleware.CHAVE], inicio + 360)
+
+    def test_leitura_vem_do_cache(self):
+        self.login_as('normal')
+        self._gravacoes_de_sessao(1_800_000_000)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('dashboard'))
+        self.assertFalse([q for q in consultas.captured_queries if 'django_session' in q['sql']])
+
+    def test_anonimo_nao_cria_sessao(self):
+        resp = self.client.get(reverse('login'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, resp.cookies)
+
+
+class MetricasTest(GeSocialTestBase):
+
+    TOKEN = 'token-do-coletor'
+
+    def setUp(self):
+        super().setUp()
+        metricas.zerar()
+        token = self.settings(METRICAS_TOKEN=self.TOKEN)
+        token.enable()
+        self.addCleanup(token.disable)
+
+    def _exportado(self):
+        resp = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION=f'Bearer {self.TOKEN}')
+        self.assertEqual(resp.status_code, 200)
+        return resp.content.decode()
+
+    def test_requisicao_registrada_por_view(self):
+        self.login_as('normal')
+        self.client.get(reverse('dashboard'))
+        texto = self._exportado()
+        self.assertIn('gesocial_requisicoes_total{metodo="GET",status="200",view="dashboard"} 1', texto)
+        self.assertIn('gesocial_requisicao_segundos_bucket{view="dashboard",le="+Inf"} 1', texto)
+        self.assertIn('gesocial_requisicao_segundos_count{view="dashboard"} 1', texto)
+        self.assertRegex(texto, r'gesocial_sql_consultas_total\{view="dashboard"\} [1-9]')
+        self.assertRegex(texto, r'gesocial_resposta_bytes_total\{view="dashboard"\} [1-9]')
+
+    def test_contadores_de_pdf(self):
+        beneficio = self.criar_beneficio()
+        pessoa = self.criar_pessoa(beneficio)
+        from beneficios.utils import gerar_recibos_massa_pdf
+        gerar_recibos_massa_pdf([pessoa, pessoa])
+        texto = metricas.exportar()
+        self.assertIn('gesocial_pdf_paginas_total{tipo="recibos_massa"} 4', texto)
+        self.assertIn('gesocial_pdf_segundos_total{tipo="recibos_massa"}', texto)
+
+    def test_acesso(self):
+        url = reverse('metricas')
+        # Vindo de 127.0.0.1 (nginx ou gunicorn direto) não basta
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer errado').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {self.TOKEN}').status_code, 200)
+        self.login_as('normal')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.login_as('admin')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_sem_token_configurado_so_staff(self):
+        url = reverse('metricas')
+        with self.settings(METRICAS_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+            self.login_as('admin')
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_snapshot_gravado_no_maximo_uma_vez_por_intervalo(self):
+        pasta = tempfile.mkdtemp(prefix='gesocial_metricas_')
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        self.login_as('normal')
+        with self.settings(METRICAS_DIR=pasta), mock.patch.object(metricas.os, 'replace', wraps=os.replace) as troca:
+            self.client.get(reverse('dashboard'))
+            self.client.get(reverse('dashboard'))
+            self.assertEqual(troca.call_count, 1)
+            metricas.gravar(forcar=True)
+            self.assertEqual(troca.call_count, 2)
+
+    def test_soma_os_snapshots_dos_outros_workers(self):
+        pasta = tempfile.mkdtemp(prefix='gesocial_metricas_')
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        with self.settings(METRICAS_DIR=pasta):
+            metricas.incrementar('gesocial_pdf_paginas_total', 3, tipo='memorando')
+            metricas.observar('gesocial_memorando_pessoas', 40)
+            metricas.gravar()
+            with open(os.path.join(pasta, '99999-outro.json'), 'w') as f:
+                json.dump({
+                    'contadores': [['gesocial_pdf_paginas_total', [['tipo', 'memorando']], 5]],
+                    'histogramas': [['gesocial_memorando_pessoas', [], [0, 1, 1, 1, 1, 1, 1, 1, 1, 30, 1]]],
+                }, f)
+            texto = metricas.exportar()
+        self.assertIn('gesocial_pdf_paginas_total{tipo="memorando"} 8', texto)
+        self.assertIn('gesocial_memorando_pessoas_bucket{le="10.0"} 0', texto)
+        self.assertIn('gesocial_memorando_pessoas_bucket{le="50.0"} 2', texto)
+        self.assertIn('gesocial_memorando_pessoas_count 2', texto)
+        self.assertIn('gesocial_memorando_pessoas_sum 70', texto)
+
+    def test_limpeza_mantem_snapshots_de_processos_vivos(self):
+        pasta = tempfile.mkdtemp(prefix='gesocial_metricas_')
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        vivo = f'{os.getpid()}-tarefas.json'
+        for nome in (vivo, '99999999-morto.json', '99999999-morto.json.tmp', 'leiame.txt'):
+            open(os.path.join(pasta, nome), 'w').close()
+        with self.settings(METRICAS_DIR=pasta):
+            metricas.limpar_snapshots()
+        self.assertCountEqual(os.listdir(pasta), [vivo, 'leiame.txt'])
+
+
+class ServerTimingTest(GeSocialTestBase):
+
+    def _etapas(self, resp):
+        return dict(parte.split(';', 1) for parte in resp['Server-Timing'].split(', '))
+
+    def test_pagina_com_sql_template_view_e_total(self):
+        self.login_as('admin')
+        etapas = self._etapas(self.client.get(reverse('dashboard')))
+        self.assertEqual(set(etapas), {'sql', 'template', 'view', 'total'})
+        self.assertRegex(etapas['sql'], r'^dur=[\d.]+;desc="[1-9]\d* consulta\(s\) SQL"$')
+        self.assertIn('desc="1 template(s)"', etapas['template'])
+
+    def test_pdf_medido(self):
+        beneficio = self.criar_beneficio()
+        pessoa = self.criar_pessoa(beneficio)
+        self.login_as('admin')
+        etapas = self._etapas(self.client.get(reverse('gerar_recibo', args=[pessoa.pk])))
+        self.assertIn('desc="1 PDF(s)"', etapas['pdf'])
+        self.assertNotIn('template', etapas)
+
+    def test_so_staff_recebe_o_cabecalho(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('login')))
+        self.login_as('normal')
+        self.assertNotIn('Server-Timing', self.client.get(reverse('dashboard')))
+
+    def test_com_debug_todos_recebem(self):
+        self.login_as('normal')
+        with self.settings(DEBUG=True):
+            self.assertIn('total', self._etapas(self.client.get(reverse('dashboard'))))
+
+    def test_aviso_acima_do_orcamento_de_consultas(self):
+        beneficio = self.criar_beneficio()
+        self.login_as('normal')
+        url = reverse('pessoas_por_beneficio', args=[beneficio.id])
+        with self.settings(ORCAMENTO_CONSULTAS={'pessoas_por_beneficio': 1}):
+            with self.assertLogs('beneficios.middleware', 'WARNING') as logs:
+                self.client.get(url + '?status=ativo')
+        self.assertIn('pessoas_por_beneficio fez', logs.output[0])
+        self.assertIn('(orçamento: 1)', logs.output[0])
+        self.assertIn('?status=ativo', logs.output[0])
+
+    def test_dentro_do_orcamento_sem_aviso(self):
+        self.login_as('normal')
+        with self.settings(ORCAMENTO_CONSULTAS={'dashboard': 100}):
+            with self.assertNoLogs('beneficios.middleware', 'WARNING'):
+                self.client.get(reverse('dashboard'))
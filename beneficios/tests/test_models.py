@@ -4,17 +4,28 @@ Testes para todos os Models do GeSocial.
 from decimal import Decimal
 from datetime import time
 
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.db import IntegrityError
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from beneficios.models import (
-    Beneficio, Pessoa, Documento, Memorando, MemorandoPessoa,
+    Beneficio, BeneficioStats, Pessoa, Documento, Memorando, MemorandoPessoa,
     ConfiguracaoGeral, HistoricoStatus, LogAcao,
-    BackupConfig, BackupHistorico, BackupLog,
+    BackupConfig, BackupHistorico, BackupLog, gerar_cpf_hash,
 )
-from .base import GeSocialTestBase
+from .base import GeSocialTestBase, pdf_com_paginas
 
 User = get_user_model()
 
@@ -109,6 +120,52 @@ class PessoaModelTest(GeSocialTestBase):
         cpf_numeros = ''.join(filter(str.isdigit, '529.982.247-25'))
         self.assertEqual(p.cpf_ultimos_4, cpf_numeros[-4:])
 
+    def test_cpf_hash_auto_preenchido(self):
+        from beneficios.models import gerar_cpf_hash
+        b = self.criar_beneficio()
+        p = self.criar_pessoa(b, cpf='529.982.247-25')
+        self.assertEqual(len(p.cpf_hash), 64)
+        self.assertEqual(p.cpf_hash, gerar_cpf_hash('52998224725'))
+        self.assertNotIn('52998224725', p.cpf_hash)
+
+    def test_migracao_0029_calcula_o_mesmo_hash(self):
+        # A 0029 tem cópia própria da regra: se gerar_cpf_hash mudar, o backfill fica diferente
+        from importlib import import_module
+        migracao = import_module('beneficios.migrations.0029_pessoa_cpf_hash')
+        chave = migracao.chave_cpf_hash()
+        for cpf in ('529.982.247-25', '27617858071', ''):
+            self.assertEqual(migracao.cpf_hash(cpf, chave), gerar_cpf_hash(cpf))
+
+    def test_cpf_hash_nao_usa_a_chave_de_criptografia_direto(self):
+        import hmac
+        from django.conf import settings
+        chave_bruta = settings.FIELD_ENCRYPTION_KEY.encode()
+        self.assertNotEqual(
+            gerar_cpf_hash('52998224725'),
+            hmac.new(chave_bruta, b'52998224725', hashlib.sha256).hexdigest(),
+        )
+
+    def test_cpf_hash_atualizado_ao_trocar_cpf(self):
+        b = self.criar_beneficio()
+        p = self.criar_pessoa(b, cpf='529.982.247-25')
+        hash_antigo = p.cpf_hash
+        p.cpf = '276.178.580-71'
+        p.save()
+        self.assertNotEqual(p.cpf_hash, hash_antigo)
+
+    def test_cpf_duplicado_nao_desligado_bloqueado_no_banco(self):
+        b = self.criar_beneficio()
+        self.criar_pessoa(b, cpf='529.982.247-25', status='ativo')
+        with self.assertRaises(IntegrityError):
+            self.criar_pessoa(b, cpf='529.982.247-25', status='em_espera')
+
+    def test_cpf_duplicado_desligado_permitido_no_banco(self):
+        b = self.criar_beneficio()
+        self.criar_pessoa(b, cpf='529.982.247-25', status='desligado')
+        self.criar_pessoa(b, cpf='529.982.247-25', status='desligado')
+        self.criar_pessoa(b, cpf='529.982.247-25', status='ativo')
+        self.assertEqual(Pessoa.objects.count(), 3)
+
     def test_status_choices(self):
         choices = dict(Pessoa.STATUS_CHOICES)
         self.assertIn('ativo', choices)
@@ -149,6 +206,97 @@ class PessoaModelTest(GeSocialTestBase):
         self.assertIn('João', str(p))
 
 
+# ═══════════════════════════════════════════
+# BENEFICIO STATS
+# ═══════════════════════════════════════════
+class BeneficioStatsTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.b = self.criar_beneficio()
+
+    def _stats(self, beneficio=None):
+        return BeneficioStats.objects.get(pk=(beneficio or self.b).pk)
+
+    def _assert_confere(self):
+        """Os contadores mantidos incrementalmente batem com o recálculo do zero"""
+        for stats in BeneficioStats.objects.all():
+            esperado = BeneficioStats.calcular([stats.pk])[stats.pk]
+            self.assertEqual(stats.comparar(esperado), {})
+
+    def test_criado_com_beneficio(self):
+        stats = self._stats()
+        self.assertEqual(stats.total, 0)
+        self.assertEqual(stats.total_mensal, 0)
+
+    def test_criar_pessoa_incrementa(self):
+        self.criar_pessoa(self.b, valor_beneficio=Decimal('150.00'))
+        self.criar_pessoa(self.b, cpf='276.178.580-71', valor_beneficio=Decimal('350.00'), status='em_espera')
+        stats = self._stats()
+        self.assertEqual((stats.ativos, stats.em_espera, stats.desligados), (1, 1, 0))
+        self.assertEqual(stats.total_mensal, Decimal('150.00'))
+        self.assertEqual(stats.faixa_de_101_150, 1)
+        self.assertEqual(stats.faixa_acima_300, 0)
+
+    def test_mudanca_status_e_valor(self):
+        p = self.criar_pessoa(self.b, valor_beneficio=Decimal('100.00'))
+        p.valor_beneficio = Decimal('250.00')
+        p.save()
+        p.status = 'desligado'
+        p.save()
+        stats = self._stats()
+        self.assertEqual((stats.ativos, stats.desligados), (0, 1))
+        self.assertEqual(stats.total_mensal, 0)
+        self.assertEqual(stats.faixa_de_201_250, 0)
+        self._assert_confere()
+
+    def test_troca_de_beneficio(self):
+        outro = Beneficio.objects.create(nome='Renda Solidária')
+        p = self.criar_pessoa(self.b, valor_beneficio=Decimal('200.00'))
+        p.beneficio = outro
+        p.save()
+        self.assertEqual(self._stats().ativos, 0)
+        self.assertEqual(self._stats(outro).ativos, 1)
+        self.assertEqual(self._stats(outro).total_mensal, Decimal('200.00'))
+
+    def test_exclusao_desconta(self):
+        p = self.criar_pessoa(self.b, valor_beneficio=Decimal('120.00'))
+        self.criar_pessoa(self.b, cpf='276.178.580-71', valor_beneficio=Decimal('80.00'))
+        p.delete()
+        Pessoa.objects.filter(beneficio=self.b).delete()
+        self.assertEqual(self._stats().total, 0)
+        self._assert_confere()
+
+    def test_recalcular_corrige_divergencia(self):
+        self.criar_pessoa(self.b, valor_beneficio=Decimal('100.00'))
+        BeneficioStats.objects.filter(pk=self.b.pk).update(ativos=7, total_mensal=0)
+        divergencias = BeneficioStats.recalcular()
+        self.assertEqual(divergencias[self.b.pk]['ativos'], (7, 1))
+        self.assertEqual(self._stats().ativos, 1)
+        self.assertEqual(BeneficioStats.recalcular(), {})
+
+    def test_do_beneficio_cria_linha_ausente(self):
+        self.criar_pessoa(self.b)
+        BeneficioStats.objects.all().delete()
+        self.assertEqual(BeneficioStats.do_beneficio(self.b).ativos, 1)
+
+    def test_comando_verificar(self):
+        self.criar_pessoa(self.b)
+        call_command('recompute_stats', '--verificar', stdout=StringIO())
+        BeneficioStats.objects.filter(pk=self.b.pk).update(em_espera=3)
+        with self.assertRaises(CommandError):
+            call_command('recompute_stats', '--verificar', stdout=StringIO())
+        self.assertEqual(self._stats().em_espera, 3)
+
+    def test_comando_reconstroi(self):
+        self.criar_pessoa(self.b)
+        BeneficioStats.objects.filter(pk=self.b.pk).update(ativos=0)
+        out = StringIO()
+        call_command('recompute_stats', stdout=out)
+        self.assertIn('corrigido', out.getvalue())
+        self.assertEqual(self._stats().ativos, 1)
+
+
 # ═══════════════════════════════════════════
 # DOCUMENTO MODEL
 # ═══════════════════════════════════════════
@@ -173,6 +321,106 @@ class DocumentoModelTest(GeSocialTestBase):
         self.assertEqual(Documento.objects.count(), 0)
 
 
+class DocumentoNormalizacaoTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp(prefix='gesocial_docs_')
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.pessoa = self.criar_pessoa(self.criar_beneficio())
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    def _conteudo(self, doc):
+        with open(doc.arquivo.path, 'rb') as f:
+            return f.read()
+
+    def test_upload_cortado_em_quatro_paginas(self):
+        from PyPDF2 import PdfReader
+        enviado = pdf_com_paginas(*(f'pag{n}' for n in range(6)))
+        doc = Documento.objects.create(pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', enviado))
+        conteudo = self._conteudo(doc)
+        self.assertEqual(doc.paginas, 4)
+        self.assertEqual(len(PdfReader(doc.arquivo.path).pages), 4)
+        self.assertEqual(doc.tamanho, len(conteudo))
+        self.assertEqual(doc.hash_conteudo, hashlib.sha256(conteudo).hexdigest())
+
+    def test_pdf_ilegivel_guardado_como_veio(self):
+        doc = Documento.objects.create(pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', b'%PDF-test'))
+        self.assertIsNone(doc.paginas)
+        self.assertEqual(self._conteudo(doc), b'%PDF-test')
+        self.assertEqual(doc.tamanho, 9)
+
+    def test_comando_preenche_documentos_antigos(self):
+        doc = Documento.objects.create(
+            pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', pdf_com_paginas('a', 'b', 'c', 'd', 'e')),
+        )
+        # Simula documento enviado antes da normalização
+        with open(doc.arquivo.path, 'wb') as f:
+            f.write(pdf_com_paginas('a', 'b', 'c', 'd', 'e'))
+        Documento.objects.filter(pk=doc.pk).update(paginas=None, tamanho=None, hash_conteudo='')
+
+        call_command('normalizar_documentos', stdout=StringIO())
+        doc.refresh_from_db()
+        self.assertEqual(doc.paginas, 4)
+        self.assertEqual(doc.hash_conteudo, hashlib.sha256(self._conteudo(doc)).hexdigest())
+        self.assertEqual(doc.history.count(), 1)  # só a criação; o backfill não gera auditoria
+
+    def test_comando_rele_arquivo_trocado_no_disco(self):
+        doc = Documento.objects.create(pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', pdf_com_paginas('a')))
+        self.assertEqual(doc.paginas, 1)
+        # Arquivo substituído sem passar pelo upload: paginas/tamanho ficaram para trás
+        with open(doc.arquivo.path, 'wb') as f:
+            f.write(pdf_com_paginas('a', 'b', 'c'))
+
+        call_command('normalizar_documentos', stdout=StringIO())
+        doc.refresh_from_db()
+        self.assertEqual(doc.paginas, 3)
+        self.assertEqual(doc.tamanho, len(self._conteudo(doc)))
+
+    def test_comando_ignora_documento_com_metadados_em_dia(self):
+        doc = Documento.objects.create(pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', pdf_com_paginas('a')))
+        saida = StringIO()
+        with mock.patch.object(Documento, 'normalizar_arquivo') as normalizar:
+            call_command('normalizar_documentos', stdout=saida)
+        normalizar.assert_not_called()
+        self.assertIn('0 documento(s) processado(s)', saida.getvalue())
+
+    def test_reescrita_troca_o_arquivo_inteiro(self):
+        doc = Documento.objects.create(pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', b'x'))
+        original = pdf_com_paginas('a', 'b', 'c', 'd', 'e')
+        with open(doc.arquivo.path, 'wb') as f:
+            f.write(original)
+        os.chmod(doc.arquivo.path, 0o644)
+
+        # Falha no meio da gravação: o original fica intacto e não sobra arquivo parcial
+        with mock.patch('beneficios.models.os.fsync', side_effect=OSError('disco cheio')):
+            with self.assertRaises(OSError):
+                doc.normalizar_arquivo()
+        self.assertEqual(self._conteudo(doc), original)
+        self.assertEqual(os.listdir(os.path.dirname(doc.arquivo.path)), [os.path.basename(doc.arquivo.name)])
+
+        self.assertTrue(doc.normalizar_arquivo())
+        self.assertEqual(doc.hash_conteudo, hashlib.sha256(self._conteudo(doc)).hexdigest())
+        self.assertEqual(os.stat(doc.arquivo.path).st_mode & 0o777, 0o644)
+
+    def test_comando_apenas_metadados_nao_reescreve(self):
+        doc = Documento.objects.create(pessoa=self.pessoa, arquivo=SimpleUploadedFile('doc.pdf', b'x'))
+        original = pdf_com_paginas('a', 'b', 'c', 'd', 'e')
+        with open(doc.arquivo.path, 'wb') as f:
+            f.write(original)
+        Documento.objects.filter(pk=doc.pk).update(tamanho=None)
+
+        call_command('normalizar_documentos', '--apenas-metadados', stdout=StringIO())
+        doc.refresh_from_db()
+        self.assertEqual(self._conteudo(doc), original)
+        self.assertEqual((doc.paginas, doc.tamanho), (4, len(original)))
+
+
 # ═══════════════════════════════════════════
 # MEMORANDO MODEL
 # ═══════════════════════════════════════════
@@ -467,3 +715,107 @@ class BackupLogTest(GeSocialTestBase):
         BackupLog.objects.create(backup=bh, etapa='inicio', status='sucesso')
         bh.delete()
         self.assertEqual(BackupLog.objects.count(), 0)
+
+
+# ═══════════════════════════════════════════
+# SEED DE BENCHMARK
+# ═══════════════════════════════════════════
+class SeedBenchmarkTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp(prefix='gesocial_seed_')
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    @staticmethod
+    def _cpf_valido(cpf):
+        digitos = [int(d) for d in cpf if d.isdigit()]
+        for n in (9, 10):
+            resto = sum(d * p for d, p in zip(digitos, range(n + 1, 1, -1))) % 11
+            if digitos[n] != (0 if resto < 2 else 11 - resto):
+                return False
+        return len(digitos) == 11 and len(set(digitos)) > 1
+
+    def _seed(self, *args):
+        call_command('seed_benchmark', '--processos', '1', '--lote', '20', *args, stdout=StringIO())
+
+    def test_popula_pessoas_historico_auditoria_e_memorandos(self):
+        from auditlog.models import LogEntry
+        from beneficios.models import RegistroAuditoria
+
+        self._seed('--pessoas', '50', '--memorandos', '2', '--documentos', '5', '--kb-pagina', '1')
+
+        self.assertEqual(Pessoa.objects.count(), 50)
+        cpfs = [p.cpf for p in Pessoa.objects.all()]
+        self.assertEqual(len(set(cpfs)), 50)
+        for cpf in cpfs:
+            self.assertTrue(self._cpf_valido(cpf), cpf)
+        pessoa = Pessoa.objects.first()
+        self.assertEqual(pessoa.cpf_hash, gerar_cpf_hash(pessoa.cpf))
+        self.assertEqual(pessoa.cpf_ultimos_4, pessoa.cpf.replace('-', '')[-4:])
+
+        self.assertEqual(HistoricoStatus.objects.count(), 50 + Pessoa.objects.exclude(status='ativo').count())
+        self.assertEqual(LogEntry.objects.filter(content_type__model='pessoa').count(), 50)
+        self.assertEqual(RegistroAuditoria.objects.count(), LogEntry.objects.count() + LogAcao.objects.count())
+        self.assertEqual(Documento.objects.count(), 5)
+        self.assertTrue(os.path.exists(Documento.objects.first().arquivo.path))
+
+        ativos = Pessoa.objects.filter(status='ativo').count()
+        self.assertEqual(Memorando.objects.count(), 2 * Beneficio.objects.count())
+        self.assertEqual(MemorandoPessoa.objects.count(), 2 * ativos)
+        self.assertEqual(sum(s.ativos for s in BeneficioStats.objects.all()), ativos)
+
+    def test_banco_com_pessoas_exige_acrescentar(self):
+        self.criar_pessoa(self.criar_beneficio())
+        with self.assertRaises(CommandError):
+            self._seed('--pessoas', '10')
+        self._seed('--pessoas', '10', '--memorandos', '0', '--acrescentar')
+        self.assertEqual(Pessoa.objects.count(), 11)
+
+
+class BenchTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.pasta = tempfile.mkdtemp(prefix='gesocial_bench_')
+        self.addCleanup(shutil.rmtree, self.pasta, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.pasta)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.baseline = os.path.join(self.pasta, 'baseline.json')
+
+    def test_comparar_aponta_so_o_que_passou_da_tolerancia(self):
+        from beneficios.management.commands.bench import comparar
+        base = {'1000': {'dashboard': {'segundos': 1.0, 'pico_memoria_mb': 10.0, 'consultas': 5}}}
+        dentro = {'1000': {'dashboard': {'segundos': 1.2, 'pico_memoria_mb': 12.0, 'consultas': 5}}}
+        fora = {'1000': {'dashboard': {'segundos': 1.5, 'pico_memoria_mb': 10.0, 'consultas': 6}}}
+        self.assertEqual(comparar(dentro, base, 0.25), [])
+        regressoes = comparar(fora, base, 0.25)
+        self.assertEqual(len(regressoes), 2)
+        self.assertIn('segundos 1.5', regressoes[0])
+        self.assertIn('consultas 6', regressoes[1])
+        self.assertEqual(comparar({'10000': dentro['1000']}, base, 0.25), [])
+
+    def test_grava_e_compara_com_a_linha_de_base(self):
+        call_command('seed_benchmark', '--pessoas', '40', '--memorandos', '1', '--documentos', '3',
+                     '--kb-pagina', '1', '--processos', '1', stdout=StringIO())
+        argumentos = ['--banco-atual', '--repeticoes', '1', '--baseline', self.baseline]
+        call_command('bench', *argumentos, '--gravar', stdout=StringIO())
+        with open(self.baseline) as f:
+            cenarios = json.load(f)['40']
+        self.assertIn('pessoas_por_beneficio?status=em_espera', cenarios)
+        self.assertIn('gerar_documentos_massa_pdf', cenarios)
+        self.assertGreater(cenarios['registrar_memorando']['consultas'], 0)
+        self.assertEqual(Memorando.objects.count(), Beneficio.objects.count())  # registrar_memorando desfeito
+
+        cenarios['dashboard']['consultas'] = 0
+        with open(self.baseline, 'w') as f:
+            json.dump({'40': cenarios}, f)
+        with self.assertRaisesMessage(CommandError, '1 métrica(s)'):
+            call_command('bench', *argumentos, '--cenarios', 'dashboard', stdout=StringIO(), stderr=StringIO())
@@ -4,11 +4,19 @@ Testes para services.py do GeSocial.
 from decimal import Decimal
 from datetime import datetime
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.db import IntegrityError
+from django.urls import reverse
 
-from beneficios.services import gerar_numero_memorando, registrar_memorando
-from beneficios.models import Memorando, MemorandoPessoa, ConfiguracaoGeral
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from beneficios.services import (
+    BENEFICIOS_VERSAO_KEY, beneficios_cadastrados, calcular_relatorio_financeiro, gerar_numero_memorando,
+    obter_beneficio, registrar_memorando,
+)
+from beneficios.models import Beneficio, Memorando, MemorandoPessoa, ConfiguracaoGeral, SequenciaMemorando
 from .base import GeSocialTestBase
 
 
@@ -33,6 +41,17 @@ class GerarNumeroMemorandoTest(GeSocialTestBase):
         numero, _, seq = gerar_numero_memorando()
         self.assertEqual(seq, 2)
 
+    def test_contador_do_ano_avanca(self):
+        gerar_numero_memorando()
+        _, ano, seq = gerar_numero_memorando()
+        self.assertEqual(seq, 2)
+        self.assertEqual(SequenciaMemorando.objects.get(ano=ano).ultima_sequencia, 2)
+
+    def test_numeros_reservados_nao_se_repetem(self):
+        """Mesmo sem gravar o memorando, um número reservado não é entregue de novo."""
+        numeros = {gerar_numero_memorando()[0] for _ in range(5)}
+        self.assertEqual(len(numeros), 5)
+
     def test_formato_5_digitos(self):
         numero, _, _ = gerar_numero_memorando()
         partes = numero.split('/')
@@ -121,3 +140,126 @@ class RegistrarMemorandoTest(GeSocialTestBase):
             'valor_beneficio': Decimal('50'), 'ordem': 1,
         }], self.admin_user)
         self.assertEqual(m.conta_pagadora, 'Conta Especial 999')
+
+    def test_snapshot_em_lote_numero_constante_de_queries(self):
+        """A quantidade de comandos SQL não cresce com o número de pessoas."""
+        def dados(n):
+            return [
+                {'pessoa': self.pessoa, 'nome_completo': f'P{i}', 'valor_beneficio': Decimal('10'), 'ordem': i}
+                for i in range(1, n + 1)
+            ]
+        registrar_memorando(self.beneficio, dados(1), self.admin_user)  # cria o contador do ano
+        with CaptureQueriesContext(connection) as poucas:
+            registrar_memorando(self.beneficio, dados(3), self.admin_user)
+        with CaptureQueriesContext(connection) as muitas:
+            m = registrar_memorando(self.beneficio, dados(150), self.admin_user)
+        self.assertEqual(len(muitas), len(poucas))
+        self.assertEqual(m.pessoas.count(), 150)
+        self.assertEqual(list(m.pessoas.values_list('ordem', flat=True)[:3]), [1, 2, 3])
+
+    def test_falha_nao_consome_numero(self):
+        try:
+            registrar_memorando(self.beneficio, [{
+                'pessoa': self.pessoa, 'nome_completo': 'X',
+                'valor_beneficio': Decimal('10'), 'ordem': None,  # NOT NULL: falha no INSERT do snapshot
+            }], self.admin_user)
+        except Exception:
+            pass
+        m = registrar_memorando(self.beneficio, [{
+            'pessoa': self.pessoa, 'nome_completo': 'X', 'valor_beneficio': Decimal('10'), 'ordem': 1,
+        }], self.admin_user)
+        self.assertEqual(m.sequencia, 1)
+
+
+class CalcularRelatorioFinanceiroTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.a = self.criar_beneficio(nome='A', descricao='Benefício A')
+        self.b = self.criar_beneficio(nome='B')
+        inativo = self.criar_beneficio(nome='C', ativo=False)
+        cpfs = iter(self.CPFS_VALIDOS)
+        for beneficio, status, valor in [
+            (self.a, 'ativo', '100.00'),
+            (self.a, 'ativo', '150.00'),
+            (self.a, 'em_espera', '300.01'),
+            (self.b, 'desligado', '250.00'),
+            (inativo, 'ativo', '999.00'),
+        ]:
+            self.criar_pessoa(beneficio, cpf=next(cpfs), status=status, valor_beneficio=Decimal(valor))
+
+    def test_detalhamentos(self):
+        dados = calcular_relatorio_financeiro(Beneficio.objects.filter(ativo=True))
+        self.assertEqual(dados['total_pessoas'], 4)
+        self.assertEqual(dados['total_valor'], Decimal('800.01'))
+        self.assertEqual(dados['resumo_geral']['total_beneficios'], 2)
+
+        a, b = dados['det_beneficios']
+        self.assertEqual((a['descricao'], a['nome_oficial']), ('Benefício A', 'A'))
+        self.assertEqual((a['ativos'], a['espera'], a['desligados'], a['valor']), (2, 1, 0, Decimal('550.01')))
+        self.assertEqual((b['ativos'], b['espera'], b['desligados'], b['valor']), (0, 0, 1, Decimal('250.00')))
+        self.assertAlmostEqual(a['percentual'] + b['percentual'], 100)
+
+        faixas = {f['faixa']: (f['pessoas'], f['valor']) for f in dados['det_faixas']}
+        self.assertEqual(faixas['Até R$ 100'], (1, Decimal('100.00')))
+        self.assertEqual(faixas['R$ 101 - 150'], (1, Decimal('150.00')))
+        self.assertEqual(faixas['R$ 151 - 200'], (0, Decimal('0')))
+        self.assertEqual(faixas['R$ 201 - 250'], (1, Decimal('250.00')))
+        self.assertEqual(faixas['Acima de R$ 300'], (1, Decimal('300.01')))
+
+    def test_filtro_de_status_e_beneficio_sem_pessoas(self):
+        dados = calcular_relatorio_financeiro(Beneficio.objects.filter(ativo=True), 'ativo')
+        self.assertEqual(dados['total_pessoas'], 2)
+        self.assertEqual(dados['total_valor'], Decimal('250.00'))
+        self.assertEqual([b['nome_oficial'] for b in dados['det_beneficios']], ['A', 'B'])
+        self.assertEqual(dados['det_beneficios'][1]['valor'], Decimal('0'))
+
+    def test_consultas_nao_dependem_do_cadastro(self):
+        with CaptureQueriesContext(connection) as antes:
+            calcular_relatorio_financeiro(Beneficio.objects.filter(ativo=True))
+        for cpf in self.CPFS_VALIDOS[5:9]:
+            self.criar_pessoa(self.b, cpf=cpf, valor_beneficio=Decimal('180'))
+        with CaptureQueriesContext(connection) as depois:
+            calcular_relatorio_financeiro(Beneficio.objects.filter(ativo=True))
+        self.assertEqual(len(antes), 2)
+        self.assertEqual(len(depois), 2)
+
+
+class RegistroBeneficiosTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.transporte = self.criar_beneficio(nome='Transporte')
+        self.renda = self.criar_beneficio(nome='Renda', ativo=False)
+        beneficios_cadastrados()  # aquece o registro
+
+    def test_sem_sql_enquanto_a_versao_nao_muda(self):
+        with self.assertNumQueries(0):
+            self.assertEqual([b.nome for b in beneficios_cadastrados()], ['Renda', 'Transporte'])
+            self.assertEqual([b.nome for b in beneficios_cadastrados(apenas_ativos=True)], ['Transporte'])
+            self.assertEqual(obter_beneficio(self.renda.pk).nome, 'Renda')
+            self.assertIsNone(obter_beneficio(0))
+
+    def test_salvar_beneficio_publica_nova_versao(self):
+        self.renda.ativo = True
+        self.renda.save()
+        self.assertEqual([b.nome for b in beneficios_cadastrados(apenas_ativos=True)], ['Renda', 'Transporte'])
+
+    def test_versao_trocada_por_outro_worker_recarrega(self):
+        Beneficio.objects.filter(pk=self.transporte.pk).update(nome='Transporte Escolar')  # sem signal
+        self.assertEqual(obter_beneficio(self.transporte.pk).nome, 'Transporte')
+        cache.set(BENEFICIOS_VERSAO_KEY, 'outra', None)
+        self.assertEqual(obter_beneficio(self.transporte.pk).nome, 'Transporte Escolar')
+
+    def test_devolve_copias(self):
+        obter_beneficio(self.transporte.pk).nome = 'Alterado'
+        self.assertEqual(obter_beneficio(self.transporte.pk).nome, 'Transporte')
+
+    def test_listagem_nao_consulta_beneficios(self):
+        self.login_as('normal')
+        self.client.get(reverse('pessoas_por_beneficio', args=[self.transporte.pk]))
+        with CaptureQueriesContext(connection) as consultas:
+            resp = self.client.get(reverse('pessoas_por_beneficio', args=[self.transporte.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse([q for q in consultas.captured_queries if 'FROM "beneficios_beneficio"' in q['sql']])
+        self.assertEqual(self.client.get(reverse('pessoas_por_beneficio', args=[9999])).status_code, 404)
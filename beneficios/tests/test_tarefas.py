@@ -0,0 +1,241 @@
+"""
+Testes para a fila de gerações em massa (TarefaGeracao + comando processar_tarefas).
+"""
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PyPDF2 import PdfReader
+
+from beneficios.models import ConfiguracaoGeral, Documento, LogAcao, Memorando, TarefaGeracao
+from beneficios.tarefas import enfileirar_tarefa, executar_tarefa, limpar_tarefas_antigas
+from .base import GeSocialTestBase, pdf_com_paginas
+
+
+class TarefaGeracaoTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp(prefix='gesocial_tarefas_')
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.beneficio = self.criar_beneficio()
+        self.p1 = self.criar_pessoa(self.beneficio, nome_completo='Ana', cpf='529.982.247-25')
+        self.p2 = self.criar_pessoa(self.beneficio, nome_completo='Bruna', cpf='276.178.580-71')
+        ConfiguracaoGeral.get_config()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    def _processar(self):
+        call_command('processar_tarefas', '--uma-vez', stdout=StringIO(), stderr=StringIO())
+
+    def test_view_enfileira_e_redireciona_para_status(self):
+        self.login_as('normal')
+        resp = self.client.get(reverse('gerar_recibos_massa', args=[self.beneficio.pk]), {'status': 'ativo'})
+        tarefa = TarefaGeracao.objects.get()
+        self.assertRedirects(resp, reverse('tarefa_status', args=[tarefa.pk]))
+        self.assertEqual(tarefa.status, 'pendente')
+        self.assertEqual(tarefa.pessoas_ids, [self.p1.pk, self.p2.pk])
+        self.assertEqual(tarefa.usuario, self.normal_user)
+
+    def test_view_responde_json_para_fetch(self):
+        self.login_as('normal')
+        resp = self.client.get(
+            reverse('gerar_memorando_massa', args=[self.beneficio.pk]),
+            {'status': 'ativo'},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()['url'], reverse('tarefa_status', args=[resp.json()['tarefa']]))
+
+    def test_worker_gera_recibos(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p2.pk, self.p1.pk])
+        self._processar()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'sucesso')
+        self.assertEqual(tarefa.processados, 2)
+        caminho = os.path.join(self.media_root, tarefa.arquivo)
+        with open(caminho, 'rb') as f:
+            self.assertEqual(f.read(4), b'%PDF')
+
+    def test_worker_memorando_registra_historico(self):
+        tarefa = enfileirar_tarefa('memorando_massa', self.beneficio, self.normal_user, [self.p1.pk, self.p2.pk])
+        self._processar()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'sucesso')
+        memorando = Memorando.objects.get()
+        self.assertEqual(tarefa.memorando, memorando)
+        self.assertEqual(list(memorando.pessoas.values_list('nome_completo', flat=True)), ['Ana', 'Bruna'])
+
+    def test_memorando_ignora_quem_foi_desligado_na_fila(self):
+        tarefa = enfileirar_tarefa('memorando_massa', self.beneficio, self.normal_user, [self.p1.pk, self.p2.pk])
+        self.p2.status = 'desligado'
+        self.p2.save()
+        self._processar()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'sucesso')
+        self.assertEqual(list(Memorando.objects.get().pessoas.values_list('nome_completo', flat=True)), ['Ana'])
+
+    def test_recibos_sem_nenhum_ativo_vira_erro(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        self.p1.status = 'em_espera'
+        self.p1.save()
+        executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'erro')
+
+    def test_falha_no_pdf_desfaz_o_memorando(self):
+        tarefa = enfileirar_tarefa('memorando_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        with mock.patch('beneficios.utils.gerar_memorando_segunda_via_pdf', side_effect=ValueError('sem fonte')):
+            executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'erro')
+        self.assertIsNone(tarefa.memorando)
+        self.assertFalse(Memorando.objects.exists())
+
+        # O número não foi queimado: a próxima tarefa usa o mesmo
+        nova = enfileirar_tarefa('memorando_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        executar_tarefa(nova)
+        self.assertEqual(Memorando.objects.get().sequencia, 1)
+
+    def test_memorando_desfeito_se_limpeza_marcou_erro(self):
+        tarefa = enfileirar_tarefa('memorando_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        # A limpeza roda em outro processo; aqui basta o UPDATE condicional não achar a tarefa
+        with mock.patch('beneficios.tarefas._gravar_resultado', return_value=0):
+            executar_tarefa(tarefa)
+        self.assertFalse(Memorando.objects.exists())
+        self.assertEqual(tarefa.arquivo, '')
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'tarefas', timezone.localtime().strftime('%Y/%m'))), [])
+
+    def test_worker_gera_documentos_sem_deixar_parcial(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        Documento.objects.create(pessoa=self.p1, arquivo=SimpleUploadedFile('doc.pdf', pdf_com_paginas('a', 'b')))
+        tarefa = enfileirar_tarefa('documentos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'sucesso')
+        caminho = os.path.join(self.media_root, tarefa.arquivo)
+        self.assertEqual(len(PdfReader(caminho).pages), 4)
+        self.assertEqual(os.listdir(os.path.dirname(caminho)), [os.path.basename(caminho)])
+
+    def test_log_de_documentos_so_apos_gerar(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        Documento.objects.create(pessoa=self.p1, arquivo=SimpleUploadedFile('doc.pdf', pdf_com_paginas('a')))
+        Documento.objects.create(pessoa=self.p2, arquivo=SimpleUploadedFile('doc.pdf', pdf_com_paginas('b')))
+        self.login_as('normal')
+        self.client.get(reverse('gerar_documentos_massa', args=[self.beneficio.pk]), {'status': 'ativo'},
+                        HTTP_X_FORWARDED_FOR='10.1.2.3')
+        self.assertFalse(LogAcao.objects.filter(tipo='documentos_massa').exists())
+
+        self.p2.delete()  # saiu do cadastro enquanto a tarefa esperava
+        with self.captureOnCommitCallbacks(execute=True):
+            self._processar()
+        log = LogAcao.objects.get(tipo='documentos_massa')
+        self.assertEqual(log.descricao, f'Documentos em massa - {self.beneficio.nome} - 1 pessoas')
+        self.assertEqual((log.usuario, log.ip), (self.normal_user, '10.1.2.3'))
+
+    def test_documentos_com_erro_nao_gera_log(self):
+        tarefa = enfileirar_tarefa('documentos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'erro')
+        self.assertFalse(LogAcao.objects.filter(tipo='documentos_massa').exists())
+
+    def test_documentos_sem_arquivo_vira_erro(self):
+        tarefa = enfileirar_tarefa('documentos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'erro')
+        self.assertTrue(tarefa.mensagem)
+
+    def test_pessoas_excluidas_viram_erro(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [999999])
+        executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'erro')
+
+    def test_progresso_json(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        self.login_as('normal')
+        dados = self.client.get(reverse('tarefa_progresso', args=[tarefa.pk])).json()
+        self.assertEqual(dados['status'], 'pendente')
+        self.assertEqual(dados['url_arquivo'], '')
+
+        self._processar()
+        dados = self.client.get(reverse('tarefa_progresso', args=[tarefa.pk])).json()
+        self.assertEqual(dados['percentual'], 100)
+        self.assertEqual(dados['url_arquivo'], reverse('tarefa_arquivo', args=[tarefa.pk]))
+
+    def test_arquivo_via_x_accel_redirect(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        self._processar()
+        tarefa.refresh_from_db()
+        self.login_as('normal')
+        resp = self.client.get(reverse('tarefa_arquivo', args=[tarefa.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['X-Accel-Redirect'], f'/protected-media/{tarefa.arquivo}')
+
+    def test_arquivo_pendente_404(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        self.login_as('normal')
+        resp = self.client.get(reverse('tarefa_arquivo', args=[tarefa.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_tarefa_de_outro_usuario_404(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.admin_user, [self.p1.pk])
+        self.login_as('normal')
+        resp = self.client.get(reverse('tarefa_status', args=[tarefa.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_admin_ve_tarefa_de_outro_usuario(self):
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        self.login_as('admin')
+        resp = self.client.get(reverse('tarefa_status', args=[tarefa.pk]))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_limpeza_travadas_e_expiradas(self):
+        travada = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        TarefaGeracao.objects.filter(pk=travada.pk).update(
+            status='executando', iniciado_em=timezone.now() - timedelta(hours=2),
+        )
+        antiga = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        executar_tarefa(antiga)
+        caminho = os.path.join(self.media_root, antiga.arquivo)
+        TarefaGeracao.objects.filter(pk=antiga.pk).update(finalizado_em=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(limpar_tarefas_antigas(), (1, 1))
+        self.assertFalse(os.path.exists(caminho))
+        travada.refresh_from_db()
+        self.assertEqual(travada.status, 'erro')
+
+    def test_resultado_nao_sobrescreve_status_da_limpeza(self):
+        from beneficios.utils import gerar_recibos_massa_pdf
+        tarefa = enfileirar_tarefa('recibos_massa', self.beneficio, self.normal_user, [self.p1.pk])
+        tarefa.status = 'executando'
+        tarefa.save(update_fields=['status'])
+
+        def limpeza_no_meio(*args, **kwargs):
+            # A limpeza marca a tarefa como erro enquanto o PDF ainda está sendo gerado
+            TarefaGeracao.objects.filter(pk=tarefa.pk).update(status='erro', mensagem='travada')
+            return gerar_recibos_massa_pdf(*args, **kwargs)
+
+        with mock.patch('beneficios.utils.gerar_recibos_massa_pdf', side_effect=limpeza_no_meio):
+            executar_tarefa(tarefa)
+        self.assertEqual(tarefa.status, 'erro')
+        self.assertEqual(tarefa.mensagem, 'travada')
+        self.assertEqual(tarefa.arquivo, '')
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'erro')
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'tarefas', timezone.localtime().strftime('%Y/%m'))), [])
+
+    def test_documentos_massa_sem_documento_nao_enfileira(self):
+        """A validação de anexos continua na requisição, antes de enfileirar"""
+        self.login_as('normal')
+        self.client.get(reverse('gerar_documentos_massa', args=[self.beneficio.pk]), {'status': 'ativo'})
+        self.assertFalse(TarefaGeracao.objects.exists())
+        self.assertFalse(LogAcao.objects.filter(tipo='documentos_massa').exists())
@@ -0,0 +1,243 @@
+"""
+Testes para as funções de geração de PDF em utils.py.
+"""
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PyPDF2 import PdfReader
+
+from beneficios import utils
+from beneficios.models import Documento
+from .base import GeSocialTestBase, pdf_com_paginas
+
+
+class ValorPorExtensoTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        utils._extenso_centavos.cache_clear()
+
+    def test_centavos_de_float_exatos(self):
+        self.assertEqual(utils.valor_por_extenso(0.29), 'zero reais e vinte e nove centavos')
+        self.assertEqual(utils.valor_por_extenso(1.15), 'um real e quinze centavos')
+
+    def test_decimal(self):
+        self.assertEqual(utils.valor_por_extenso(Decimal('150.00')), 'cento e cinquenta reais')
+        self.assertEqual(utils.valor_por_extenso(Decimal('150.29')), 'cento e cinquenta reais e vinte e nove centavos')
+
+    def test_float_e_decimal_usam_a_mesma_entrada_do_cache(self):
+        utils.valor_por_extenso(Decimal('200.50'))
+        utils.valor_por_extenso(200.5)
+        info = utils._extenso_centavos.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 1))
+
+    def test_aquecer_com_valores_dos_ativos(self):
+        beneficio = self.criar_beneficio()
+        self.criar_pessoa(beneficio, valor_beneficio=Decimal('150'))
+        self.criar_pessoa(beneficio, cpf='276.178.580-71', valor_beneficio=Decimal('150'))
+        self.criar_pessoa(beneficio, cpf='845.526.170-60', valor_beneficio=Decimal('99.90'))
+        self.assertEqual(utils.aquecer_valor_por_extenso(), 2)
+        self.assertEqual(utils._extenso_centavos.cache_info().currsize, 2)
+
+
+class RecibosMassaParaleloTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        beneficio = self.criar_beneficio()
+        self.pessoas = [
+            self.criar_pessoa(beneficio, nome_completo=f'Pessoa {i}', cpf=cpf, valor_beneficio=Decimal('100') + i)
+            for i, cpf in enumerate(self.CPFS_VALIDOS[:5])
+        ]
+
+    def _textos(self, buffer):
+        return [pagina.extract_text() for pagina in PdfReader(buffer).pages]
+
+    def test_paralelo_mesmas_paginas_na_mesma_ordem(self):
+        sequencial = self._textos(utils.gerar_recibos_massa_pdf(self.pessoas))
+        with mock.patch.object(utils, 'MINIMO_RECIBOS_PARALELO', 1), mock.patch.object(utils, 'RECIBOS_POR_LOTE', 2):
+            paralelo = self._textos(utils.gerar_recibos_massa_pdf(self.pessoas, processos=2))
+        self.assertEqual(len(paralelo), 10)
+        self.assertEqual(paralelo, sequencial)
+
+    def test_paralelo_informa_progresso_por_lote(self):
+        progresso = []
+        with mock.patch.object(utils, 'MINIMO_RECIBOS_PARALELO', 1), mock.patch.object(utils, 'RECIBOS_POR_LOTE', 2):
+            utils.gerar_recibos_massa_pdf(self.pessoas, ao_processar=progresso.append, processos=2)
+        self.assertEqual(progresso, [2, 4, 5])
+
+    def test_acima_do_minimo_paralelo_igual_ao_sequencial(self):
+        beneficio = SimpleNamespace(nome='Auxílio Transporte')
+        pessoas = [
+            SimpleNamespace(nome_completo=f'Pessoa {i:03d}', cpf=f'{i:011d}', valor_beneficio=Decimal('150'),
+                            endereco='Rua A, 1', bairro='Centro', cidade='Pocinhos/PB', beneficio=beneficio)
+            for i in range(utils.MINIMO_RECIBOS_PARALELO + 10)
+        ]
+        with mock.patch.object(utils, '_gerar_recibos_paralelo', wraps=utils._gerar_recibos_paralelo) as paralelo:
+            paginas_paralelo = PdfReader(utils.gerar_recibos_massa_pdf(pessoas, processos=2)).pages
+        paralelo.assert_called_once()
+        paginas_sequencial = PdfReader(utils.gerar_recibos_massa_pdf(pessoas)).pages
+
+        self.assertEqual(len(paginas_paralelo), 2 * len(pessoas))
+        self.assertEqual(len(paginas_paralelo), len(paginas_sequencial))
+        for paralela, sequencial in zip(paginas_paralelo, paginas_sequencial):
+            self.assertEqual(paralela.get_contents().get_data(), sequencial.get_contents().get_data())
+
+    def test_uma_cpu_nao_usa_pool(self):
+        pessoas = self.pessoas * (utils.MINIMO_RECIBOS_PARALELO // len(self.pessoas) + 1)
+        with mock.patch.object(utils.os, 'cpu_count', return_value=1), \
+                mock.patch.object(utils, '_gerar_recibos_paralelo') as paralelo:
+            utils.gerar_recibos_massa_pdf(pessoas, processos=None)
+        paralelo.assert_not_called()
+
+    def test_lista_pequena_nao_usa_pool(self):
+        with mock.patch.object(utils, '_gerar_recibos_paralelo') as paralelo:
+            utils.gerar_recibos_massa_pdf(self.pessoas, processos=None)
+        paralelo.assert_not_called()
+
+
+class ReciboCabecalhoFixoTest(GeSocialTestBase):
+
+    def test_brasao_e_cabecalho_embutidos_uma_vez(self):
+        beneficio = self.criar_beneficio()
+        pessoas = [
+            self.criar_pessoa(beneficio, nome_completo=f'Pessoa {i}', cpf=cpf)
+            for i, cpf in enumerate(self.CPFS_VALIDOS[:3])
+        ]
+        leitor = PdfReader(utils.gerar_recibos_massa_pdf(pessoas))
+        self.assertEqual(len(leitor.pages), 6)
+
+        formularios = set()
+        for pagina in leitor.pages:
+            xobjects = pagina['/Resources']['/XObject']
+            formularios.update(obj.idnum for obj in xobjects.values())
+        # Todas as páginas apontam para o mesmo form XObject do cabeçalho
+        self.assertEqual(len(formularios), 1)
+
+    def test_texto_do_cabecalho_em_todas_as_paginas(self):
+        beneficio = self.criar_beneficio()
+        pessoa = self.criar_pessoa(beneficio, nome_completo='Maria')
+        leitor = PdfReader(utils.gerar_recibo_paginas_separadas(pessoa))
+        for pagina in leitor.pages:
+            texto = pagina.extract_text()
+            self.assertIn('PREFEITURA MUNICIPAL DE POCINHOS', texto)
+            self.assertIn('R E C I B O', texto)
+            self.assertIn('MARIA', texto)
+
+
+class DocumentosMassaTest(GeSocialTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp(prefix='gesocial_docs_')
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        beneficio = self.criar_beneficio()
+        self.pessoas = []
+        for i, (cpf, paginas) in enumerate(zip(self.CPFS_VALIDOS[:3], (1, 2, 6))):
+            pessoa = self.criar_pessoa(beneficio, nome_completo=f'Pessoa {i}', cpf=cpf)
+            conteudo = pdf_com_paginas(*(f'doc{i} pag{n}' for n in range(paginas)))
+            Documento.objects.create(pessoa=pessoa, arquivo=SimpleUploadedFile('doc.pdf', conteudo))
+            self.pessoas.append(pessoa)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    def test_duas_vias_ate_quatro_paginas_na_ordem(self):
+        leitor = PdfReader(utils.gerar_documentos_massa_pdf(self.pessoas))
+        textos = [pagina.extract_text().strip() for pagina in leitor.pages]
+        esperado = (
+            ['doc0 pag0'] * 2
+            + ['doc1 pag0', 'doc1 pag1'] * 2
+            + ['doc2 pag0', 'doc2 pag1', 'doc2 pag2', 'doc2 pag3'] * 2
+        )
+        self.assertEqual(textos, esperado)
+
+    def test_campo_paginas_desatualizado_nao_corta_o_documento(self):
+        documento = self.pessoas[2].documento
+        documento.paginas = 1
+        documento.save(update_fields=['paginas'])
+        leitor = PdfReader(utils.gerar_documentos_massa_pdf(self.pessoas[2:]))
+        textos = [pagina.extract_text().strip() for pagina in leitor.pages]
+        self.assertEqual(textos, ['doc2 pag0', 'doc2 pag1', 'doc2 pag2', 'doc2 pag3'] * 2)
+
+    def test_grava_direto_no_destino(self):
+        destino = os.path.join(self.media_root, 'saida.pdf')
+        progresso = []
+        self.assertEqual(utils.gerar_documentos_massa_pdf(self.pessoas, progresso.append, destino), destino)
+        self.assertEqual(progresso, [1, 2, 3])
+        self.assertEqual(len(PdfReader(destino).pages), 14)
+
+    def test_saida_valida_no_modo_estrito(self):
+        leitor = PdfReader(utils.gerar_documentos_massa_pdf(self.pessoas), strict=True)
+        self.assertEqual(len(leitor.pages), 14)
+        for pagina in leitor.pages:
+            pagina.extract_text()
+        # Toda entrada da tabela xref aponta para um objeto que o leitor estrito consegue ler
+        for idnum in range(1, leitor.trailer['/Size']):
+            self.assertIsNotNone(leitor.get_object(idnum))
+
+    def test_pdf_sem_root_vira_erro_legivel(self):
+        # No PyPDF2 3.0.1 um trailer sem /Root levanta KeyError, não PdfReadError
+        corpo = b'%PDF-1.4\n1 0 obj\n<< >>\nendobj\n'
+        sem_root = (
+            corpo + b'xref\n0 2\n0000000000 65535 f \n0000000009 00000 n \ntrailer\n<< /Size 2 >>\n'
+            + b'startxref\n' + str(len(corpo)).encode() + b'\n%%EOF\n'
+        )
+        with open(self.pessoas[1].documento.arquivo.path, 'wb') as f:
+            f.write(sem_root)
+        with self.assertRaisesMessage(Exception, 'Erro ao processar documento de Pessoa 1.'):
+            utils.gerar_documentos_massa_pdf(self.pessoas)
+
+    def test_pdf_corrompido_vira_erro_legivel(self):
+        with open(self.pessoas[0].documento.arquivo.path, 'wb') as f:
+            f.write(b'nao e um pdf')
+        with self.assertRaisesMessage(Exception, 'Pessoa 0. Arquivo pode estar corrompido'):
+            utils.gerar_documentos_massa_pdf(self.pessoas)
+
+
+class PdfBeneficiariosTest(GeSocialTestBase):
+
+    def _pessoas(self, quantidade):
+        beneficio = SimpleNamespace(nome='Auxílio Transporte')
+        return (
+            SimpleNamespace(
+                cpf='52998224725', nome_completo=f'Pessoa {i:03d}', beneficio=beneficio,
+                valor_beneficio=Decimal('1500.5'), status='ativo', bairro='Centro', created_at=datetime(2026, 1, 2),
+            )
+            for i in range(quantidade)
+        )
+
+    def _paginas(self, pessoas, total):
+        resp = utils.gerar_pdf_beneficiarios(pessoas, 'Todos', 'Ativo', total, Decimal('10'), total, 0, 0)
+        return [pagina.extract_text() for pagina in PdfReader(BytesIO(resp.content)).pages]
+
+    def test_linhas_paginadas_com_cabecalho_repetido(self):
+        paginas = self._paginas(self._pessoas(60), 60)
+        self.assertEqual(len(paginas), 3)
+        texto = '\n'.join(paginas)
+        for i in range(60):
+            self.assertIn(f'Pessoa {i:03d}', texto)
+        self.assertTrue(all('Nome Completo' in pagina for pagina in paginas))
+        self.assertIn('529.982.247-25', texto)
+        self.assertIn('1.500,50', texto)
+        self.assertIn('Total de pessoas:', paginas[-1])
+
+    def test_nome_longo_quebra_e_coluna_curta_trunca(self):
+        pessoa = next(self._pessoas(1))
+        pessoa.nome_completo = 'Maria ' * 12 + 'Final'
+        pessoa.status = 'Situação com texto muito longo'
+        texto = self._paginas([pessoa], 1)[0]
+        self.assertIn('Final', texto)
+        self.assertIn('…', texto)
+        self.assertNotIn('muito longo', texto)
@@ -3,6 +3,7 @@ Testes para todas as Views do GeSocial.
 Cobre: autenticação, permissões, CRUD, status transitions, geração de PDFs, filtros.
 """
 from decimal import Decimal
+from unittest import mock
 
 from django.test import TestCase, Client
 from django.urls import reverse
@@ -13,7 +14,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from beneficios.models import (
     Beneficio, Pessoa, Documento, Memorando, MemorandoPessoa,
     ConfiguracaoGeral, HistoricoStatus, LogAcao,
-    BackupConfig, BackupHistorico,
+    BackupConfig, BackupHistorico, TarefaGeracao,
 )
 from .base import GeSocialTestBase
 
@@ -101,6 +102,38 @@ class DashboardViewTest(GeSocialTestBase):
         self.assertEqual(resp.context['total_em_espera_geral'], 1)
         self.assertEqual(resp.context['total_desativados_geral'], 1)
 
+    def test_dashboard_distribuicao_valor(self):
+        self.login_as('admin')
+        b = self.criar_beneficio()
+        self.criar_pessoa(b, cpf='529.982.247-25', valor_beneficio=Decimal('100'), status='ativo')
+        self.criar_pessoa(b, cpf='276.178.580-71', valor_beneficio=Decimal('350'), status='ativo')
+        self.criar_pessoa(b, cpf='845.526.170-60', valor_beneficio=Decimal('120'), status='desligado')
+        resp = self.client.get('/')
+        dist = resp.context['distribuicao_valor']
+        self.assertEqual(dist['ate_100'], 1)
+        self.assertEqual(dist['de_101_150'], 0)
+        self.assertEqual(dist['acima_300'], 1)
+
+    def test_dashboard_segunda_carga_sem_sql_de_estatisticas(self):
+        self.login_as('admin')
+        b = self.criar_beneficio()
+        self.criar_pessoa(b, status='ativo')
+        self.client.get('/')
+        from beneficios.services import obter_estatisticas_dashboard
+        with self.assertNumQueries(0):
+            obter_estatisticas_dashboard()
+
+    def test_dashboard_cache_invalidado_ao_mudar_status(self):
+        self.login_as('admin')
+        b = self.criar_beneficio()
+        p = self.criar_pessoa(b, status='ativo')
+        resp = self.client.get('/')
+        self.assertEqual(resp.context['total_ativos_geral'], 1)
+        self.client.get(reverse('pessoa_desligar', args=[p.pk]))
+        resp = self.client.get('/')
+        self.assertEqual(resp.context['total_ativos_geral'], 0)
+        self.assertEqual(resp.context['total_desativados_geral'], 1)
+
 
 # ═══════════════════════════════════════════
 # PESSOA CRUD
@@ -261,16 +294,61 @@ class PessoaStatusViewsTest(GeSocialTestBase):
 
     def test_desligar_cria_log_acao(self):
         self.login_as('normal')
-        self.client.get(reverse('pessoa_desligar', args=[self.pessoa.pk]))
+        with self.captureOnCommitCallbacks(execute=True):  # auditoria gravada em lote após o commit
+            self.client.get(reverse('pessoa_desligar', args=[self.pessoa.pk]))
         self.assertTrue(LogAcao.objects.filter(tipo='status_desligar').exists())
 
     def test_ativar_cria_log_acao(self):
         self.pessoa.status = 'desligado'
         self.pessoa.save()
         self.login_as('normal')
-        self.client.get(reverse('pessoa_ativar', args=[self.pessoa.pk]))
+        with self.captureOnCommitCallbacks(execute=True):  # auditoria gravada em lote após o commit
+            self.client.get(reverse('pessoa_ativar', args=[self.pessoa.pk]))
         self.assertTrue(LogAcao.objects.filter(tipo='status_ativar').exists())
 
+    def _desligado_com_cpf_reativado(self):
+        """Desliga self.pessoa e cadastra outro registro ativo com o mesmo CPF"""
+        self.pessoa.status = 'desligado'
+        self.pessoa.save()
+        return self.criar_pessoa(self.beneficio, nome_completo='Maria Recadastrada', status='ativo')
+
+    def test_ativar_com_cpf_em_uso_mostra_erro(self):
+        self._desligado_com_cpf_reativado()
+        self.login_as('normal')
+        resp = self.client.get(reverse('pessoa_ativar', args=[self.pessoa.pk]), follow=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'CPF já cadastrado')
+        self.pessoa.refresh_from_db()
+        self.assertEqual(self.pessoa.status, 'desligado')
+        self.assertFalse(HistoricoStatus.objects.filter(pessoa=self.pessoa, status_novo='ativo').exists())
+
+    def test_espera_com_cpf_em_uso_mostra_erro(self):
+        self._desligado_com_cpf_reativado()
+        self.login_as('normal')
+        resp = self.client.get(reverse('pessoa_espera', args=[self.pessoa.pk]), follow=True)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'CPF já cadastrado')
+        self.pessoa.refresh_from_db()
+        self.assertEqual(self.pessoa.status, 'desligado')
+
+    def test_ativar_com_cpf_reativado_na_corrida_mostra_erro(self):
+        # A verificação passa, mas a constraint barra a gravação
+        self._desligado_com_cpf_reativado()
+        self.login_as('normal')
+        with mock.patch('beneficios.views._cpf_em_uso', return_value=False):
+            resp = self.client.get(reverse('pessoa_ativar', args=[self.pessoa.pk]), follow=True)
+        self.assertContains(resp, 'CPF já cadastrado')
+        self.pessoa.refresh_from_db()
+        self.assertEqual(self.pessoa.status, 'desligado')
+
+    def test_desligar_atualiza_cards_da_listagem(self):
+        self.login_as('normal')
+        self.client.get(reverse('pessoa_desligar', args=[self.pessoa.pk]))
+        resp = self.client.get(reverse('pessoas_por_beneficio', args=[self.beneficio.pk]))
+        self.assertEqual(resp.context['total_ativos'], 0)
+        self.assertEqual(resp.context['total_desativados'], 1)
+        self.assertEqual(resp.context['total_geral'], 1)
+
 
 # ═══════════════════════════════════════════
 # PESSOAS POR BENEFÍCIO (Listagem + Filtros)
@@ -301,6 +379,20 @@ class PessoasPorBeneficioViewTest(GeSocialTestBase):
         })
         self.assertEqual(resp.status_code, 200)
 
+    def test_filtro_cpf_completo(self):
+        self.login_as('normal')
+        resp = self.client.get(reverse('pessoas_por_beneficio', args=[self.beneficio.pk]), {
+            'cpf': '276.178.580-71', 'status': 'todos',
+        })
+        self.assertEqual([p.pk for p in resp.context['pessoas']], [self.p2.pk])
+
+    def test_filtro_cpf_parcial(self):
+        self.login_as('normal')
+        resp = self.client.get(reverse('pessoas_por_beneficio', args=[self.beneficio.pk]), {
+            'cpf': '247-25', 'status': 'todos',
+        })
+        self.assertEqual([p.pk for p in resp.context['pessoas']], [self.p1.pk])
+
     def test_context_stats(self):
         self.login_as('normal')
         resp = self.client.get(reverse('pessoas_por_beneficio', args=[self.beneficio.pk]))
@@ -585,8 +677,8 @@ class GeracaoMassaViewsTest(GeSocialTestBase):
             reverse('gerar_memorando_massa', args=[self.beneficio.pk]),
             {'status': 'ativo'}
         )
-        self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        tarefa = TarefaGeracao.objects.get(tipo='memorando_massa')
+        self.assertRedirects(resp, reverse('tarefa_status', args=[tarefa.pk]))
 
     def test_memorando_massa_status_errado_bloqueado(self):
         self.login_as('normal')
@@ -602,8 +694,9 @@ class GeracaoMassaViewsTest(GeSocialTestBase):
             reverse('gerar_recibos_massa', args=[self.beneficio.pk]),
             {'status': 'ativo'}
         )
-        self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        tarefa = TarefaGeracao.objects.get(tipo='recibos_massa')
+        self.assertRedirects(resp, reverse('tarefa_status', args=[tarefa.pk]))
+        self.assertEqual(tarefa.total, 2)
 
     def test_recibos_massa_status_errado(self):
         self.login_as('normal')
@@ -633,6 +726,56 @@ class RemessaBancoViewTest(GeSocialTestBase):
         self.assertEqual(resp.status_code, 200)
         self.assertIn('text/csv', resp['Content-Type'])
 
+    def _conteudo(self, resp):
+        return b''.join(resp.streaming_content)
+
+    def test_remessa_csv_linhas_e_log_com_total(self):
+        self.criar_pessoa(self.beneficio, nome_completo='Bruna', cpf='276.178.580-71', valor_beneficio=Decimal('99.90'))
+        self.login_as('normal')
+        resp = self.client.get(reverse('gerar_remessa_banco', args=[self.beneficio.pk]), {'status': 'ativo'})
+        self.assertFalse(LogAcao.objects.filter(tipo='remessa_banco').exists())  # só após o envio
+
+        linhas = self._conteudo(resp).decode('utf-8').splitlines()
+        self.assertEqual(linhas, [
+            '\ufeffCPF;NOME;VALOR;OBSERVACAO',
+            '27617858071;BRUNA;99.90;CEP 58150000',
+            '52998224725;MARIA DA SILVA;150.00;CEP 58150000',
+        ])
+        log = LogAcao.objects.get(tipo='remessa_banco')
+        self.assertTrue(log.descricao.endswith('2 pessoas - R$ 249.90'))
+
+    def test_remessa_interrompida_registra_parcial(self):
+        self.criar_pessoa(self.beneficio, nome_completo='Bruna', cpf='276.178.580-71', valor_beneficio=Decimal('99.90'))
+        self.login_as('normal')
+        with mock.patch('beneficios.remessa.LINHAS_POR_PEDACO', 1):
+            resp = self.client.get(reverse('gerar_remessa_banco', args=[self.beneficio.pk]), {'status': 'ativo'})
+            conteudo = iter(resp.streaming_content)
+            next(conteudo)  # cabeçalho
+            next(conteudo)  # primeira pessoa
+            resp.close()  # cliente desconectou
+
+        log = LogAcao.objects.get(tipo='remessa_banco')
+        self.assertTrue(log.descricao.endswith('1 pessoas - R$ 99.90 (interrompida)'))
+
+    def test_remessa_cnab_largura_fixa(self):
+        self.criar_pessoa(self.beneficio, nome_completo='João Conceição', cpf='276.178.580-71', valor_beneficio=Decimal('99.90'))
+        self.login_as('normal')
+        resp = self.client.get(
+            reverse('gerar_remessa_banco', args=[self.beneficio.pk]),
+            {'status': 'ativo', 'formato': 'cnab'},
+        )
+        self.assertIn('.txt', resp['Content-Disposition'])
+        linhas = self._conteudo(resp).decode('ascii').split('\r\n')[:-1]
+        self.assertEqual(len(linhas), 4)
+        self.assertTrue(all(len(linha) == 240 for linha in linhas))
+        self.assertEqual([linha[0] for linha in linhas], ['0', '1', '1', '9'])
+        detalhe = linhas[1]
+        self.assertEqual(detalhe[1:7], '000001')
+        self.assertEqual(detalhe[7:18], '27617858071')
+        self.assertEqual(detalhe[18:58].rstrip(), 'JOAO CONCEICAO')
+        self.assertEqual(detalhe[58:73], '000000000009990')
+        self.assertEqual(linhas[3][1:25], '000002' + '000000000000024990')
+
     def test_remessa_status_errado_bloqueado(self):
         self.login_as('normal')
         resp = self.client.get(
@@ -725,6 +868,18 @@ class AuditoriaViewTest(GeSocialTestBase):
         resp = self.client.get(reverse('auditoria'))
         self.assertEqual(resp.status_code, 302)
 
+    def test_proxima_pagina_por_cursor_mantem_filtros(self):
+        for i in range(35):
+            LogAcao.objects.create(usuario=self.admin_user, tipo='remessa_banco', descricao=f'Remessa {i}')
+        self.login_as('admin')
+        resp = self.client.get(reverse('auditoria'), {'tipo': 'geracao'})
+        self.assertEqual(len(resp.context['registros']), 30)
+        self.assertContains(resp, f'?antes={resp.context["mais_antigos"]}&tipo=geracao')
+
+        resp = self.client.get(reverse('auditoria'), {'tipo': 'geracao', 'antes': resp.context['mais_antigos']})
+        self.assertEqual([r.detalhes for r in resp.context['registros']], [f'Remessa {i}' for i in range(4, -1, -1)])
+        self.assertIsNone(resp.context['mais_antigos'])
+
 
 # ═══════════════════════════════════════════
 # BACKUP
@@ -782,3 +937,46 @@ class RelatoriosViewTest(GeSocialTestBase):
         self.login_as('normal')
         resp = self.client.get(reverse('relatorio_financeiro'))
         self.assertEqual(resp.status_code, 200)
+
+    def _planilha(self, resp):
+        import openpyxl
+        from io import BytesIO
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('attachment', resp['Content-Disposition'])
+        return openpyxl.load_workbook(BytesIO(b''.join(resp.streaming_content))).active
+
+    def test_excel_beneficiarios(self):
+        self.criar_pessoa(self.beneficio, nome_completo='Bruna', cpf='276.178.580-71',
+                          status='em_espera', valor_beneficio=Decimal('99.90'))
+        self.login_as('normal')
+        ws = self._planilha(self.client.get(reverse('gerar_relatorio_beneficiarios'), {'formato': 'xlsx'}))
+        linhas = list(ws.iter_rows(values_only=True))
+        self.assertEqual(linhas[3][:3], ('Nº', 'Nome Completo', 'CPF'))
+        self.assertEqual(linhas[4][:6], (1, 'Bruna', '276.178.580-71', self.beneficio.nome, 99.9, 'Em Espera'))
+        self.assertEqual(linhas[5][:2], (2, 'Maria da Silva'))
+        self.assertEqual(linhas[6][1], 'Total: 2 pessoas')
+        self.assertAlmostEqual(linhas[6][4], 249.9)
+        self.assertEqual(ws.cell(row=6, column=5).number_format, '#,##0.00')
+        self.assertEqual(ws.cell(row=6, column=2).fill.start_color.rgb, '00F8F9FA')
+
+    def test_excel_beneficiarios_sem_pessoas_redireciona(self):
+        self.login_as('normal')
+        resp = self.client.get(reverse('gerar_relatorio_beneficiarios'), {'formato': 'xlsx', 'status': 'desligado'})
+        self.assertRedirects(resp, reverse('relatorio_beneficiarios'))
+
+    def test_excel_financeiro(self):
+        self.login_as('normal')
+        ws = self._planilha(self.client.get(reverse('gerar_relatorio_financeiro'), {'formato': 'xlsx'}))
+        valores = [linha[0] for linha in ws.iter_rows(values_only=True)]
+        self.assertIn('DETALHAMENTO POR BENEFÍCIO', valores)
+        self.assertIn('DETALHAMENTO POR FAIXA DE VALOR', valores)
+
+    def test_pdf_financeiro(self):
+        self.login_as('normal')
+        resp = self.client.get(reverse('gerar_relatorio_financeiro'), {'status': 'ativo'})
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+
+    def test_financeiro_sem_pessoas_redireciona(self):
+        self.login_as('normal')
+        resp = self.client.get(reverse('gerar_relatorio_financeiro'), {'status': 'desligado'})
+        self.assertRedirects(resp, reverse('relatorio_financeiro'))
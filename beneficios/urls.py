@@ -47,6 +47,9 @@ urlpatterns = [
     path('beneficio/<int:beneficio_id>/recibos-massa/', views.gerar_recibos_massa, name='gerar_recibos_massa'),
     path('beneficio/<int:beneficio_id>/documentos-massa/', views.gerar_documentos_massa, name='gerar_documentos_massa'),
     path('beneficio/<int:beneficio_id>/remessa-banco/', views.gerar_remessa_banco, name='gerar_remessa_banco'),
+    path('tarefas/<int:pk>/', views.tarefa_status, name='tarefa_status'),
+    path('tarefas/<int:pk>/progresso/', views.tarefa_progresso, name='tarefa_progresso'),
+    path('tarefas/<int:pk>/arquivo/', views.tarefa_arquivo, name='tarefa_arquivo'),
 
     # Sobre
     path('sobre/', views.sobre, name='sobre'),
@@ -66,6 +69,7 @@ urlpatterns = [
 
     # Auditoria
     path('auditoria/', views.auditoria, name='auditoria'),
+    path('metrics/', views.metricas, name='metricas'),
 
     # Senha
     path('trocar-senha/', views.trocar_senha, name='trocar_senha'),
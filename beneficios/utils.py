@@ -1,5 +1,10 @@
 import os
+import time
+from contextlib import ExitStack
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
 from io import BytesIO
+from types import SimpleNamespace
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
@@ -8,83 +13,121 @@ from reportlab.platypus import Table, TableStyle, Paragraph
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Paragraph
 from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from datetime import datetime
 from num2words import num2words
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.errors import PdfReadError
+
+from .metricas import registrar_pdf
 
 def valor_por_extenso(valor):
     """Converte valor para extenso"""
     try:
-        # Separa reais e centavos
-        reais = int(valor)
-        centavos = int((valor - reais) * 100)
-        
-        extenso_reais = num2words(reais, lang='pt_BR')
-        
-        if centavos > 0:
-            extenso_centavos = num2words(centavos, lang='pt_BR')
-            if reais == 1:
-                return f"{extenso_reais} real e {extenso_centavos} centavos"
-            else:
-                return f"{extenso_reais} reais e {extenso_centavos} centavos"
-        else:
-            if reais == 1:
-                return f"{extenso_reais} real"
-            else:
-                return f"{extenso_reais} reais"
-    except:
+        centavos = int((Decimal(str(valor)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError, TypeError):
         return f"{valor:.2f} reais"
+    return _extenso_centavos(centavos)
+
+
+@lru_cache(maxsize=1024)
+def _extenso_centavos(total_centavos):
+    """Extenso a partir do valor inteiro em centavos (chave do cache; sem arredondamento de float)"""
+    prefixo = 'menos ' if total_centavos < 0 else ''
+    reais, centavos = divmod(abs(total_centavos), 100)
+    
+    extenso_reais = num2words(reais, lang='pt_BR')
+    unidade = 'real' if reais == 1 else 'reais'
+    
+    if centavos > 0:
+        extenso_centavos = num2words(centavos, lang='pt_BR')
+        return f"{prefixo}{extenso_reais} {unidade} e {extenso_centavos} centavos"
+    return f"{prefixo}{extenso_reais} {unidade}"
+
+
+def aquecer_valor_por_extenso():
+    """
+    Pré-calcula o extenso dos valores de benefício em uso (distintos entre os ativos).
+    Chamado na inicialização dos workers; retorna quantos valores foram carregados.
+    """
+    from .models import Pessoa
+    try:
+        valores = Pessoa.objects.filter(status='ativo').order_by().values_list('valor_beneficio', flat=True).distinct()
+        total = 0
+        for valor in valores[:_extenso_centavos.cache_info().maxsize]:
+            valor_por_extenso(valor)
+            total += 1
+        return total
+    except Exception:
+        # Sem banco disponível o cache apenas começa vazio
+        return 0
+
+CAMINHO_BRASAO = os.path.join(os.path.dirname(__file__), '..', 'static', 'images', 'brasao.jpg')
+FORM_CABECALHO_RECIBO = 'CabecalhoRecibo'
+
+MESES = [
+    "JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO",
+    "JULHO", "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"
+]
+
+# Estilo do texto do recibo (montado uma vez, não a cada página)
+ESTILO_RECIBO_JUSTIFICADO = ParagraphStyle(
+    'CustomJustify',
+    parent=getSampleStyleSheet()['Normal'],
+    fontName='Helvetica',
+    fontSize=12,
+    leading=18,
+    alignment=TA_JUSTIFY,
+    firstLineIndent=2 * cm
+)
+
+
+def _cabecalho_recibo(c, width, height):
+    """
+    Cabeçalho oficial fixo (brasão, textos e título) desenhado uma única vez por
+    documento como form XObject; as páginas seguintes só o referenciam.
+    Retorna a posição y do título "RECIBO".
+    """
+    y_brasao = height - 3.5 * cm
+    y_textos = y_brasao - 1.5 * cm
+    y_recibo = y_textos - 1.0 * cm - 2.5 * cm
+    
+    if not c.hasForm(FORM_CABECALHO_RECIBO):
+        c.beginForm(FORM_CABECALHO_RECIBO)
+        
+        # 1. Brasão (se a imagem não existir, apenas fica o espaço)
+        if os.path.exists(CAMINHO_BRASAO):
+            c.drawImage(CAMINHO_BRASAO, (width/2) - 1.0*cm, y_brasao, width=1.5*cm, height=1.5*cm, mask='auto')
+        
+        # 2. Textos do Cabeçalho
+        c.setFont("Helvetica-Bold", 12)
+        c.drawCentredString(width / 2, y_textos, "ESTADO DA PARAÍBA")
+        c.drawCentredString(width / 2, y_textos - 0.5 * cm, "PREFEITURA MUNICIPAL DE POCINHOS")
+        c.drawCentredString(width / 2, y_textos - 1.0 * cm, "SECRETARIA MUNICIPAL DE ASSISTÊNCIA DE SOCIAL")
+        
+        # --- Título "RECIBO" ---
+        c.setFont("Helvetica-Bold", 25)
+        c.drawCentredString(width / 2, y_recibo, "R E C I B O")
+        c.endForm()
+    
+    c.doForm(FORM_CABECALHO_RECIBO)
+    return y_recibo
+
 
 def desenhar_conteudo_recibo(c, pessoa, width, height, margin):
     """Função auxiliar para desenhar o conteúdo do recibo com cabeçalho oficial"""
     
-    # --- Cabeçalho Oficial ---
-    y_header = height - 3.5 * cm
-    
-    # 1. Brasão (Tenta carregar se existir)
-    # Altere o caminho abaixo para o local real da imagem no seu servidor
-    caminho_brasao = os.path.join(os.path.dirname(__file__), '..', 'static', 'images', 'brasao.jpg')
-    if os.path.exists(caminho_brasao):
-        c.drawImage(caminho_brasao, (width/2) - 1.0*cm, y_header, width=1.5*cm, height=1.5*cm, mask='auto')
-        y_header -= 1.5 * cm
-    else:
-        # Se não houver imagem, apenas pula o espaço
-        y_header -= 1.5 * cm
-        
-    # 2. Textos do Cabeçalho
-    c.setFont("Helvetica-Bold", 12)
-    c.drawCentredString(width / 2, y_header, "ESTADO DA PARAÍBA")
-    y_header -= 0.5 * cm
-    c.drawCentredString(width / 2, y_header, "PREFEITURA MUNICIPAL DE POCINHOS")
-    y_header -= 0.5 * cm
-    c.drawCentredString(width / 2, y_header, "SECRETARIA MUNICIPAL DE ASSISTÊNCIA DE SOCIAL")
-    
-    # --- Título "RECIBO" ---
-    y_recibo = y_header - 2.5 * cm
-    c.setFont("Helvetica-Bold", 25)
-    c.drawCentredString(width / 2, y_recibo, "R E C I B O")
+    # --- Cabeçalho Oficial e título (fixos) ---
+    y_recibo = _cabecalho_recibo(c, width, height)
     
     # --- Valor ---
     c.setFont("Helvetica-Bold", 11)
     valor_formatado = f"{pessoa.valor_beneficio:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     c.drawRightString(width - margin, y_recibo - 2 * cm, f"Valor R$ {valor_formatado}")
     
-    # --- Configuração do Texto Justificado com Parágrafo ---
-    styles = getSampleStyleSheet()
-    style_justificado = ParagraphStyle(
-        'CustomJustify',
-        parent=styles['Normal'],
-        fontName='Helvetica',
-        fontSize=12,
-        leading=18,
-        alignment=TA_JUSTIFY,
-        firstLineIndent=2 * cm
-    )
-    
-    meses = [
-        "JANEIRO", "FEVEREIRO", "MARÇO", "ABRIL", "MAIO", "JUNHO",
-        "JULHO", "AGOSTO", "SETEMBRO", "OUTUBRO", "NOVEMBRO", "DEZEMBRO"
-    ]
-    mes_nome = meses[datetime.now().month - 1]
+    # --- Texto Justificado com Parágrafo ---
+    mes_nome = MESES[datetime.now().month - 1]
     valor_ext = valor_por_extenso(pessoa.valor_beneficio).upper()
     
     nome_beneficio = pessoa.beneficio.nome if hasattr(pessoa, 'beneficio') else 'Auxílio'
@@ -96,14 +139,14 @@ def desenhar_conteudo_recibo(c, pessoa, width, height, margin):
         f"referente ao mês de <b>{mes_nome}</b> do corrente ano."
     )
     
-    p1 = Paragraph(texto_html, style_justificado)
+    p1 = Paragraph(texto_html, ESTILO_RECIBO_JUSTIFICADO)
     largura_util = width - (2 * margin)
     w, h = p1.wrap(largura_util, height)
     y_pos = y_recibo - 4 * cm - h
     p1.drawOn(c, margin, y_pos)
     
     texto_quitacao = "Pelo que emito o presente recibo em duas vias de igual teor, dando-lhe plena e total quitação."
-    p2 = Paragraph(texto_quitacao, style_justificado)
+    p2 = Paragraph(texto_quitacao, ESTILO_RECIBO_JUSTIFICADO)
     w2, h2 = p2.wrap(largura_util, height)
     y_pos = y_pos - h2 - 0.5 * cm
     p2.drawOn(c, margin, y_pos)
@@ -151,6 +194,7 @@ def desenhar_conteudo_recibo(c, pessoa, width, height, margin):
 
 def gerar_recibo_paginas_separadas(pessoa):
     """Gera um buffer contendo duas páginas, cada uma com um recibo"""
+    inicio = time.perf_counter()
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -165,17 +209,35 @@ def gerar_recibo_paginas_separadas(pessoa):
     c.showPage()
     
     c.save()
+    registrar_pdf('recibo', 2, inicio)
     buffer.seek(0)
     return buffer
  
-def gerar_recibos_massa_pdf(pessoas):
-    """Gera recibos em massa (2 vias para cada pessoa)"""
+RECIBOS_POR_LOTE = 100
+MINIMO_RECIBOS_PARALELO = 200
+
+
+def gerar_recibos_massa_pdf(pessoas, ao_processar=None, processos=1):
+    """
+    Gera recibos em massa (2 vias para cada pessoa).
+    ao_processar(n), se informado, é chamado após cada pessoa (progresso).
+    processos != 1 divide a lista em lotes renderizados em paralelo
+    (None = número de CPUs); listas pequenas continuam em um processo só.
+    """
+    inicio = time.perf_counter()
+    if processos is None:
+        processos = os.cpu_count() or 1  # com 1 CPU o pool só acrescenta custo (bench_recibos)
+    if processos != 1 and len(pessoas) >= MINIMO_RECIBOS_PARALELO:
+        buffer = _gerar_recibos_paralelo(pessoas, ao_processar, processos)
+        registrar_pdf('recibos_massa', 2 * len(pessoas), inicio)
+        return buffer
+    
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
     margin = 2.5 * cm
     
-    for pessoa in pessoas:
+    for idx, pessoa in enumerate(pessoas, 1):
         # Primeira via
         desenhar_conteudo_recibo(c, pessoa, width, height, margin)
         c.showPage()
@@ -183,69 +245,151 @@ def gerar_recibos_massa_pdf(pessoas):
         # Segunda via
         desenhar_conteudo_recibo(c, pessoa, width, height, margin)
         c.showPage()
+        
+        if ao_processar:
+            ao_processar(idx)
     
     c.save()
+    registrar_pdf('recibos_massa', 2 * len(pessoas), inicio)
     buffer.seek(0)
     return buffer
-    
-def gerar_documentos_massa_pdf(pessoas):
-    """Gera PDF consolidado com documentos (2 vias, máx 4 páginas cada) usando disco"""
-    import tempfile
+
+
+def _dados_recibo(pessoa):
+    """Cópia apenas com os campos do recibo, para enviar a outro processo"""
+    return SimpleNamespace(
+        nome_completo=pessoa.nome_completo,
+        cpf=pessoa.cpf,
+        valor_beneficio=pessoa.valor_beneficio,
+        endereco=pessoa.endereco,
+        bairro=pessoa.bairro,
+        cidade=pessoa.cidade,
+        beneficio=SimpleNamespace(nome=pessoa.beneficio.nome),
+    )
+
+
+def _renderizar_lote_recibos(lote):
+    """Executado no processo filho: retorna os bytes do PDF do lote"""
+    return gerar_recibos_massa_pdf(lote).getvalue()
+
+
+def _gerar_recibos_paralelo(pessoas, ao_processar, processos):
+    """
+    Renderiza lotes de RECIBOS_POR_LOTE pessoas em um pool de processos e junta
+    os PDFs parciais na ordem original. As páginas são copiadas como estão
+    (o conteúdo não é redesenhado nem descomprimido).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
     from PyPDF2 import PdfWriter, PdfReader
     
-    # Usa arquivo temporário em disco
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        tmp_path = tmp_file.name
+    dados = [_dados_recibo(p) for p in pessoas]
+    lotes = [dados[i:i + RECIBOS_POR_LOTE] for i in range(0, len(dados), RECIBOS_POR_LOTE)]
+    processos = min(processos or os.cpu_count() or 1, len(lotes))
     
     writer = PdfWriter()
-    arquivos_abertos = []
+    processados = 0
+    # spawn: os filhos não herdam a conexão com o banco do processo pai
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+        # map devolve os resultados na ordem dos lotes
+        for lote, pdf_lote in zip(lotes, executor.map(_renderizar_lote_recibos, lotes)):
+            for pagina in PdfReader(BytesIO(pdf_lote)).pages:
+                writer.add_page(pagina)
+            processados += len(lote)
+            if ao_processar:
+                ao_processar(processados)
     
+    buffer = BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+PAGINAS_DOCUMENTO = 4  # páginas de cada documento que entram nas 2 vias
+
+
+def normalizar_documento_pdf(conteudo):
+    """
+    Normaliza o PDF enviado: mantém só as PAGINAS_DOCUMENTO primeiras páginas e
+    recomprime os fluxos de conteúdo. Retorna (bytes, páginas); se nada foi
+    cortado e a versão reescrita não ficou menor, ou se ela não relê com as
+    mesmas páginas, devolve o original.
+    Levanta exceção se o PDF não puder ser lido.
+    """
+    reader = PdfReader(BytesIO(conteudo))
+    total_paginas = len(reader.pages)
+    paginas = min(total_paginas, PAGINAS_DOCUMENTO)
+
+    writer = PdfWriter()
+    for i in range(paginas):
+        writer.add_page(reader.pages[i]).compress_content_streams()
+    saida = BytesIO()
+    writer.write(saida)
+
+    if total_paginas <= PAGINAS_DOCUMENTO and saida.tell() >= len(conteudo):
+        return conteudo, paginas
     try:
-        for pessoa in pessoas:
-            arquivo_path = pessoa.documento.arquivo.path
-            
+        relido = len(PdfReader(BytesIO(saida.getvalue())).pages)
+    except PdfReadError:
+        relido = None
+    if relido != paginas:
+        return conteudo, paginas
+    return saida.getvalue(), paginas
+
+
+def gerar_documentos_massa_pdf(pessoas, ao_processar=None, destino=None):
+    """
+    Gera PDF consolidado com documentos (2 vias, máx PAGINAS_DOCUMENTO páginas cada).
+    A 2ª via repete as páginas do mesmo reader: o PdfWriter grava o conteúdo uma vez só.
+    destino: caminho ou arquivo binário; sem destino retorna um BytesIO.
+    ao_processar(n), se informado, é chamado após cada pessoa (progresso).
+    """
+    if destino is None:
+        buffer = BytesIO()
+        gerar_documentos_massa_pdf(pessoas, ao_processar, buffer)
+        buffer.seek(0)
+        return buffer
+
+    if isinstance(destino, (str, os.PathLike)):
+        with open(destino, 'wb') as f:
+            gerar_documentos_massa_pdf(pessoas, ao_processar, f)
+        return destino
+
+    inicio = time.perf_counter()
+    paginas = 0
+    writer = PdfWriter()
+
+    # Os arquivos ficam abertos até o write(): o PdfWriter lê os objetos das páginas nessa hora
+    with ExitStack() as arquivos:
+        for idx, pessoa in enumerate(pessoas, 1):
+            documento = pessoa.documento
             try:
-                pdf_file = open(arquivo_path, 'rb')
-                arquivos_abertos.append(pdf_file)
-                
-                reader = PdfReader(pdf_file)
-                total_paginas = min(len(reader.pages), 4)
-                
-                # 1ª via
-                for i in range(total_paginas):
-                    writer.add_page(reader.pages[i])
-                
-                # 2ª via
-                for i in range(total_paginas):
-                    writer.add_page(reader.pages[i])
-                    
+                reader = PdfReader(arquivos.enter_context(open(documento.arquivo.path, 'rb')))
+                # Conta pelo arquivo: o campo paginas pode estar desatualizado
+                total_paginas = min(len(reader.pages), PAGINAS_DOCUMENTO)
+
+                # 1ª e 2ª via
+                for _ in range(2):
+                    for i in range(total_paginas):
+                        writer.add_page(reader.pages[i])
+                paginas += 2 * total_paginas
+            except FileNotFoundError:
+                raise Exception(f"Documento de {pessoa.nome_completo} não encontrado no servidor.")
             except Exception:
+                # O PyPDF2 também falha com KeyError/ValueError em PDFs malformados: a mensagem nomeia a pessoa
                 raise Exception(f"Erro ao processar documento de {pessoa.nome_completo}. Arquivo pode estar corrompido.")
-        
-        # Escreve no arquivo temporário
-        with open(tmp_path, 'wb') as output_file:
-            writer.write(output_file)
-        
-        # Lê o arquivo final para retornar
-        with open(tmp_path, 'rb') as final_file:
-            buffer = BytesIO(final_file.read())
-        
-        return buffer
-        
-    finally:
-        # Fecha todos os arquivos abertos
-        for f in arquivos_abertos:
-            try:
-                f.close()
-            except:
-                pass
-        
-        # Remove arquivo temporário
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+
+            if ao_processar:
+                ao_processar(idx)
+
+        writer.write(destino)
+    registrar_pdf('documentos_massa', paginas, inicio)
+    return destino
 
 def gerar_memorando_segunda_via_pdf(memorando):
     """Gera PDF do memorando usando dados do snapshot (segunda via idêntica)"""
+    inicio = time.perf_counter()
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -430,61 +574,195 @@ def gerar_memorando_segunda_via_pdf(memorando):
     desenhar_fechamento_assinatura(y_atual - 1.5 * cm)
     
     c.save()
+    registrar_pdf('memorando', c.getPageNumber() - 1, inicio)
     buffer.seek(0)
     return buffer
 
+class _TabelaCanvas:
+    """
+    Tabela desenhada direto no canvas, linha a linha, para relatórios grandes
+    (no lugar de Table + Paragraph do platypus, que monta e mede tudo antes).
+    Colunas: (título, largura, alinhamento, quebra); com quebra o texto vai
+    para as linhas seguintes da célula, sem quebra é truncado com reticências.
+    O cabeçalho é repetido no topo de cada página.
+    """
+    FONTE = 'Helvetica'
+    TAMANHO = 7
+    ENTRELINHA = 9  # células com quebra
+    ENTRELINHA_SIMPLES = 12  # células sem quebra (leading padrão do TableStyle)
+    FONTE_CABECALHO = 'Helvetica-Bold'
+    TAMANHO_CABECALHO = 8
+    PADDING_H = 6
+    PADDING_V = 3
+
+    COR_CABECALHO = colors.HexColor('#4a7cff')
+    COR_GRADE = colors.HexColor('#dee2e6')
+    COR_ZEBRA = colors.HexColor('#f8f9fa')
+
+    def __init__(self, c, colunas, x, y, topo_pagina, base_pagina):
+        self.c = c
+        self.colunas = colunas
+        # Posições das colunas calculadas uma vez
+        self.bordas = [x]
+        for _, largura, _, _ in colunas:
+            self.bordas.append(self.bordas[-1] + largura)
+        self.topo_pagina = topo_pagina
+        self.base_pagina = base_pagina
+        self.y = y
+        self.linhas = 0
+        self._cabecalho()
+
+    def _ajustar(self, texto, largura, quebra):
+        disponivel = largura - 2 * self.PADDING_H
+        if stringWidth(texto, self.FONTE, self.TAMANHO) <= disponivel:
+            return [texto]
+        if quebra:
+            return simpleSplit(texto, self.FONTE, self.TAMANHO, disponivel)
+        while texto and stringWidth(texto + '…', self.FONTE, self.TAMANHO) > disponivel:
+            texto = texto[:-1]
+        return [texto + '…']
+
+    def _texto(self, texto, coluna, baseline):
+        _, largura, alinhamento, _ = self.colunas[coluna]
+        if alinhamento == 'CENTER':
+            self.c.drawCentredString(self.bordas[coluna] + largura / 2, baseline, texto)
+        elif alinhamento == 'RIGHT':
+            self.c.drawRightString(self.bordas[coluna + 1] - self.PADDING_H, baseline, texto)
+        else:
+            self.c.drawString(self.bordas[coluna] + self.PADDING_H, baseline, texto)
+
+    def _cabecalho(self):
+        c = self.c
+        self.topo_bloco = self.y
+        altura = self.ENTRELINHA_SIMPLES + 2 * self.PADDING_V
+        c.setFillColor(self.COR_CABECALHO)
+        c.rect(self.bordas[0], self.y - altura, self.bordas[-1] - self.bordas[0], altura, stroke=0, fill=1)
+        c.setFillColor(colors.white)
+        c.setFont(self.FONTE_CABECALHO, self.TAMANHO_CABECALHO)
+        baseline = self.y - (altura + self.TAMANHO_CABECALHO) / 2 + 1.5
+        for coluna, (titulo, _, _, _) in enumerate(self.colunas):
+            self._texto(titulo, coluna, baseline)
+        self.y -= altura
+        self._linha_grade()
+        c.setFont(self.FONTE, self.TAMANHO)
+        c.setFillColor(colors.black)
+
+    def _linha_grade(self):
+        self.c.setStrokeColor(self.COR_GRADE)
+        self.c.setLineWidth(0.5)
+        self.c.line(self.bordas[0], self.y, self.bordas[-1], self.y)
+
+    def _fechar_bloco(self):
+        """Linha superior e verticais do trecho da tabela desenhado nesta página"""
+        c = self.c
+        c.setStrokeColor(self.COR_GRADE)
+        c.setLineWidth(0.5)
+        c.line(self.bordas[0], self.topo_bloco, self.bordas[-1], self.topo_bloco)
+        for x in self.bordas:
+            c.line(x, self.topo_bloco, x, self.y)
+
+    def adicionar(self, valores):
+        celulas = [
+            self._ajustar(str(valor), largura, quebra)
+            for valor, (_, largura, _, quebra) in zip(valores, self.colunas)
+        ]
+        blocos = [
+            len(celula) * self.ENTRELINHA if quebra else self.ENTRELINHA_SIMPLES
+            for celula, (_, _, _, quebra) in zip(celulas, self.colunas)
+        ]
+        altura = max(blocos) + 2 * self.PADDING_V
+
+        if self.y - altura < self.base_pagina:
+            self._fechar_bloco()
+            self.c.showPage()
+            self.y = self.topo_pagina
+            self._cabecalho()
+
+        c = self.c
+        self.linhas += 1
+        if self.linhas % 2 == 0:
+            c.setFillColor(self.COR_ZEBRA)
+            c.rect(self.bordas[0], self.y - altura, self.bordas[-1] - self.bordas[0], altura, stroke=0, fill=1)
+            c.setFillColor(colors.black)
+
+        for coluna, (celula, bloco) in enumerate(zip(celulas, blocos)):
+            # Centraliza verticalmente o bloco de texto da célula
+            topo = self.y - (altura - bloco) / 2
+            for i, texto in enumerate(celula):
+                self._texto(texto, coluna, topo - i * self.ENTRELINHA - self.TAMANHO)
+
+        self.y -= altura
+        self._linha_grade()
+
+    def finalizar(self):
+        """Fecha a grade da última página; retorna a posição y logo abaixo da tabela"""
+        self._fechar_bloco()
+        return self.y
+
+
 def gerar_pdf_beneficiarios(pessoas, beneficio_nome, status_label, 
                              total_pessoas, total_valor, total_ativos, total_espera, total_desligados):
-    """Gera PDF do relatório de beneficiários"""
+    """
+    Gera PDF do relatório de beneficiários.
+    pessoas pode ser um iterator do queryset: as linhas são desenhadas à medida que chegam.
+    """
+    inicio = time.perf_counter()
     from io import BytesIO
     from datetime import datetime
     from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
     from reportlab.lib.units import mm, cm
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER
     from django.http import HttpResponse
     
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), 
-                           leftMargin=15*mm, rightMargin=15*mm, 
-                           topMargin=15*mm, bottomMargin=15*mm)
-
-    doc.title = 'Relatório de Beneficiários'
-    styles = getSampleStyleSheet()
-    elements = []
+    largura, altura = landscape(A4)
+    c = canvas.Canvas(buffer, pagesize=(largura, altura))
+    c.setTitle('Relatório de Beneficiários')
+    
+    # Área útil: margens de 15mm + 6pt de respiro (mesma área do SimpleDocTemplate anterior)
+    margem = 15 * mm + 6
+    topo = altura - margem
+    centro = largura / 2
+    y = topo
     
     # Brasão
-    caminho_brasao = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'images', 'brasao.jpg')
-    if os.path.exists(caminho_brasao):
-        img = Image(caminho_brasao, width=1.5*cm, height=1.5*cm)
-        img.hAlign = 'CENTER'
-        elements.append(img)
-        elements.append(Spacer(1, 2*mm))
+    if os.path.exists(CAMINHO_BRASAO):
+        c.drawImage(CAMINHO_BRASAO, centro - 0.75 * cm, y - 1.5 * cm, width=1.5 * cm, height=1.5 * cm, mask='auto')
+        y -= 1.5 * cm + 2 * mm
     
     # Cabeçalho institucional
-    centro_style = ParagraphStyle('Centro', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER, leading=14, fontName='Helvetica-Bold')
-    elements.append(Paragraph('ESTADO DA PARAÍBA', centro_style))
-    elements.append(Paragraph('PREFEITURA MUNICIPAL DE POCINHOS', centro_style))
-    elements.append(Paragraph('SECRETARIA MUNICIPAL DE ASSISTÊNCIA SOCIAL', centro_style))
-    elements.append(Spacer(1, 5*mm))
+    c.setFont('Helvetica-Bold', 10)
+    for texto in ('ESTADO DA PARAÍBA', 'PREFEITURA MUNICIPAL DE POCINHOS', 'SECRETARIA MUNICIPAL DE ASSISTÊNCIA SOCIAL'):
+        c.drawCentredString(centro, y - 10, texto)
+        y -= 14
+    y -= 5 * mm
     
     # Título do relatório
-    titulo_style = ParagraphStyle('Titulo', parent=styles['Normal'], fontSize=12, alignment=TA_CENTER, fontName='Helvetica-Bold', spaceAfter=3)
-    subtitulo_style = ParagraphStyle('Subtitulo', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=colors.grey, spaceAfter=8)
-    
-    elements.append(Paragraph('RELATÓRIO DE BENEFICIÁRIOS', titulo_style))
-    elements.append(Paragraph(
+    c.setFont('Helvetica-Bold', 12)
+    c.drawCentredString(centro, y - 12, 'RELATÓRIO DE BENEFICIÁRIOS')
+    y -= 14.4 + 3
+    c.setFont('Helvetica', 9)
+    c.setFillColor(colors.grey)
+    c.drawCentredString(
+        centro, y - 9,
         f'Benefício: {beneficio_nome} | Status: {status_label} | '
         f'Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M")}',
-        subtitulo_style
-    ))
-    elements.append(Spacer(1, 3*mm))
+    )
+    c.setFillColor(colors.black)
+    y -= 10.8 + 8 + 3 * mm
     
     # Tabela de dados
-    header = ['Nº', 'Nome Completo', 'CPF', 'Benefício', 'Valor (R$)', 'Status', 'Bairro', 'Cadastro']
-    data = [header]
+    colunas = [
+        ('Nº', 25, 'CENTER', False),
+        ('Nome Completo', 170, 'LEFT', True),
+        ('CPF', 75, 'LEFT', False),
+        ('Benefício', 95, 'LEFT', True),
+        ('Valor (R$)', 55, 'RIGHT', False),
+        ('Status', 55, 'CENTER', False),
+        ('Bairro', 80, 'LEFT', True),
+        ('Cadastro', 55, 'LEFT', False),
+    ]
+    largura_tabela = sum(coluna[1] for coluna in colunas)
+    tabela = _TabelaCanvas(c, colunas, centro - largura_tabela / 2, y, topo, margem)
     status_map = {'ativo': 'Ativo', 'em_espera': 'Em Espera', 'desligado': 'Desligado'}
     
     for idx, p in enumerate(pessoas, 1):
@@ -496,49 +774,44 @@ def gerar_pdf_beneficiarios(pessoas, beneficio_nome, status_label,
         
         valor_fmt = f"{p.valor_beneficio:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
         
-        data.append([
-            str(idx),
-            Paragraph(p.nome_completo, ParagraphStyle('Cell', fontSize=7, leading=9)),
+        tabela.adicionar([
+            idx,
+            p.nome_completo,
             cpf_display,
-            Paragraph(p.beneficio.nome, ParagraphStyle('Cell', fontSize=7, leading=9)),
+            p.beneficio.nome,
             valor_fmt,
             status_map.get(p.status, p.status),
-            Paragraph(p.bairro, ParagraphStyle('Cell', fontSize=7, leading=9)),
+            p.bairro,
             p.created_at.strftime('%d/%m/%Y'),
         ])
     
-    col_widths = [25, 170, 75, 95, 55, 55, 80, 55]
-    
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4a7cff')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 8),
-        ('FONTSIZE', (0, 1), (-1, -1), 7),
-        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-        ('ALIGN', (4, 0), (4, -1), 'RIGHT'),
-        ('ALIGN', (5, 0), (5, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-    ]))
-    
-    elements.append(table)
-    elements.append(Spacer(1, 8*mm))
+    y = tabela.finalizar() - 8 * mm
     
     # Totalizadores fora da tabela
-    valor_total_fmt = f"{total_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    resumo_style = ParagraphStyle('Resumo', parent=styles['Normal'], fontSize=9, leading=14)
+    if y - 2 * 14 - 3 * mm < margem:
+        c.showPage()
+        y = topo
     
-    elements.append(Paragraph(f'<b>Total de pessoas:</b> {total_pessoas}', resumo_style))
-    elements.append(Paragraph(f'<b>Valor total mensal:</b> R$ {valor_total_fmt}', resumo_style))
-    elements.append(Spacer(1, 3*mm))
-    elements.append(Paragraph(f'<b>Ativos:</b> {total_ativos} &nbsp;&nbsp; | &nbsp;&nbsp; <b>Em Espera:</b> {total_espera} &nbsp;&nbsp; | &nbsp;&nbsp; <b>Desligados:</b> {total_desligados}', resumo_style))
+    valor_total_fmt = f"{total_valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    x = margem
+    
+    def resumo(*partes):
+        """Linha do resumo: partes alternando rótulo (negrito) e valor"""
+        cursor = x
+        for i, parte in enumerate(partes):
+            fonte = 'Helvetica-Bold' if i % 2 == 0 else 'Helvetica'
+            c.setFont(fonte, 9)
+            c.drawString(cursor, y - 9, parte)
+            cursor += stringWidth(parte, fonte, 9)
+    
+    resumo('Total de pessoas:', f' {total_pessoas}')
+    y -= 14
+    resumo('Valor total mensal:', f' R$ {valor_total_fmt}')
+    y -= 14 + 3 * mm
+    resumo('Ativos:', f' {total_ativos}   |   ', 'Em Espera:', f' {total_espera}   |   ', 'Desligados:', f' {total_desligados}')
     
-    doc.build(elements)
+    c.save()
+    registrar_pdf('relatorio_beneficiarios', c.getPageNumber() - 1, inicio)
     
     buffer.seek(0)
     response = HttpResponse(buffer, content_type='application/pdf')
@@ -546,108 +819,143 @@ def gerar_pdf_beneficiarios(pessoas, beneficio_nome, status_label,
     return response
 
 
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _workbook_relatorio(titulo_aba, larguras):
+    """
+    Workbook write_only (linhas vão para o disco à medida que são adicionadas)
+    com os estilos nomeados dos relatórios registrados uma única vez.
+    """
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(titulo_aba)
+
+    lado = Side(style='thin', color='DEE2E6')
+    border = Border(left=lado, right=lado, top=lado, bottom=lado)
+    zebra = PatternFill(start_color='F8F9FA', end_color='F8F9FA', fill_type='solid')
+    total_fill = PatternFill(start_color='E9ECEF', end_color='E9ECEF', fill_type='solid')
+    total_font = Font(bold=True, size=10)
+
+    estilos = [
+        NamedStyle('rel_titulo', font=Font(bold=True, size=14)),
+        NamedStyle('rel_subtitulo', font=Font(size=9, color='808080')),
+        NamedStyle('rel_secao', font=Font(bold=True, size=11)),
+        NamedStyle(
+            'rel_cabecalho', border=border,
+            font=Font(bold=True, color='FFFFFF', size=10),
+            fill=PatternFill(start_color='4A7CFF', end_color='4A7CFF', fill_type='solid'),
+            alignment=Alignment(horizontal='center', vertical='center'),
+        ),
+        NamedStyle('rel_rotulo', font=Font(bold=True), border=border),
+        NamedStyle('rel_celula', border=border),
+        NamedStyle('rel_celula_zebra', border=border, fill=zebra),
+        NamedStyle('rel_valor', border=border, number_format='#,##0.00'),
+        NamedStyle('rel_valor_zebra', border=border, fill=zebra, number_format='#,##0.00'),
+        NamedStyle('rel_moeda', border=border, number_format='R$ #,##0.00'),
+        NamedStyle('rel_total', font=total_font, fill=total_fill, border=border),
+        NamedStyle('rel_total_valor', font=total_font, fill=total_fill, border=border, number_format='#,##0.00'),
+    ]
+    for estilo in estilos:
+        wb.add_named_style(estilo)
+
+    # Larguras precisam ser definidas antes da primeira linha no modo write_only
+    for letra, largura in larguras.items():
+        ws.column_dimensions[letra].width = largura
+    return wb, ws
+
+
+def _linha_excel(ws, *celulas):
+    """Linha de células (valor, estilo nomeado); estilo None = célula sem formatação"""
+    from openpyxl.cell import WriteOnlyCell
+
+    linha = []
+    for valor, estilo in celulas:
+        cell = WriteOnlyCell(ws, value=valor)
+        if estilo:
+            cell.style = estilo
+        linha.append(cell)
+    return linha
+
+
+def _resposta_excel(wb, nome_arquivo):
+    """Grava o workbook em arquivo temporário e devolve em pedaços (FileResponse), sem cópia em memória"""
+    import tempfile
+    from django.http import FileResponse
+
+    arquivo = tempfile.TemporaryFile(suffix='.xlsx')
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(arquivo, as_attachment=True, filename=nome_arquivo, content_type=CONTENT_TYPE_XLSX)
+
+
 def gerar_excel_beneficiarios(pessoas, beneficio_nome, status_label,
                                total_pessoas, total_valor, total_ativos, total_espera, total_desligados):
-    """Gera Excel do relatório de beneficiários"""
-    from io import BytesIO
+    """
+    Gera Excel do relatório de beneficiários.
+    pessoas pode ser um iterator do queryset: cada linha é gravada assim que lida.
+    """
     from datetime import datetime
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from django.http import HttpResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Beneficiários'
-    
-    # Estilos
-    header_font = Font(bold=True, color='FFFFFF', size=10)
-    header_fill = PatternFill(start_color='4A7CFF', end_color='4A7CFF', fill_type='solid')
-    header_align = Alignment(horizontal='center', vertical='center')
-    border = Border(
-        left=Side(style='thin', color='DEE2E6'),
-        right=Side(style='thin', color='DEE2E6'),
-        top=Side(style='thin', color='DEE2E6'),
-        bottom=Side(style='thin', color='DEE2E6'),
-    )
-    
+
+    wb, ws = _workbook_relatorio('Beneficiários', {
+        'A': 6, 'B': 35, 'C': 16, 'D': 20, 'E': 12, 'F': 12, 'G': 18, 'H': 12,
+    })
+
     # Título
-    ws.merge_cells('A1:H1')
-    ws['A1'] = 'Relatório de Beneficiários'
-    ws['A1'].font = Font(bold=True, size=14)
-    
-    ws.merge_cells('A2:H2')
-    ws['A2'] = f'Benefício: {beneficio_nome} | Status: {status_label} | Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-    ws['A2'].font = Font(size=9, color='808080')
-    
+    ws.append(_linha_excel(ws, ('Relatório de Beneficiários', 'rel_titulo')))
+    ws.append(_linha_excel(ws, (
+        f'Benefício: {beneficio_nome} | Status: {status_label} | Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M")}',
+        'rel_subtitulo',
+    )))
+    ws.append([])
+
     # Cabeçalho
     headers = ['Nº', 'Nome Completo', 'CPF', 'Benefício', 'Valor (R$)', 'Status', 'Bairro', 'Cadastro']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = border
-    
+    ws.append(_linha_excel(ws, *((h, 'rel_cabecalho') for h in headers)))
+
     # Dados
     status_map = {'ativo': 'Ativo', 'em_espera': 'Em Espera', 'desligado': 'Desligado'}
-    
+
     for idx, p in enumerate(pessoas, 1):
-        row = idx + 4
         cpf_numeros = ''.join(filter(str.isdigit, p.cpf))
         if len(cpf_numeros) == 11:
             cpf_display = f'{cpf_numeros[:3]}.{cpf_numeros[3:6]}.{cpf_numeros[6:9]}-{cpf_numeros[9:]}'
         else:
             cpf_display = p.cpf
-        
-        ws.cell(row=row, column=1, value=idx).border = border
-        ws.cell(row=row, column=2, value=p.nome_completo).border = border
-        ws.cell(row=row, column=3, value=cpf_display).border = border
-        ws.cell(row=row, column=4, value=p.beneficio.nome).border = border
-        cell_valor = ws.cell(row=row, column=5, value=float(p.valor_beneficio))
-        cell_valor.number_format = '#,##0.00'
-        cell_valor.border = border
-        ws.cell(row=row, column=6, value=status_map.get(p.status, p.status)).border = border
-        ws.cell(row=row, column=7, value=p.bairro).border = border
-        ws.cell(row=row, column=8, value=p.created_at.strftime('%d/%m/%Y')).border = border
-        
-        if idx % 2 == 0:
-            for col in range(1, 9):
-                ws.cell(row=row, column=col).fill = PatternFill(start_color='F8F9FA', end_color='F8F9FA', fill_type='solid')
-    
+
+        celula, valor = ('rel_celula_zebra', 'rel_valor_zebra') if idx % 2 == 0 else ('rel_celula', 'rel_valor')
+        ws.append(_linha_excel(
+            ws,
+            (idx, celula),
+            (p.nome_completo, celula),
+            (cpf_display, celula),
+            (p.beneficio.nome, celula),
+            (float(p.valor_beneficio), valor),
+            (status_map.get(p.status, p.status), celula),
+            (p.bairro, celula),
+            (p.created_at.strftime('%d/%m/%Y'), celula),
+        ))
+
     # Totalizadores
-    total_row = len(pessoas) + 5
-    total_fill = PatternFill(start_color='E9ECEF', end_color='E9ECEF', fill_type='solid')
-    total_font = Font(bold=True, size=10)
-    
-    ws.cell(row=total_row, column=2, value=f'Total: {total_pessoas} pessoas').font = total_font
-    ws.cell(row=total_row, column=5, value=float(total_valor)).font = total_font
-    ws.cell(row=total_row, column=5).number_format = '#,##0.00'
-    ws.cell(row=total_row, column=6, value=f'Ativos: {total_ativos} | Em Espera: {total_espera} | Desligados: {total_desligados}').font = total_font
-    
-    for col in range(1, 9):
-        ws.cell(row=total_row, column=col).fill = total_fill
-        ws.cell(row=total_row, column=col).border = border
-    
-    # Larguras
-    ws.column_dimensions['A'].width = 6
-    ws.column_dimensions['B'].width = 35
-    ws.column_dimensions['C'].width = 16
-    ws.column_dimensions['D'].width = 20
-    ws.column_dimensions['E'].width = 12
-    ws.column_dimensions['F'].width = 12
-    ws.column_dimensions['G'].width = 18
-    ws.column_dimensions['H'].width = 12
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    response = HttpResponse(buffer, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_beneficiarios.xlsx"'
-    return response
+    ws.append(_linha_excel(
+        ws,
+        (None, 'rel_total'),
+        (f'Total: {total_pessoas} pessoas', 'rel_total'),
+        (None, 'rel_total'),
+        (None, 'rel_total'),
+        (float(total_valor), 'rel_total_valor'),
+        (f'Ativos: {total_ativos} | Em Espera: {total_espera} | Desligados: {total_desligados}', 'rel_total'),
+        (None, 'rel_total'),
+        (None, 'rel_total'),
+    ))
+
+    return _resposta_excel(wb, 'relatorio_beneficiarios.xlsx')
 
 def gerar_pdf_financeiro(dados):
     """Gera PDF do relatório financeiro"""
+    inicio = time.perf_counter()
     from io import BytesIO
     from datetime import datetime
     from reportlab.lib.pagesizes import A4, landscape
@@ -818,6 +1126,7 @@ def gerar_pdf_financeiro(dados):
     elements.append(faixa_table)
     
     doc.build(elements)
+    registrar_pdf('relatorio_financeiro', doc.page, inicio)
     
     buffer.seek(0)
     response = HttpResponse(buffer, content_type='application/pdf')
@@ -827,171 +1136,103 @@ def gerar_pdf_financeiro(dados):
 
 def gerar_excel_financeiro(dados):
     """Gera Excel do relatório financeiro"""
-    from io import BytesIO
     from datetime import datetime
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    from django.http import HttpResponse
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Financeiro'
-    
-    header_font = Font(bold=True, color='FFFFFF', size=10)
-    header_fill = PatternFill(start_color='4A7CFF', end_color='4A7CFF', fill_type='solid')
-    header_align = Alignment(horizontal='center', vertical='center')
-    border = Border(
-        left=Side(style='thin', color='DEE2E6'),
-        right=Side(style='thin', color='DEE2E6'),
-        top=Side(style='thin', color='DEE2E6'),
-        bottom=Side(style='thin', color='DEE2E6'),
-    )
-    total_fill = PatternFill(start_color='E9ECEF', end_color='E9ECEF', fill_type='solid')
-    total_font = Font(bold=True, size=10)
-    secao_font = Font(bold=True, size=11)
-    
+
+    wb, ws = _workbook_relatorio('Financeiro', {
+        'A': 25, 'B': 25, 'C': 12, 'D': 12, 'E': 12, 'F': 16, 'G': 8,
+    })
+
     # Título
-    ws.merge_cells('A1:G1')
-    ws['A1'] = 'Relatório Financeiro'
-    ws['A1'].font = Font(bold=True, size=14)
-    
-    ws.merge_cells('A2:G2')
-    ws['A2'] = f'Benefício: {dados["beneficio_label"]} | Status: {dados["status_label"]} | Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-    ws['A2'].font = Font(size=9, color='808080')
-    
+    ws.append(_linha_excel(ws, ('Relatório Financeiro', 'rel_titulo')))
+    ws.append(_linha_excel(ws, (
+        f'Benefício: {dados["beneficio_label"]} | Status: {dados["status_label"]} | Gerado em: {datetime.now().strftime("%d/%m/%Y %H:%M")}',
+        'rel_subtitulo',
+    )))
+    ws.append([])
+
     # ═══ RESUMO GERAL ═══
-    row = 4
-    ws.cell(row=row, column=1, value='RESUMO GERAL').font = secao_font
-    row = 5
-    
+    ws.append(_linha_excel(ws, ('RESUMO GERAL', 'rel_secao')))
+
     rg = dados['resumo_geral']
-    valor_total = float(rg['total_valor'])
-    
-    resumo_items = [
-        ('Benefícios Ativos', rg['total_beneficios']),
-        ('Pessoas Ativas', rg['total_ativos']),
-        ('Valor Mensal Total', valor_total),
-    ]
-    
-    for label, valor in resumo_items:
-        ws.cell(row=row, column=1, value=label).font = Font(bold=True)
-        ws.cell(row=row, column=1).border = border
-        cell = ws.cell(row=row, column=2, value=valor)
-        cell.border = border
-        if isinstance(valor, float):
-            cell.number_format = 'R$ #,##0.00'
-        row += 1
-    
+    ws.append(_linha_excel(ws, ('Benefícios Ativos', 'rel_rotulo'), (rg['total_beneficios'], 'rel_celula')))
+    ws.append(_linha_excel(ws, ('Pessoas Ativas', 'rel_rotulo'), (rg['total_ativos'], 'rel_celula')))
+    ws.append(_linha_excel(ws, ('Valor Mensal Total', 'rel_rotulo'), (float(rg['total_valor']), 'rel_moeda')))
+
     # ═══ DETALHAMENTO POR BENEFÍCIO ═══
-    row += 1
-    ws.cell(row=row, column=1, value='DETALHAMENTO POR BENEFÍCIO').font = secao_font
-    row += 1
-    
+    ws.append([])
+    ws.append(_linha_excel(ws, ('DETALHAMENTO POR BENEFÍCIO', 'rel_secao')))
+
     ben_headers = ['Descrição', 'Nome Oficial', 'Ativos', 'Espera', 'Deslig.', 'Valor Mensal', '%']
-    for col, h in enumerate(ben_headers, 1):
-        cell = ws.cell(row=row, column=col, value=h)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = border
-    row += 1
-    
+    ws.append(_linha_excel(ws, *((h, 'rel_cabecalho') for h in ben_headers)))
+
     for idx, b in enumerate(dados['det_beneficios']):
-        ws.cell(row=row, column=1, value=b['descricao']).border = border
-        ws.cell(row=row, column=2, value=b['nome_oficial']).border = border
-        ws.cell(row=row, column=3, value=b['ativos']).border = border
-        ws.cell(row=row, column=4, value=b['espera']).border = border
-        ws.cell(row=row, column=5, value=b['desligados']).border = border
-        cell_v = ws.cell(row=row, column=6, value=float(b['valor']))
-        cell_v.number_format = '#,##0.00'
-        cell_v.border = border
-        ws.cell(row=row, column=7, value=f"{b['percentual']:.1f}%").border = border
-        
-        if idx % 2 == 1:
-            for c in range(1, 8):
-                ws.cell(row=row, column=c).fill = PatternFill(start_color='F8F9FA', end_color='F8F9FA', fill_type='solid')
-        row += 1
-    
+        celula, valor = ('rel_celula_zebra', 'rel_valor_zebra') if idx % 2 == 1 else ('rel_celula', 'rel_valor')
+        ws.append(_linha_excel(
+            ws,
+            (b['descricao'], celula),
+            (b['nome_oficial'], celula),
+            (b['ativos'], celula),
+            (b['espera'], celula),
+            (b['desligados'], celula),
+            (float(b['valor']), valor),
+            (f"{b['percentual']:.1f}%", celula),
+        ))
+
     # Total benefícios
-    ws.cell(row=row, column=1, value='TOTAL').font = total_font
-    ws.cell(row=row, column=3, value=dados['total_ativos']).font = total_font
-    ws.cell(row=row, column=4, value=dados['total_espera']).font = total_font
-    ws.cell(row=row, column=5, value=dados['total_desligados']).font = total_font
-    cell_tv = ws.cell(row=row, column=6, value=float(dados['total_valor']))
-    cell_tv.number_format = '#,##0.00'
-    cell_tv.font = total_font
-    ws.cell(row=row, column=7, value='100%').font = total_font
-    for c in range(1, 8):
-        ws.cell(row=row, column=c).fill = total_fill
-        ws.cell(row=row, column=c).border = border
-    
+    ws.append(_linha_excel(
+        ws,
+        ('TOTAL', 'rel_total'),
+        (None, 'rel_total'),
+        (dados['total_ativos'], 'rel_total'),
+        (dados['total_espera'], 'rel_total'),
+        (dados['total_desligados'], 'rel_total'),
+        (float(dados['total_valor']), 'rel_total_valor'),
+        ('100%', 'rel_total'),
+    ))
+
     # ═══ DETALHAMENTO POR FAIXA DE VALOR ═══
-    row += 2
-    ws.cell(row=row, column=1, value='DETALHAMENTO POR FAIXA DE VALOR').font = secao_font
-    row += 1
-    
+    ws.append([])
+    ws.append(_linha_excel(ws, ('DETALHAMENTO POR FAIXA DE VALOR', 'rel_secao')))
+
     faixa_headers = ['Faixa', 'Pessoas', 'Valor Total', '%']
-    for col, h in enumerate(faixa_headers, 1):
-        cell = ws.cell(row=row, column=col, value=h)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = border
-    row += 1
-    
+    ws.append(_linha_excel(ws, *((h, 'rel_cabecalho') for h in faixa_headers)))
+
     for idx, f in enumerate(dados['det_faixas']):
-        ws.cell(row=row, column=1, value=f['faixa']).border = border
-        ws.cell(row=row, column=2, value=f['pessoas']).border = border
-        cell_fv = ws.cell(row=row, column=3, value=float(f['valor']))
-        cell_fv.number_format = '#,##0.00'
-        cell_fv.border = border
-        ws.cell(row=row, column=4, value=f"{f['percentual']:.1f}%").border = border
-        
-        if idx % 2 == 1:
-            for c in range(1, 5):
-                ws.cell(row=row, column=c).fill = PatternFill(start_color='F8F9FA', end_color='F8F9FA', fill_type='solid')
-        row += 1
-    
+        celula, valor = ('rel_celula_zebra', 'rel_valor_zebra') if idx % 2 == 1 else ('rel_celula', 'rel_valor')
+        ws.append(_linha_excel(
+            ws,
+            (f['faixa'], celula),
+            (f['pessoas'], celula),
+            (float(f['valor']), valor),
+            (f"{f['percentual']:.1f}%", celula),
+        ))
+
     # Total faixas
     total_faixa_pessoas = sum(f['pessoas'] for f in dados['det_faixas'])
-    ws.cell(row=row, column=1, value='TOTAL').font = total_font
-    ws.cell(row=row, column=2, value=total_faixa_pessoas).font = total_font
-    cell_tfv = ws.cell(row=row, column=3, value=float(dados['total_valor']))
-    cell_tfv.number_format = '#,##0.00'
-    cell_tfv.font = total_font
-    ws.cell(row=row, column=4, value='100%').font = total_font
-    for c in range(1, 5):
-        ws.cell(row=row, column=c).fill = total_fill
-        ws.cell(row=row, column=c).border = border
-    
-    # Larguras
-    ws.column_dimensions['A'].width = 25
-    ws.column_dimensions['B'].width = 25
-    ws.column_dimensions['C'].width = 12
-    ws.column_dimensions['D'].width = 12
-    ws.column_dimensions['E'].width = 12
-    ws.column_dimensions['F'].width = 16
-    ws.column_dimensions['G'].width = 8
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    response = HttpResponse(buffer, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="relatorio_financeiro.xlsx"'
-    return response
+    ws.append(_linha_excel(
+        ws,
+        ('TOTAL', 'rel_total'),
+        (total_faixa_pessoas, 'rel_total'),
+        (float(dados['total_valor']), 'rel_total_valor'),
+        ('100%', 'rel_total'),
+    ))
+
+    return _resposta_excel(wb, 'relatorio_financeiro.xlsx')
+
+def ip_da_requisicao(request):
+    """IP do cliente (primeiro do X-Forwarded-For do nginx, senão REMOTE_ADDR)"""
+    ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip()
+    return ip or request.META.get('REMOTE_ADDR')
+
 
 def registrar_log_acao(request, tipo, descricao):
-    """Registra uma ação no log de auditoria"""
+    """Registra uma ação no log de auditoria (em lote, se a requisição estiver em auditoria_em_lote)"""
+    from .auditoria import gravar_log_acao
     from .models import LogAcao
     
-    ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip()
-    if not ip:
-        ip = request.META.get('REMOTE_ADDR')
-    
-    LogAcao.objects.create(
+    gravar_log_acao(LogAcao(
         usuario=request.user,
         tipo=tipo,
         descricao=descricao,
-        ip=ip,
-    )
\ No newline at end of file
+        ip=ip_da_requisicao(request),
+    ))
\ No newline at end of file
@@ -3,11 +3,17 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, Http404
+from django.urls import reverse
 from django.core.paginator import Paginator, EmptyPage
-from .models import Pessoa, Beneficio, Documento, Memorando, MemorandoPessoa
-from .services import registrar_memorando
-from .utils import registrar_log_acao
+from django.db import IntegrityError, transaction
+from .models import Pessoa, Beneficio, BeneficioStats, Documento, Memorando, MemorandoPessoa, TarefaGeracao
+from .filters import AuditoriaFilterSet, PessoaFilterSet
+from .tarefas import enfileirar_tarefa
+from .services import (
+    registrar_memorando, obter_estatisticas_dashboard, formatar_moeda, beneficios_cadastrados, obter_beneficio,
+)
+from .utils import ip_da_requisicao, registrar_log_acao
 from .forms import PessoaForm, DocumentoForm, UsuarioCreateForm, UsuarioEditForm, MeuPerfilForm
 from django.db.models import Q, F, Sum, Func, Value, CharField, Count
 from django.contrib.staticfiles import finders
@@ -19,77 +25,17 @@ import os
 
 LIMITE_BENEFICIOS = 2
 
+def _beneficio_ou_404(beneficio_id):
+    """Benefício do registro em memória (sem SQL no caso comum), ou 404"""
+    beneficio = obter_beneficio(beneficio_id)
+    if beneficio is None:
+        raise Http404('Benefício não encontrado')
+    return beneficio
+
 @login_required
 def dashboard(request):
     """Dashboard com overview financeiro e benefícios ativos"""
-    
-    beneficios = Beneficio.objects.filter(ativo=True).order_by('id')
-    
-    stats_list = []
-    total_mensal_geral = 0
-    
-    classes = ['benefit-card-azul', 'benefit-card-verde', 'benefit-card-turquesa', 'benefit-card-roxo']
-    icones_padrao = ['bi-bus-front', 'bi-cash-coin', 'bi-wallet2', 'bi-piggy-bank']
-    
-    for idx, beneficio in enumerate(beneficios):
-        stats = Pessoa.objects.filter(beneficio=beneficio).aggregate(
-            total_pessoas=Count('id'),
-            ativos=Count('id', filter=Q(status='ativo')),
-            desativados=Count('id', filter=Q(status='desligado')),
-            em_espera=Count('id', filter=Q(status='em_espera')),
-            valor_mensal=Sum('valor_beneficio', filter=Q(status='ativo'))
-        )
-        
-        valor_mensal = stats['valor_mensal'] or 0
-        valor_mensal_formatado = f"{valor_mensal:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        
-        icone = beneficio.icone if hasattr(beneficio, 'icone') and beneficio.icone else icones_padrao[idx % 4]
-        
-        stats_list.append({
-            'id': beneficio.id,
-            'nome': beneficio.nome_exibicao,
-            'icone': icone,  
-            'cor_classe': classes[idx % len(classes)],
-            'total': stats['total_pessoas'],
-            'ativos': stats['ativos'],
-            'desativados': stats['desativados'],
-            'em_espera': stats['em_espera'],
-            'valor_mensal': float(valor_mensal),
-            'valor_mensal_formatado': valor_mensal_formatado,
-        })
-        
-        total_mensal_geral += valor_mensal
-
-    total_mensal_geral_formatado = f"{total_mensal_geral:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    
-    # Distribuição por faixa de valor
-    pessoas_ativas = Pessoa.objects.filter(
-        status='ativo',
-        beneficio__ativo=True
-    )
-    
-    distribuicao_valor = pessoas_ativas.aggregate(
-        ate_100=Count('id', filter=Q(valor_beneficio__lte=100)),
-        de_101_150=Count('id', filter=Q(valor_beneficio__gt=100, valor_beneficio__lte=150)),
-        de_151_200=Count('id', filter=Q(valor_beneficio__gt=150, valor_beneficio__lte=200)),
-        de_201_250=Count('id', filter=Q(valor_beneficio__gt=200, valor_beneficio__lte=250)),
-        de_251_300=Count('id', filter=Q(valor_beneficio__gt=250, valor_beneficio__lte=300)),
-        acima_300=Count('id', filter=Q(valor_beneficio__gt=300))
-    )
-    
-    todas_beneficios_ativos = Pessoa.objects.filter(beneficio__ativo=True)
-    
-    context = {
-        'beneficios': stats_list,
-        'total_mensal_geral': total_mensal_geral,
-        'total_mensal_geral_formatado': total_mensal_geral_formatado,
-        'total_geral': todas_beneficios_ativos.count(),
-        'total_ativos_geral': todas_beneficios_ativos.filter(status='ativo').count(),
-        'total_em_espera_geral': todas_beneficios_ativos.filter(status='em_espera').count(),
-        'total_desativados_geral': todas_beneficios_ativos.filter(status='desligado').count(),
-        'distribuicao_valor': distribuicao_valor,
-    }
-    
+    context = obter_estatisticas_dashboard()
     return render(request, 'beneficios/dashboard.html', context)
 
 @login_required
@@ -190,6 +136,22 @@ def pessoa_edit(request, pk):
     }
     return render(request, 'beneficios/pessoa_form.html', context)
 
+MENSAGEM_CPF_EM_USO = (
+    'CPF já cadastrado em um benefício ativo ou em espera! '
+    'Desligue o outro registro antes de reativar este.'
+)
+
+
+def _cpf_em_uso(pessoa):
+    """Há outro registro não desligado com o mesmo CPF (o que a constraint unique_cpf_nao_desligado proíbe)"""
+    if not pessoa.cpf_hash:
+        return False
+    return (
+        Pessoa.objects.filter(cpf_hash=pessoa.cpf_hash)
+        .exclude(pk=pessoa.pk).exclude(status='desligado').exists()
+    )
+
+
 @login_required
 def pessoa_ativar(request, pk):
     """Mudar status da pessoa para Ativo"""
@@ -200,18 +162,28 @@ def pessoa_ativar(request, pk):
         messages.info(request, f'{pessoa.nome_completo} já está ativa.')
         return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     
-    pessoa.status = 'ativo'
-    pessoa.save()
+    if status_anterior == 'desligado' and _cpf_em_uso(pessoa):
+        messages.error(request, MENSAGEM_CPF_EM_USO)
+        return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     
     from .models import HistoricoStatus
     from django.utils import timezone
-    HistoricoStatus.objects.create(
-        pessoa=pessoa,
-        status_anterior=status_anterior,
-        status_novo='ativo',
-        data=timezone.now(),
-        usuario=request.user
-    )
+    # Status, histórico e contadores do benefício gravados juntos
+    try:
+        with transaction.atomic():
+            pessoa.status = 'ativo'
+            pessoa.save()
+            HistoricoStatus.objects.create(
+                pessoa=pessoa,
+                status_anterior=status_anterior,
+                status_novo='ativo',
+                data=timezone.now(),
+                usuario=request.user
+            )
+    except IntegrityError:
+        # Outro cadastro com o mesmo CPF foi reativado entre a verificação e a gravação
+        messages.error(request, MENSAGEM_CPF_EM_USO)
+        return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     registrar_log_acao(request, 'status_ativar', f'{pessoa.nome_completo} - {status_anterior} → ativo')
     messages.success(request, f'{pessoa.nome_completo} ativada com sucesso!')
     return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
@@ -227,18 +199,28 @@ def pessoa_espera(request, pk):
         messages.info(request, f'{pessoa.nome_completo} já está em espera.')
         return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     
-    pessoa.status = 'em_espera'
-    pessoa.save()
+    if status_anterior == 'desligado' and _cpf_em_uso(pessoa):
+        messages.error(request, MENSAGEM_CPF_EM_USO)
+        return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     
     from .models import HistoricoStatus
     from django.utils import timezone
-    HistoricoStatus.objects.create(
-        pessoa=pessoa,
-        status_anterior=status_anterior,
-        status_novo='em_espera',
-        data=timezone.now(),
-        usuario=request.user
-    )
+    # Status, histórico e contadores do benefício gravados juntos
+    try:
+        with transaction.atomic():
+            pessoa.status = 'em_espera'
+            pessoa.save()
+            HistoricoStatus.objects.create(
+                pessoa=pessoa,
+                status_anterior=status_anterior,
+                status_novo='em_espera',
+                data=timezone.now(),
+                usuario=request.user
+            )
+    except IntegrityError:
+        # Outro cadastro com o mesmo CPF foi reativado entre a verificação e a gravação
+        messages.error(request, MENSAGEM_CPF_EM_USO)
+        return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     registrar_log_acao(request, 'status_espera', f'{pessoa.nome_completo} - {status_anterior} → em_espera')
     messages.success(request, f'{pessoa.nome_completo} movida para lista de espera!')
     return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
@@ -254,18 +236,19 @@ def pessoa_desligar(request, pk):
         messages.info(request, f'{pessoa.nome_completo} já está desligada.')
         return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
     
-    pessoa.status = 'desligado'
-    pessoa.save()
-    
     from .models import HistoricoStatus
     from django.utils import timezone
-    HistoricoStatus.objects.create(
-        pessoa=pessoa,
-        status_anterior=status_anterior,
-        status_novo='desligado',
-        data=timezone.now(),
-        usuario=request.user
-    )
+    # Status, histórico e contadores do benefício gravados juntos
+    with transaction.atomic():
+        pessoa.status = 'desligado'
+        pessoa.save()
+        HistoricoStatus.objects.create(
+            pessoa=pessoa,
+            status_anterior=status_anterior,
+            status_novo='desligado',
+            data=timezone.now(),
+            usuario=request.user
+        )
     registrar_log_acao(request, 'status_desligar', f'{pessoa.nome_completo} - {status_anterior} → desligado')
     messages.success(request, f'{pessoa.nome_completo} desligada com sucesso!')
     return redirect('pessoas_por_beneficio', beneficio_id=pessoa.beneficio.id)
@@ -296,123 +279,38 @@ def pessoa_documento(request, pk):
 @login_required
 def pessoas_por_beneficio(request, beneficio_id):
     """Lista pessoas de um benefício com filtros otimizados."""
-    beneficio = get_object_or_404(Beneficio, pk=beneficio_id)
-    
-    # Query Base
-    pessoas_query = Pessoa.objects.filter(beneficio=beneficio).order_by('nome_completo')
-        
-    # Contagens dos Cards
-    stats = pessoas_query.aggregate(
-        ativos=Count('id', filter=Q(status='ativo')),
-        em_espera=Count('id', filter=Q(status='em_espera')),
-        desligados=Count('id', filter=Q(status='desligado')),
-        total=Count('id'),
-        total_mensal=Sum('valor_beneficio', filter=Q(status='ativo'))
-    )
-    # Formatar total mensal
-    total_mensal = stats['total_mensal'] or 0
-    total_mensal_formatado = f"{total_mensal:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-
-    # Distribuição por faixa de valor (apenas deste benefício)
-    distribuicao_valor = pessoas_query.filter(status='ativo').aggregate(
-        ate_100=Count('id', filter=Q(valor_beneficio__lte=100)),
-        de_101_150=Count('id', filter=Q(valor_beneficio__gt=100, valor_beneficio__lte=150)),
-        de_151_200=Count('id', filter=Q(valor_beneficio__gt=150, valor_beneficio__lte=200)),
-        de_201_250=Count('id', filter=Q(valor_beneficio__gt=200, valor_beneficio__lte=250)),
-        de_251_300=Count('id', filter=Q(valor_beneficio__gt=250, valor_beneficio__lte=300)),
-        acima_300=Count('id', filter=Q(valor_beneficio__gt=300))
+    beneficio = _beneficio_ou_404(beneficio_id)
+    
+    # Contagens dos Cards (mantidas em BeneficioStats)
+    stats = BeneficioStats.do_beneficio(beneficio)
+    total_mensal_formatado = formatar_moeda(stats.total_mensal)
+    distribuicao_valor = stats.distribuicao_valor
+    
+    # Filtros (mesma engine usada pelas gerações em massa)
+    filtro = PessoaFilterSet(beneficio, request.GET, status_padrao='ativo')
+    pessoas_filtradas = filtro.pessoas(
+        'nome_completo', 'cpf', 'valor_beneficio', 'status', 'documento__id',
+        select_related=('documento',),
     )
+    if filtro.erro_posicao:
+        messages.warning(request, filtro.erro_posicao)
     
-    # Captura de Filtros
-    f_nome = request.GET.get('nome', '').strip()
-    f_cpf = request.GET.get('cpf', '').strip()
-    f_status = request.GET.get('status', 'ativo')
-    f_valor = request.GET.get('valor', '').replace(',', '.')
-    f_pos_de = request.GET.get('id_de', '').strip()
-    f_pos_ate = request.GET.get('id_ate', '').strip()
-    
-    # Filtros no Banco
-    pessoas_filtradas = pessoas_query
-    
-    if f_nome:
-        pessoas_filtradas = pessoas_filtradas.filter(nome_completo__icontains=f_nome)
-    
-    if f_status == 'ativo':
-        pessoas_filtradas = pessoas_filtradas.filter(status='ativo')
-    elif f_status == 'desligado':
-        pessoas_filtradas = pessoas_filtradas.filter(status='desligado')
-    elif f_status == 'em_espera':
-        pessoas_filtradas = pessoas_filtradas.filter(status='em_espera')
-    
-    try:
-        if f_valor and float(f_valor) > 0:
-            pessoas_filtradas = pessoas_filtradas.filter(valor_beneficio=float(f_valor))
-    except ValueError:
-        pass
-    
-    # FILTRO CPF OTIMIZADO
-    if f_cpf:
-        cpf_limpo = ''.join(filter(str.isdigit, f_cpf))
-        
-        if len(cpf_limpo) >= 4:
-            ultimos_4 = cpf_limpo[-4:]
-            candidatos = pessoas_filtradas.filter(cpf_ultimos_4=ultimos_4).only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_filtradas = pessoas_filtradas.filter(pk__in=ids_validos)
-        else:
-            candidatos = pessoas_filtradas.only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_filtradas = pessoas_filtradas.filter(pk__in=ids_validos)
-    
-    # Filtro de Posição
-    slice_aplicado = False
-    try:
-        if f_pos_de and f_pos_ate:
-            pos_de = int(f_pos_de)
-            pos_ate = int(f_pos_ate)
-            if pos_de < 1:
-                messages.warning(request, 'A posição inicial deve ser maior que 0!')
-            elif pos_ate < pos_de:
-                messages.warning(request, 'A posição final não pode ser menor que a inicial!')
-            else:
-                pessoas_filtradas = pessoas_filtradas[pos_de-1:pos_ate]
-                slice_aplicado = True
-        elif f_pos_de:
-            pos_de = int(f_pos_de)
-            if pos_de >= 1:
-                pessoas_filtradas = pessoas_filtradas[pos_de-1:]
-                slice_aplicado = True
-        elif f_pos_ate:
-            pos_ate = int(f_pos_ate)
-            pessoas_filtradas = pessoas_filtradas[:pos_ate]
-            slice_aplicado = True
-    except ValueError:
-        messages.error(request, 'Posições devem ser números válidos!')
-    
-    if slice_aplicado:
+    if filtro.intervalo():
         pessoas_list = list(pessoas_filtradas)
-        start = int(f_pos_de) if f_pos_de else 1
-        for idx, pessoa in enumerate(pessoas_list, start):
+        for idx, pessoa in enumerate(pessoas_list, filtro.posicao_inicial):
             pessoa.ordem = idx
         
         context = {
             'beneficio': beneficio,
             'pessoas': pessoas_list,
-            'total_ativos': stats['ativos'],
-            'total_em_espera': stats['em_espera'],
-            'total_desativados': stats['desligados'],
-            'total_geral': stats['total'],
+            'total_ativos': stats.ativos,
+            'total_em_espera': stats.em_espera,
+            'total_desativados': stats.desligados,
+            'total_geral': stats.total,
             'total_mensal': total_mensal_formatado,
             'distribuicao_valor': distribuicao_valor,
             'por_pagina': len(pessoas_list),
-            'filtros': {
-                'nome': f_nome,
-                'cpf': f_cpf,
-                'status': f_status,
-                'valor': f_valor,
-                'id_de': f_pos_de,
-                'id_ate': f_pos_ate,
-            }
+            'filtros': filtro.filtros,
         }
         return render(request, 'beneficios/pessoas_lista.html', context)
     
@@ -432,21 +330,14 @@ def pessoas_por_beneficio(request, beneficio_id):
     context = {
         'beneficio': beneficio,
         'pessoas': pessoas_page,
-        'total_ativos': stats['ativos'],
-        'total_em_espera': stats['em_espera'],
-        'total_desativados': stats['desligados'],
-        'total_geral': stats['total'],
+        'total_ativos': stats.ativos,
+        'total_em_espera': stats.em_espera,
+        'total_desativados': stats.desligados,
+        'total_geral': stats.total,
         'total_mensal': total_mensal_formatado,
         'distribuicao_valor': distribuicao_valor,
         'por_pagina': por_pagina,
-        'filtros': {
-            'nome': f_nome,
-            'cpf': f_cpf,
-            'status': f_status,
-            'valor': f_valor,
-            'id_de': f_pos_de,
-            'id_ate': f_pos_ate,
-        }
+        'filtros': filtro.filtros,
     }
     
     return render(request, 'beneficios/pessoas_lista.html', context)
@@ -713,171 +604,46 @@ def gerar_memorando(request, pk):
 @login_required
 def gerar_memorando_massa(request, beneficio_id):
     """Gera memorando em massa com registro no histórico"""
-    beneficio = get_object_or_404(Beneficio, pk=beneficio_id)
+    beneficio = _beneficio_ou_404(beneficio_id)
     
     # Aplica os mesmos filtros da listagem
-    pessoas_query = Pessoa.objects.filter(beneficio=beneficio, status='ativo').order_by('nome_completo')
-    
-    # Captura filtros da URL
-    f_nome = request.GET.get('nome', '').strip()
-    f_cpf = request.GET.get('cpf', '').strip()
-    f_status = request.GET.get('status', '')
-    f_valor = request.GET.get('valor', '').replace(',', '.')
-    f_pos_de = request.GET.get('id_de', '').strip()
-    f_pos_ate = request.GET.get('id_ate', '').strip()
+    filtro = PessoaFilterSet(beneficio, request.GET)
     
-    # Aplica filtros
-    if f_nome:
-        pessoas_query = pessoas_query.filter(nome_completo__icontains=f_nome)
-
-    if f_status != 'ativo':
+    if filtro.status != 'ativo':
         messages.error(request, 'Geração em massa é permitida apenas com filtro de status "Ativo"!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    try:
-        if f_valor and float(f_valor) > 0:
-            pessoas_query = pessoas_query.filter(valor_beneficio=float(f_valor))
-    except ValueError:
-        pass
-    
-    # Filtro CPF
-    if f_cpf:
-        cpf_limpo = ''.join(filter(str.isdigit, f_cpf))
-        if len(cpf_limpo) >= 4:
-            ultimos_4 = cpf_limpo[-4:]
-            candidatos = pessoas_query.filter(cpf_ultimos_4=ultimos_4).only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_query = pessoas_query.filter(pk__in=ids_validos)
-        else:
-            candidatos = pessoas_query.only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_query = pessoas_query.filter(pk__in=ids_validos)
-    
-    # Filtro de posição
-    try:
-        if f_pos_de and f_pos_ate:
-            pos_de = int(f_pos_de)
-            pos_ate = int(f_pos_ate)
-            if pos_de >= 1 and pos_ate >= pos_de:
-                pessoas_query = pessoas_query[pos_de-1:pos_ate]
-        elif f_pos_de:
-            pos_de = int(f_pos_de)
-            if pos_de >= 1:
-                pessoas_query = pessoas_query[pos_de-1:]
-        elif f_pos_ate:
-            pos_ate = int(f_pos_ate)
-            pessoas_query = pessoas_query[:pos_ate]
-    except ValueError:
-        pass
+    pessoas_ids = list(filtro.pessoas().values_list('pk', flat=True))
     
-    pessoas = list(pessoas_query)
-    
-    if not pessoas:
+    if not pessoas_ids:
         messages.error(request, 'Nenhuma pessoa encontrada com os filtros aplicados!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    try:
-        # Preparar dados para snapshot
-        pessoas_dados = []
-        for idx, pessoa in enumerate(pessoas, 1):
-            pessoas_dados.append({
-                'pessoa': pessoa,
-                'nome_completo': pessoa.nome_completo,
-                'cpf': pessoa.cpf,
-                'valor_beneficio': pessoa.valor_beneficio,
-                'ordem': idx
-            })
-        
-        # Registrar no histórico
-        memorando = registrar_memorando(beneficio, pessoas_dados, request.user)
-        
-        # Gerar PDF usando dados do snapshot
-        from .utils import gerar_memorando_segunda_via_pdf
-        pdf_buffer = gerar_memorando_segunda_via_pdf(memorando)
-        response = HttpResponse(pdf_buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="memorando_{memorando.numero.replace("/", "-")}.pdf"'
-        #registrar_log_acao(request, 'memorando_massa', f'Memorando {memorando.numero} - {beneficio.nome} - {len(pessoas)} pessoas')
-        return response
-    except Exception as e:
-        messages.error(request, f'Erro ao gerar memorando em massa: {str(e)}')
-        return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
+    # Snapshot no histórico e PDF são feitos pelo worker (processar_tarefas)
+    tarefa = enfileirar_tarefa('memorando_massa', beneficio, request.user, pessoas_ids, ip_da_requisicao(request))
+    return _resposta_tarefa(request, tarefa)
 
 @login_required
 def gerar_recibos_massa(request, beneficio_id):
     """Gera recibos em massa (2 vias para cada pessoa) respeitando os filtros aplicados"""
-    beneficio = get_object_or_404(Beneficio, pk=beneficio_id)
+    beneficio = _beneficio_ou_404(beneficio_id)
     
     # Aplica os mesmos filtros da listagem
-    pessoas_query = Pessoa.objects.filter(beneficio=beneficio, status='ativo').order_by('nome_completo')
+    filtro = PessoaFilterSet(beneficio, request.GET)
     
-    # Captura filtros da URL
-    f_nome = request.GET.get('nome', '').strip()
-    f_cpf = request.GET.get('cpf', '').strip()
-    f_status = request.GET.get('status', '')
-    f_valor = request.GET.get('valor', '').replace(',', '.')
-    f_pos_de = request.GET.get('id_de', '').strip()
-    f_pos_ate = request.GET.get('id_ate', '').strip()
-    
-    # Aplica filtros
-    if f_nome:
-        pessoas_query = pessoas_query.filter(nome_completo__icontains=f_nome)
-
-    if f_status != 'ativo':
+    if filtro.status != 'ativo':
         messages.error(request, 'Geração em massa é permitida apenas com filtro de status "Ativo"!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    try:
-        if f_valor and float(f_valor) > 0:
-            pessoas_query = pessoas_query.filter(valor_beneficio=float(f_valor))
-    except ValueError:
-        pass
-    
-    # Filtro CPF
-    if f_cpf:
-        cpf_limpo = ''.join(filter(str.isdigit, f_cpf))
-        if len(cpf_limpo) >= 4:
-            ultimos_4 = cpf_limpo[-4:]
-            candidatos = pessoas_query.filter(cpf_ultimos_4=ultimos_4).only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_query = pessoas_query.filter(pk__in=ids_validos)
-        else:
-            candidatos = pessoas_query.only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_query = pessoas_query.filter(pk__in=ids_validos)
-    
-    # Filtro de posição
-    try:
-        if f_pos_de and f_pos_ate:
-            pos_de = int(f_pos_de)
-            pos_ate = int(f_pos_ate)
-            if pos_de >= 1 and pos_ate >= pos_de:
-                pessoas_query = pessoas_query[pos_de-1:pos_ate]
-        elif f_pos_de:
-            pos_de = int(f_pos_de)
-            if pos_de >= 1:
-                pessoas_query = pessoas_query[pos_de-1:]
-        elif f_pos_ate:
-            pos_ate = int(f_pos_ate)
-            pessoas_query = pessoas_query[:pos_ate]
-    except ValueError:
-        pass
-    
-    pessoas = list(pessoas_query)
+    pessoas_ids = list(filtro.pessoas().values_list('pk', flat=True))
     
-    if not pessoas:
+    if not pessoas_ids:
         messages.error(request, 'Nenhuma pessoa encontrada com os filtros aplicados!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    try:
-        from .utils import gerar_recibos_massa_pdf
-        pdf_buffer = gerar_recibos_massa_pdf(pessoas)
-        response = HttpResponse(pdf_buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="recibos_massa_{beneficio.nome}.pdf"'
-        #registrar_log_acao(request, 'recibos_massa', f'Recibos em massa - {beneficio.nome} - {len(pessoas)} pessoas')
-        return response
-    except Exception as e:
-        messages.error(request, f'Erro ao gerar recibos em massa: {str(e)}')
-        return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
+    tarefa = enfileirar_tarefa('recibos_massa', beneficio, request.user, pessoas_ids, ip_da_requisicao(request))
+    #registrar_log_acao(request, 'recibos_massa', f'Recibos em massa - {beneficio.nome} - {len(pessoas_ids)} pessoas')
+    return _resposta_tarefa(request, tarefa)
 
 @login_required
 def documento_protegido(request, pk):
@@ -911,57 +677,26 @@ def gerar_documentos_massa(request, beneficio_id):
     """
     Gera documentos em massa
     """
-    import os
-    from django.http import HttpResponse
-    from django.shortcuts import get_object_or_404, redirect
-    from django.contrib import messages
-    from .models import Beneficio, Pessoa
-
     # 1.Verifica se o benefício existe
-    beneficio = get_object_or_404(Beneficio, pk=beneficio_id )
+    beneficio = _beneficio_ou_404(beneficio_id)
     
-    # 2. Captura de Filtros da URL 
-    f_status = request.GET.get('status', '').strip().lower()
-    f_nome = request.GET.get('nome', '').strip()
-    f_cpf = request.GET.get('cpf', '').strip()
-    f_valor = request.GET.get('valor', '').replace(',', '.')
-    f_pos_de = request.GET.get('id_de', '').strip()
-    f_pos_ate = request.GET.get('id_ate', '').strip()
-
+    # 2. Filtros da URL (mesma engine da listagem)
+    filtro = PessoaFilterSet(beneficio, request.GET)
    
     # Se o status for 'desativado' OU se estiver vazio (Todos), o sistema BARRA.
-    if f_status != 'ativo':
+    if filtro.status != 'ativo':
         messages.error(request, 'Não existem pessoas ativas para gerar o PDF com os filtros aplicados!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
 
     # 4. BLOQUEIO DE MANIPULAÇÃO DE TEXTO 
-    if (f_pos_de and not f_pos_de.isdigit()) or (f_pos_ate and not f_pos_ate.isdigit()):
+    if not filtro.posicoes_numericas():
         messages.error(request, 'Parâmetros de posição inválidos detectados!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
 
-    # 5. Query de Ativos (Usando o campo Boolean 'ativo' do seu Model)
-    pessoas_query = Pessoa.objects.filter(beneficio=beneficio, status='ativo').order_by('nome_completo')
-    
-    # Filtros Adicionais
-    if f_nome:
-        pessoas_query = pessoas_query.filter(nome_completo__icontains=f_nome)
-    
-    if f_valor:
-        try:
-            pessoas_query = pessoas_query.filter(valor_beneficio=float(f_valor))
-        except ValueError:
-            pass
-    
-    if f_cpf:
-        cpf_limpo = ''.join(filter(str.isdigit, f_cpf))
-        if cpf_limpo:
-            if len(cpf_limpo) >= 4:
-                ultimos_4 = cpf_limpo[-4:]
-                candidatos = pessoas_query.filter(cpf_ultimos_4=ultimos_4).only('id', 'cpf')
-            else:
-                candidatos = pessoas_query.only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_query = pessoas_query.filter(pk__in=ids_validos)
+    # 5. Query de Ativos
+    pessoas_query = filtro.queryset(
+        'nome_completo', 'documento__arquivo', 'documento__tamanho', select_related=('documento',),
+    )
     
     # 6. Validação de Intervalo e Posição
     total_ativos = pessoas_query.count()
@@ -969,30 +704,28 @@ def gerar_documentos_massa(request, beneficio_id):
         messages.error(request, 'Nenhuma pessoa ativa encontrada com os filtros aplicados!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
 
-    try:
-        pos_de = int(f_pos_de) if f_pos_de else 1
-        pos_ate = int(f_pos_ate) if f_pos_ate else total_ativos
+    pos_de = int(filtro.id_de) if filtro.id_de else 1
+    pos_ate = int(filtro.id_ate) if filtro.id_ate else total_ativos
+    
+    if pos_de < 1 or pos_de > total_ativos or pos_de > pos_ate:
+        messages.error(request, 'Intervalo de posições inválido!')
+        return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
         
-        if pos_de < 1 or pos_de > total_ativos or pos_de > pos_ate:
-            messages.error(request, 'Intervalo de posições inválido!')
-            return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
-            
-        pessoas_query = pessoas_query[pos_de-1:min(pos_ate, total_ativos)]
-    except (ValueError, TypeError):
-        pass
+    pessoas_query = pessoas_query[pos_de-1:min(pos_ate, total_ativos)]
 
     # 7. Verificação Final e Documentos
-    pessoas = list(pessoas_query.select_related('documento'))
+    pessoas = list(pessoas_query)
     if not pessoas:
         messages.error(request, 'Nenhuma pessoa ativa encontrada!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    # Validação de arquivos físicos no disco
+    # Validação de arquivos físicos no disco (só para documentos ainda sem metadados;
+    # os normalizados foram conferidos no upload e o worker avisa se algum sumir)
     pessoas_sem_doc = []
     for p in pessoas:
         if not hasattr(p, 'documento') or not p.documento or not p.documento.arquivo:
             pessoas_sem_doc.append(p.nome_completo)
-        elif not os.path.exists(p.documento.arquivo.path):
+        elif p.documento.tamanho is None and not os.path.exists(p.documento.arquivo.path):
             pessoas_sem_doc.append(f"{p.nome_completo} (arquivo não encontrado)")
     
     if pessoas_sem_doc:
@@ -1000,18 +733,77 @@ def gerar_documentos_massa(request, beneficio_id):
         messages.error(request, f'Existem pessoas sem documento anexado: {nomes}')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    # 8. Geração do PDF (Chama seu utils.py original)
-    try:
-        from .utils import gerar_documentos_massa_pdf
-        pdf_buffer = gerar_documentos_massa_pdf(pessoas)
-        response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="documentos_massa_{beneficio.id}.pdf"'
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        registrar_log_acao(request, 'documentos_massa', f'Documentos em massa - {beneficio.nome} - {len(pessoas)} pessoas')
-        return response
-    except Exception as e:
-        messages.error(request, f'Erro ao gerar documentos: {str(e)}')
-        return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
+    # 8. Geração do PDF fica com o worker (processar_tarefas)
+    # O LogAcao é gravado pelo worker, só se o PDF sair
+    tarefa = enfileirar_tarefa(
+        'documentos_massa', beneficio, request.user, [p.pk for p in pessoas], ip_da_requisicao(request),
+    )
+    return _resposta_tarefa(request, tarefa)
+
+
+def _resposta_tarefa(request, tarefa):
+    """Após enfileirar: JSON para o abrirMassa() da listagem, redirect para a tela de status nos demais casos"""
+    url_status = reverse('tarefa_status', args=[tarefa.pk])
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({'tarefa': tarefa.pk, 'url': url_status}, status=202)
+    return redirect(url_status)
+
+
+def _obter_tarefa(request, pk):
+    """Tarefa do próprio usuário (administradores veem todas)"""
+    tarefa = get_object_or_404(TarefaGeracao.objects.select_related('beneficio'), pk=pk)
+    if tarefa.usuario_id != request.user.id and not request.user.is_staff:
+        raise Http404('Tarefa não encontrada')
+    return tarefa
+
+
+@login_required
+def tarefa_status(request, pk):
+    """Tela de acompanhamento de uma geração em massa"""
+    tarefa = _obter_tarefa(request, pk)
+    return render(request, 'beneficios/tarefa_status.html', {'tarefa': tarefa})
+
+
+@login_required
+def tarefa_progresso(request, pk):
+    """Progresso da tarefa em JSON (consultado pela tela de status)"""
+    tarefa = _obter_tarefa(request, pk)
+    dados = {
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'processados': tarefa.processados,
+        'total': tarefa.total,
+        'percentual': tarefa.percentual,
+        'mensagem': tarefa.mensagem,
+        'url_arquivo': reverse('tarefa_arquivo', args=[tarefa.pk]) if tarefa.status == 'sucesso' and tarefa.arquivo else '',
+    }
+    response = JsonResponse(dados)
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+
+@login_required
+def tarefa_arquivo(request, pk):
+    """Serve o PDF gerado via X-Accel-Redirect (nginx), como documento_protegido"""
+    from django.conf import settings
+    from urllib.parse import quote
+    
+    tarefa = _obter_tarefa(request, pk)
+    if tarefa.status != 'sucesso' or not tarefa.arquivo:
+        raise Http404('Arquivo não disponível')
+    
+    full_path = os.path.join(settings.MEDIA_ROOT, tarefa.arquivo)
+    if not os.path.exists(full_path):
+        raise Http404('Arquivo não encontrado')
+    
+    file_path_encoded = quote(tarefa.arquivo, safe='/')
+    
+    response = HttpResponse()
+    response['Content-Type'] = 'application/pdf'
+    response['Content-Disposition'] = f'inline; filename="{tarefa.nome_arquivo}"'
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response['X-Accel-Redirect'] = f'/protected-media/{file_path_encoded}'
+    return response
 
 @login_required
 def sobre(request):
@@ -1142,112 +934,72 @@ def trocar_senha(request):
 
 @login_required
 def gerar_remessa_banco(request, beneficio_id):
-    """Gera arquivo CSV de remessa bancária respeitando filtros aplicados"""
-    import csv
-    from io import StringIO
-    
-    beneficio = get_object_or_404(Beneficio, pk=beneficio_id)
+    """
+    Gera arquivo de remessa bancária (CSV ou, com formato=cnab, largura fixa)
+    respeitando filtros aplicados. O arquivo é enviado em streaming.
+    """
+    from django.http import StreamingHttpResponse
+    from .remessa import TotalRemessa, registros, linhas_csv, linhas_cnab
     
-    # Captura filtros da URL
-    f_nome = request.GET.get('nome', '').strip()
-    f_cpf = request.GET.get('cpf', '').strip()
-    f_status = request.GET.get('status', '').strip()
-    f_valor = request.GET.get('valor', '').replace(',', '.')
-    f_pos_de = request.GET.get('id_de', '').strip()
-    f_pos_ate = request.GET.get('id_ate', '').strip()
+    beneficio = _beneficio_ou_404(beneficio_id)
+    filtro = PessoaFilterSet(beneficio, request.GET)
+    formato = request.GET.get('formato', 'csv').strip().lower()
     
     # Bloqueio: apenas status ativo
-    if f_status != 'ativo':
+    if filtro.status != 'ativo':
         messages.error(request, 'Geração de remessa é permitida apenas com filtro de status "Ativo"!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
     # Bloqueio de posições inválidas
-    if (f_pos_de and not f_pos_de.isdigit()) or (f_pos_ate and not f_pos_ate.isdigit()):
+    if not filtro.posicoes_numericas():
         messages.error(request, 'Parâmetros de posição inválidos!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
-    # Query base: apenas ativos
-    pessoas_query = Pessoa.objects.filter(beneficio=beneficio, status='ativo').order_by('nome_completo')
+    pessoas = filtro.pessoas().values_list('cpf', 'nome_completo', 'valor_beneficio')
     
-    # Filtros
-    if f_nome:
-        pessoas_query = pessoas_query.filter(nome_completo__icontains=f_nome)
-    
-    if f_valor:
-        try:
-            pessoas_query = pessoas_query.filter(valor_beneficio=float(f_valor))
-        except ValueError:
-            pass
-    
-    if f_cpf:
-        cpf_limpo = ''.join(filter(str.isdigit, f_cpf))
-        if cpf_limpo:
-            if len(cpf_limpo) >= 4:
-                ultimos_4 = cpf_limpo[-4:]
-                candidatos = pessoas_query.filter(cpf_ultimos_4=ultimos_4).only('id', 'cpf')
-            else:
-                candidatos = pessoas_query.only('id', 'cpf')
-            ids_validos = [p.pk for p in candidatos if cpf_limpo in ''.join(filter(str.isdigit, p.cpf))]
-            pessoas_query = pessoas_query.filter(pk__in=ids_validos)
-    
-    # Filtro de posição
-    try:
-        if f_pos_de and f_pos_ate:
-            pos_de = int(f_pos_de)
-            pos_ate = int(f_pos_ate)
-            if pos_de >= 1 and pos_ate >= pos_de:
-                pessoas_query = pessoas_query[pos_de-1:pos_ate]
-        elif f_pos_de:
-            pos_de = int(f_pos_de)
-            if pos_de >= 1:
-                pessoas_query = pessoas_query[pos_de-1:]
-        elif f_pos_ate:
-            pos_ate = int(f_pos_ate)
-            pessoas_query = pessoas_query[:pos_ate]
-    except ValueError:
-        pass
-    
-    pessoas = list(pessoas_query)
-    
-    if not pessoas:
+    if not pessoas.exists():
         messages.error(request, 'Nenhuma pessoa ativa encontrada com os filtros aplicados!')
         return redirect('pessoas_por_beneficio', beneficio_id=beneficio_id)
     
     # Montar nome do arquivo
+    extensao = 'txt' if formato == 'cnab' else 'csv'
     nome_beneficio = beneficio.nome.upper()
-    if f_valor:
-        try:
-            valor_formatado = f"{float(f_valor):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            nome_arquivo = f"Poupanca Social POCINHOS - {nome_beneficio} - {valor_formatado}.csv"
-        except ValueError:
-            nome_arquivo = f"Poupanca Social POCINHOS - {nome_beneficio}.csv"
+    valor_filtro = filtro.valor_decimal
+    if valor_filtro is not None:
+        valor_formatado = f"{valor_filtro:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        nome_arquivo = f"Poupanca Social POCINHOS - {nome_beneficio} - {valor_formatado}.{extensao}"
     else:
-        nome_arquivo = f"Poupanca Social POCINHOS - {nome_beneficio}.csv"
-    
-    # Gerar CSV
-    output = StringIO()
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_NONE, escapechar='\\')
-    writer.writerow(['CPF', 'NOME', 'VALOR', 'OBSERVACAO'])
-    
-    for pessoa in pessoas:
-        cpf_numeros = ''.join(filter(str.isdigit, pessoa.cpf))
-        nome = pessoa.nome_completo.upper()
-        valor = f"{pessoa.valor_beneficio:.2f}"
-        writer.writerow([cpf_numeros, nome, valor, 'CEP 58150000'])
-    
-    # Response com BOM para Excel
-    response = HttpResponse(
-        '\ufeff' + output.getvalue(),
-        content_type='text/csv; charset=utf-8'
-    )
+        nome_arquivo = f"Poupanca Social POCINHOS - {nome_beneficio}.{extensao}"
+    
+    total = TotalRemessa()
+    linhas = registros(pessoas.iterator(chunk_size=2000), total)
+    if formato == 'cnab':
+        conteudo = linhas_cnab(linhas, total, beneficio.nome)
+        content_type = 'text/plain; charset=ascii'
+    else:
+        conteudo = linhas_csv(linhas)
+        content_type = 'text/csv; charset=utf-8'
+    
+    def enviar():
+        completa = False
+        try:
+            yield from conteudo
+            completa = True
+        finally:
+            # Total acumulado durante o envio: se o download parou no meio, o log diz até onde foi
+            descricao = f'Remessa - {beneficio.nome} - {total.pessoas} pessoas - R$ {total.valor:.2f}'
+            if not completa:
+                descricao += ' (interrompida)'
+            registrar_log_acao(request, 'remessa_banco', descricao)
+    
+    response = StreamingHttpResponse(enviar(), content_type=content_type)
     response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
-    registrar_log_acao(request, 'remessa_banco', f'Remessa - {beneficio.nome} - {len(pessoas)} pessoas - R$ {sum(p.valor_beneficio for p in pessoas):.2f}')
     return response
 
 @login_required
 def relatorio_beneficiarios(request):
     """Página de filtros do relatório de beneficiários"""
-    beneficios = Beneficio.objects.filter(ativo=True).order_by('nome')
+    beneficios = beneficios_cadastrados(apenas_ativos=True)
     
     # Buscar bairros distintos
     bairros = (Pessoa.objects.values_list('bairro', flat=True)
@@ -1282,7 +1034,8 @@ def gerar_relatorio_beneficiarios(request):
     # Filtro benefício
     if f_beneficio and f_beneficio.isdigit():
         pessoas_query = pessoas_query.filter(beneficio_id=int(f_beneficio))
-        beneficio_nome = Beneficio.objects.filter(id=int(f_beneficio)).values_list('nome', flat=True).first() or 'Todos'
+        beneficio = obter_beneficio(int(f_beneficio))
+        beneficio_nome = beneficio.nome if beneficio else 'Todos'
     else:
         pessoas_query = pessoas_query.filter(beneficio__ativo=True)
         beneficio_nome = 'Todos os Benefícios'
@@ -1324,18 +1077,28 @@ def gerar_relatorio_beneficiarios(request):
         except ValueError:
             pass
     
-    pessoas = list(pessoas_query)
+    # Totalizadores (no banco; os relatórios não precisam carregar a lista inteira)
+    totais = pessoas_query.aggregate(
+        total_pessoas=Count('id'),
+        total_valor=Sum('valor_beneficio'),
+        total_ativos=Count('id', filter=Q(status='ativo')),
+        total_espera=Count('id', filter=Q(status='em_espera')),
+        total_desligados=Count('id', filter=Q(status='desligado')),
+    )
+    total_pessoas = totais['total_pessoas']
+    total_valor = totais['total_valor'] or Decimal('0')
+    total_ativos = totais['total_ativos']
+    total_espera = totais['total_espera']
+    total_desligados = totais['total_desligados']
 
-    if not pessoas:
+    if not total_pessoas:
         messages.error(request, 'Nenhuma pessoa encontrada com os filtros aplicados!')
         return redirect('relatorio_beneficiarios')
     
-    # Totalizadores
-    total_pessoas = len(pessoas)
-    total_valor = sum(p.valor_beneficio for p in pessoas)
-    total_ativos = sum(1 for p in pessoas if p.status == 'ativo')
-    total_espera = sum(1 for p in pessoas if p.status == 'em_espera')
-    total_desligados = sum(1 for p in pessoas if p.status == 'desligado')
+    # Os dois formatos desenham as linhas à medida que saem do banco
+    pessoas = pessoas_query.only(
+        'nome_completo', 'cpf', 'valor_beneficio', 'status', 'bairro', 'created_at', 'beneficio__nome',
+    ).iterator(chunk_size=2000)
     
     if f_formato == 'xlsx':
         from .utils import gerar_excel_beneficiarios
@@ -1355,7 +1118,7 @@ def gerar_relatorio_beneficiarios(request):
 @login_required
 def relatorio_financeiro(request):
     """Página de filtros do relatório financeiro"""
-    beneficios = Beneficio.objects.filter(ativo=True).order_by('nome')
+    beneficios = beneficios_cadastrados(apenas_ativos=True)
     
     context = {
         'beneficios_lista': beneficios,
@@ -1372,112 +1135,36 @@ def gerar_relatorio_financeiro(request):
     f_status = request.GET.get('status', '').strip()
     f_formato = request.GET.get('formato', 'pdf').strip()
     
-    # Query base
-    pessoas_query = Pessoa.objects.select_related('beneficio')
+    from .services import calcular_relatorio_financeiro
     
     # Filtro benefício
     if f_beneficio and f_beneficio.isdigit():
-        pessoas_query = pessoas_query.filter(beneficio_id=int(f_beneficio))
-        beneficios_filtro = Beneficio.objects.filter(id=int(f_beneficio))
+        beneficio = obter_beneficio(int(f_beneficio))
+        beneficios_filtro = [beneficio] if beneficio else []
     else:
-        pessoas_query = pessoas_query.filter(beneficio__ativo=True)
-        beneficios_filtro = Beneficio.objects.filter(ativo=True)
+        beneficios_filtro = beneficios_cadastrados(apenas_ativos=True)
     
     # Filtro status
     if f_status and f_status != 'todos':
-        pessoas_query = pessoas_query.filter(status=f_status)
         status_label = dict(Pessoa.STATUS_CHOICES).get(f_status, f_status)
     else:
+        f_status = None
         status_label = 'Todos'
     
     beneficio_label = 'Todos os Benefícios'
     if f_beneficio and f_beneficio.isdigit():
-        beneficio_label = beneficios_filtro.values_list('nome', flat=True).first() or 'Todos'
+        beneficio_label = beneficios_filtro[0].nome if beneficios_filtro else 'Todos'
     
-    pessoas = list(pessoas_query)
+    # Resumo, detalhamento por benefício e por faixa de valor agregados no banco
+    dados = calcular_relatorio_financeiro(beneficios_filtro, f_status)
     
-    if not pessoas:
+    if not dados['total_pessoas']:
         messages.error(request, 'Nenhuma pessoa encontrada com os filtros aplicados!')
         return redirect('relatorio_financeiro')
     
-    # Resumo geral
-    total_beneficios = beneficios_filtro.count()
-    total_ativos_geral = sum(1 for p in pessoas if p.status == 'ativo')
-    total_espera_geral = sum(1 for p in pessoas if p.status == 'em_espera')
-    total_desligados_geral = sum(1 for p in pessoas if p.status == 'desligado')
-    total_pessoas = len(pessoas)
-    total_valor = sum(p.valor_beneficio for p in pessoas)
-    
-    resumo_geral = {
-        'total_beneficios': total_beneficios,
-        'total_pessoas': total_pessoas,
-        'total_ativos': total_ativos_geral,
-        'total_valor': total_valor,
-    }
-    
-    # Detalhamento por benefício
-    det_beneficios = []
-    for b in beneficios_filtro.order_by('nome'):
-        pessoas_b = [p for p in pessoas if p.beneficio_id == b.id]
-        ativos = sum(1 for p in pessoas_b if p.status == 'ativo')
-        espera = sum(1 for p in pessoas_b if p.status == 'em_espera')
-        desligados = sum(1 for p in pessoas_b if p.status == 'desligado')
-        valor = sum(p.valor_beneficio for p in pessoas_b)
-        percentual = (float(valor) / float(total_valor) * 100) if total_valor > 0 else 0
-        
-        det_beneficios.append({
-            'descricao': b.nome_exibicao,
-            'nome_oficial': b.nome,
-            'ativos': ativos,
-            'espera': espera,
-            'desligados': desligados,
-            'valor': valor,
-            'percentual': percentual,
-        })
-    
-    # Detalhamento por faixa de valor (apenas ativos)
-    pessoas_ativas = pessoas
-    faixas_config = [
-        ('Até R$ 100', 0, 100),
-        ('R$ 101 - 150', 100, 150),
-        ('R$ 151 - 200', 150, 200),
-        ('R$ 201 - 250', 200, 250),
-        ('R$ 251 - 300', 250, 300),
-        ('Acima de R$ 300', 300, None),
-    ]
-    
-    det_faixas = []
-    for nome_faixa, vmin, vmax in faixas_config:
-        if vmax is None:
-            pessoas_faixa = [p for p in pessoas_ativas if p.valor_beneficio > vmin]
-        elif vmin == 0:
-            pessoas_faixa = [p for p in pessoas_ativas if p.valor_beneficio <= vmax]
-        else:
-            pessoas_faixa = [p for p in pessoas_ativas if vmin < p.valor_beneficio <= vmax]
-        
-        qtd = len(pessoas_faixa)
-        valor = sum(p.valor_beneficio for p in pessoas_faixa)
-        percentual = (float(valor) / float(total_valor) * 100) if total_valor > 0 else 0
-        
-        det_faixas.append({
-            'faixa': nome_faixa,
-            'pessoas': qtd,
-            'valor': valor,
-            'percentual': percentual,
-        })
-    
-    dados = {
-        'beneficio_label': beneficio_label,
-        'status_label': status_label,
-        'resumo_geral': resumo_geral,
-        'det_beneficios': det_beneficios,
-        'det_faixas': det_faixas,
-        'total_valor': total_valor,
-        'total_ativos': total_ativos_geral,
-        'total_espera': total_espera_geral,
-        'total_desligados': total_desligados_geral,
-        'total_pessoas': total_pessoas,
-    }
+    dados['beneficio_label'] = beneficio_label
+    dados['status_label'] = status_label
+    total_pessoas = dados['total_pessoas']
     
     if f_formato == 'xlsx':
         from .utils import gerar_excel_financeiro
@@ -1495,148 +1182,42 @@ def auditoria(request):
         messages.error(request, 'Acesso restrito a administradores!')
         return redirect('dashboard')
     
-    from auditlog.models import LogEntry
     from django.contrib.auth import get_user_model
-    from datetime import datetime
+    from urllib.parse import urlencode
     User = get_user_model()
-    
-    # Filtros
-    f_data_de = request.GET.get('data_de', '').strip()
-    f_data_ate = request.GET.get('data_ate', '').strip()
-    f_usuario = request.GET.get('usuario', '').strip()
-    f_tipo = request.GET.get('tipo', '').strip()
-    f_entidade = request.GET.get('entidade', '').strip()
-    
-    # ═══ AUDITLOG (alterações em models) ═══
-    audit_query = LogEntry.objects.select_related('actor', 'content_type').order_by('-timestamp')
-    
-    if f_data_de:
-        try:
-            audit_query = audit_query.filter(timestamp__date__gte=datetime.strptime(f_data_de, '%Y-%m-%d'))
-        except ValueError:
-            pass
-    
-    if f_data_ate:
-        try:
-            audit_query = audit_query.filter(timestamp__date__lte=datetime.strptime(f_data_ate, '%Y-%m-%d'))
-        except ValueError:
-            pass
-    
-    if f_usuario and f_usuario.isdigit():
-        audit_query = audit_query.filter(actor_id=int(f_usuario))
-    
-    if f_entidade and f_entidade == 'models':
-        pass  # mostra tudo do auditlog
-    elif f_entidade and f_entidade == 'acoes':
-        audit_query = LogEntry.objects.none()
-    elif f_entidade and f_entidade != '':
-        from django.contrib.contenttypes.models import ContentType
-        ct = ContentType.objects.filter(model=f_entidade.lower()).first()
-        if ct:
-            audit_query = audit_query.filter(content_type=ct)
-    
-    if f_tipo:
-        action_map = {'criacao': 0, 'edicao': 1, 'exclusao': 2}
-        if f_tipo in action_map:
-            audit_query = audit_query.filter(action=action_map[f_tipo])
-    
-    # ═══ LOG AÇÕES (geração de documentos) ═══
-    from .models import LogAcao
-    acoes_query = LogAcao.objects.select_related('usuario').order_by('-created_at')
-    
-    if f_data_de:
-        try:
-            acoes_query = acoes_query.filter(created_at__date__gte=datetime.strptime(f_data_de, '%Y-%m-%d'))
-        except ValueError:
-            pass
-    
-    if f_data_ate:
-        try:
-            acoes_query = acoes_query.filter(created_at__date__lte=datetime.strptime(f_data_ate, '%Y-%m-%d'))
-        except ValueError:
-            pass
-    
-    if f_usuario and f_usuario.isdigit():
-        acoes_query = acoes_query.filter(usuario_id=int(f_usuario))
-    
-    if f_entidade and f_entidade == 'acoes':
-        pass  # mostra tudo das ações
-    elif f_entidade and f_entidade == 'models':
-        acoes_query = LogAcao.objects.none()
-    elif f_entidade and f_entidade not in ('', 'models', 'acoes'):
-        acoes_query = LogAcao.objects.none()
-    
-    if f_tipo == 'geracao':
-        audit_query = LogEntry.objects.none()
-    elif f_tipo in ('criacao', 'edicao', 'exclusao'):
-        acoes_query = LogAcao.objects.none()
-    
-    # Combinar e ordenar
-    registros = []
-    
-    action_labels = {0: 'Criação', 1: 'Edição', 2: 'Exclusão'}
-    model_labels = {
-        'pessoa': 'Pessoa',
-        'beneficio': 'Benefício',
-        'user': 'Usuário',
-        'documento': 'Documento',
-        'configuracaogeral': 'Configuração Geral',
-    }
-    
-    for log in audit_query[:200]:
-        changes = log.changes_dict if hasattr(log, 'changes_dict') else {}
-        detalhes = []
-        for campo, valores in changes.items():
-            detalhes.append(f'{campo}: {valores[0]} → {valores[1]}')
-        
-        registros.append({
-            'data': log.timestamp,
-            'usuario': log.actor.username if log.actor else 'Sistema',
-            'tipo': action_labels.get(log.action, 'Outro'),
-            'tipo_classe': 'success' if log.action == 0 else 'warning' if log.action == 1 else 'danger',
-            'entidade': model_labels.get(log.content_type.model, log.content_type.model) if log.content_type else '-',
-            'objeto': str(log.object_repr),
-            'detalhes': ' | '.join(detalhes) if detalhes else '-',
-            'ip': log.remote_addr or '-',
-        })
-    
-    for acao in acoes_query[:200]:
-        registros.append({
-            'data': acao.created_at,
-            'usuario': acao.usuario.username if acao.usuario else 'Sistema',
-            'tipo': acao.get_tipo_display(),
-            'tipo_classe': 'info',
-            'entidade': 'Ação',
-            'objeto': '-',
-            'detalhes': acao.descricao,
-            'ip': acao.ip or '-',
-        })
-    
-    # Ordenar por data decrescente
-    registros.sort(key=lambda x: x['data'], reverse=True)
-    registros = registros[:300]
-    
-    # Paginação
-    paginator = Paginator(registros, 30)
-    page_number = request.GET.get('page', 1)
-    registros_page = paginator.get_page(page_number)
-    
-    # Dados para filtros
-    usuarios = User.objects.order_by('username')
-    
+
+    filterset = AuditoriaFilterSet(request.GET)
+    registros, mais_recentes, mais_antigos = filterset.pagina()
+
     context = {
-        'registros': registros_page,
-        'usuarios': usuarios,
-        'filtros': {
-            'data_de': f_data_de,
-            'data_ate': f_data_ate,
-            'usuario': f_usuario,
-            'tipo': f_tipo,
-            'entidade': f_entidade,
-        }
+        'registros': registros,
+        'mais_recentes': mais_recentes,
+        'mais_antigos': mais_antigos,
+        'primeira_pagina': filterset.antes is None and filterset.depois is None,
+        'usuarios': User.objects.order_by('username'),
+        'filtros': filterset.filtros,
+        'filtros_url': urlencode({chave: valor for chave, valor in filterset.filtros.items() if valor}),
     }
     return render(request, 'beneficios/auditoria.html', context)
 
+def metricas(request):
+    """
+    Métricas no formato do Prometheus. Só para staff ou para o coletor, que
+    envia "Authorization: Bearer <METRICAS_TOKEN>" (sem token configurado,
+    só staff).
+    """
+    import hmac
+    from django.conf import settings
+    from django.http import HttpResponseForbidden
+    from . import metricas as registro_metricas
+
+    token = settings.METRICAS_TOKEN
+    autorizacao = request.META.get('HTTP_AUTHORIZATION', '')
+    coletor = bool(token) and hmac.compare_digest(autorizacao.encode(), f'Bearer {token}'.encode())
+    if not (coletor or request.user.is_staff):
+        return HttpResponseForbidden('Acesso restrito.')
+    return HttpResponse(registro_metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def _atualizar_cron(config):
     """Atualiza a crontab do www-data com os agendamentos"""
     from crontab import CronTab
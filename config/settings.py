@@ -22,8 +22,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'beneficios.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'beneficios.middleware.RenovarSessaoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -32,13 +34,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'beneficios.middleware.ForcarTrocaSenhaMiddleware',
     'auditlog.middleware.AuditlogMiddleware',
+    'beneficios.middleware.AuditoriaEmLoteMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'beneficios.tempos.DjangoTemplates',  # mede o render para o Server-Timing
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -69,6 +72,14 @@ DATABASES = {
     }
 }
 
+# Cache compartilhado entre os workers do gunicorn (estatísticas do dashboard)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default='/var/www/sistema_beneficios_data/cache'),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
@@ -102,6 +113,7 @@ SESSION_COOKIE_SECURE = True
 CSRF_TRUSTED_ORIGINS = ['https://benefix.duckdns.org', 'https://www.benefix.duckdns.org']
 
 SECURE_SSL_REDIRECT = True
+SECURE_REDIRECT_EXEMPT = [r'^metrics/$']  # coletado direto do gunicorn (127.0.0.1:8000), sem TLS, com METRICAS_TOKEN
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 SECURE_HSTS_SECONDS = 31536000
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
@@ -111,6 +123,32 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'beneficios.User'
 
+# Auditoria (auditlog + LogAcao) gravada em lote após o commit de cada requisição/tarefa.
+# O lote é gravado numa segunda transação, depois do commit da alteração: se o processo
+# morrer entre as duas (worker reiniciado, OOM, kill -9), a alteração fica no banco sem
+# o registro de auditoria. Onde essa janela não é aceitável, use True.
+# True = grava cada registro na hora, na mesma transação da alteração.
+AUDITORIA_SINCRONA = config('AUDITORIA_SINCRONA', default=False, cast=bool)
+
+# Snapshots das métricas de cada worker, somados no /metrics (limpo no on_starting do gunicorn)
+METRICAS_DIR = config('METRICAS_DIR', default='/var/www/sistema_beneficios_data/metricas')
+# Token do coletor no /metrics (Authorization: Bearer ...); vazio = só staff logado
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')
+
+# Máximo de consultas SQL por requisição, por nome de URL; acima disso o MetricasMiddleware avisa no log
+ORCAMENTO_CONSULTAS = {
+    'dashboard': 10,
+    'pessoas_por_beneficio': 10,
+    'pessoa_edit': 10,
+    'memorandos_lista': 8,
+    'auditoria': 8,
+    'beneficios_list': 8,
+    'relatorio_beneficiarios': 8,
+    'relatorio_financeiro': 8,
+    'gerar_recibo': 8,
+    'gerar_memorando': 25,
+}
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
@@ -136,5 +174,9 @@ CSRF_COOKIE_SAMESITE = 'Strict'
 
 # Sessão expira após 1h de inatividade
 SESSION_COOKIE_AGE = 3600
-SESSION_SAVE_EVERY_REQUEST = True
-SESSION_EXPIRE_AT_BROWSER_CLOSE = True
\ No newline at end of file
+SESSION_EXPIRE_AT_BROWSER_CLOSE = True
+# Leitura da sessão pelo cache compartilhado (banco só na falta); a expiração deslizante
+# é renovada pelo RenovarSessaoMiddleware a cada 10% da janela, não a cada requisição
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_SAVE_EVERY_REQUEST = False
+SESSAO_FRACAO_RENOVACAO = config('SESSAO_FRACAO_RENOVACAO', default=0.1, cast=float)
\ No newline at end of file
@@ -27,8 +27,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'beneficios.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'beneficios.middleware.RenovarSessaoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -37,13 +39,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'beneficios.middleware.ForcarTrocaSenhaMiddleware',
     'auditlog.middleware.AuditlogMiddleware',
+    'beneficios.middleware.AuditoriaEmLoteMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'beneficios.tempos.DjangoTemplates',  # mede o render para o Server-Timing
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -71,7 +74,18 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 AUTH_USER_MODEL = 'beneficios.User'
+
+AUDITORIA_SINCRONA = False
+METRICAS_DIR = None
+METRICAS_TOKEN = ''
+ORCAMENTO_CONSULTAS = {}
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login/'
@@ -103,7 +117,9 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/tmp/gesocial_test_media'
 
 SESSION_COOKIE_AGE = 3600
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_SAVE_EVERY_REQUEST = False
+SESSAO_FRACAO_RENOVACAO = 0.1
 
 # Desabilitar SSL redirect nos testes
 SECURE_SSL_REDIRECT = False
@@ -1,4 +1,5 @@
 import multiprocessing
+import os
 
 # Diretório do projeto
 bind = "127.0.0.1:8000"
@@ -10,7 +11,9 @@ workers = 5
 worker_class = "sync"
 
 # Timeouts
-timeout = 300
+# As gerações em massa rodam no processar_tarefas, fora dos workers; o que
+# sobra na requisição (relatórios, remessa, PDFs individuais) cabe em 2 minutos
+timeout = 120
 keepalive = 5
 
 # Logs
@@ -26,3 +29,22 @@ pidfile = "/run/gunicorn/gunicorn.pid"
 limit_request_line = 4096
 limit_request_fields = 100
 limit_request_field_size = 8190
+
+
+def post_worker_init(worker):
+    # Pré-calcula o valor por extenso dos benefícios em uso (recibos)
+    from beneficios.utils import aquecer_valor_por_extenso
+    aquecer_valor_por_extenso()
+
+
+def on_starting(server):
+    # Métricas: descarta os snapshots dos processos que já terminaram (o processar_tarefas continua)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    from beneficios.metricas import limpar_snapshots
+    limpar_snapshots()
+
+
+def worker_exit(server, worker):
+    # Métricas: o snapshot das requisições é gravado com intervalo; grava o que faltou
+    from beneficios.metricas import gravar
+    gravar(forcar=True)